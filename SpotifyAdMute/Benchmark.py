@@ -0,0 +1,1257 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Benchmarks for Spotify Ad Mute, run against a local fake Spotify API
+'''
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import Utility
+from FakeSpotify import FakeSpotify, account
+
+# Swallows prints from the state machine while a benchmark runs.
+class NullWriter(object):
+    def write(self, string):
+        pass
+    def flush(self):
+        pass
+
+def _quiet_logger():
+    logger = logging.getLogger('SpotifyAdMute.Benchmark')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+    return logger
+
+# Seconds of user + system CPU used by this process so far.
+def _cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+# Run a fake API in a child process so its CPU use is not billed to the code being measured.
+def _serve_fake(conn, options):
+    fake = FakeSpotify(**options).start()
+    conn.send(fake.url)
+    conn.recv()  # Block until the parent is done
+    fake.stop()
+
+def _spawn_fake(**options):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_fake, args=(child, options))
+    process.daemon = True
+    process.start()
+    return process, parent, parent.recv()
+
+def _print_table(title, rows):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, value in rows:
+        print('  %s  %s' % (name.ljust(width), value))
+    print('')
+
+# Poll many accounts from one Engine and report throughput, CPU per poll and scheduler lateness.
+def bench_engine(accounts=200, seconds=10, workers=8, track_seconds=3, ad_seconds=1):
+    from Engine import Engine
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+
+    process, conn, url = _spawn_fake(track_seconds=track_seconds, ad_seconds=ad_seconds)
+    engine = Engine(_quiet_logger(), workers=workers, api_prefix=url, mute_backend=FakeMuteBackend)
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    try:
+        for i in range(accounts):
+            engine.add_account('account%d' % i, 'account%d' % i)
+
+        cpu_start = _cpu_time()
+        wall_start = time.time()
+        engine.start()
+        time.sleep(seconds)
+        engine.stop()
+        wall = time.time() - wall_start
+        cpu = _cpu_time() - cpu_start
+    finally:
+        sys.stdout = stdout
+        conn.send(None)
+        process.join()
+
+    polls = sum(account.polls for account in engine.accounts.values())
+    errors = sum(account.errors for account in engine.accounts.values())
+    lateness = sum(account.lateness for account in engine.accounts.values())
+    cpu_per_poll = cpu / polls if polls else float('inf')
+    # An account polls at most once every music_default_sleep seconds during music
+    accounts_per_core = SpotifyAdMute.music_default_sleep / cpu_per_poll
+
+    _print_table('Engine: %d accounts, %d workers, %ds' % (accounts, workers, seconds), [
+        ('polls', '%d (%d errors)' % (polls, errors)),
+        ('polls/s', '%.1f' % (polls / wall)),
+        ('cpu/poll', '%.3f ms' % (cpu_per_poll * 1000)),
+        ('mean lateness', '%.3f ms' % (lateness / polls * 1000 if polls else 0)),
+        ('accounts/core', '%d at a %ds poll cadence' % (accounts_per_core, SpotifyAdMute.music_default_sleep)),
+        ('threads', '%d' % (workers + 1)),
+    ])
+
+# Compare the spotipy client with the keep-alive Transport on playing and paused accounts.
+def bench_transport(polls=500):
+    import spotipy
+    from Transport import Transport
+
+    process, conn, url = _spawn_fake(etags=True)
+    rows = []
+    try:
+        for token in ['playing', 'paused']:
+            client = spotipy.Spotify(auth=token)
+            client.prefix = url
+            transport = Transport(_quiet_logger(), token, url)
+            for name, get in [('spotipy', lambda: client._get('me/player/currently-playing')),
+                              ('transport', transport.get_currently_playing)]:
+                get()  # Warm up the connection
+                cpu_start = _cpu_time()
+                wall_start = time.time()
+                for _ in range(polls):
+                    get()
+                wall = time.time() - wall_start
+                cpu = _cpu_time() - cpu_start
+                rows.append(('%s %s' % (name, token), 'latency %.3f ms, cpu %.3f ms per poll' % (wall / polls * 1000, cpu / polls * 1000)))
+            rows.append(('transport %s reuse' % token, '%d not modified, %d unchanged of %d' % (transport.not_modified, transport.unchanged, transport.requests)))
+            transport.close()
+    finally:
+        conn.send(None)
+        process.join()
+
+    _print_table('Transport: %d polls per client' % polls, rows)
+
+# Time from logging in to the first processed poll, with and without a cached profile.
+def bench_startup(runs=20):
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+
+    username = 'listener'
+    fake = FakeSpotify().start()
+    app = HeadlessApp()
+    app.cache_folder = tempfile.mkdtemp()
+    app.username = username
+    with open('%s/.cache-%s' % (app.cache_folder, username), 'w') as cache:
+        json.dump({'access_token': username, 'refresh_token': 'refresh', 'token_type': 'Bearer', 'expires_in': 3600,
+                   'expires_at': int(time.time()) + 3600, 'scope': 'user-read-currently-playing'}, cache)
+
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    rows = []
+    try:
+        for name, keep_profile in [('cold profile', False), ('warm profile', True)]:
+            elapsed = 0.0
+            profile_requests = fake.hits.get('/v1/me', 0)
+            for _ in range(runs):
+                if not keep_profile:
+                    Utility.remove_cached_profile(app.cache_folder, username)
+                start = time.time()
+                ad_mute = SpotifyAdMute(app, _quiet_logger(), FakeMuteBackend())
+                ad_mute.api_prefix = fake.url
+                ad_mute.login(username)
+                ad_mute.update_state(ad_mute._try_get_currently_playing()[0])
+                elapsed += time.time() - start
+                ad_mute.logout()
+            profile_requests = fake.hits.get('/v1/me', 0) - profile_requests
+            rows.append((name, 'time to monitoring %.1f ms, %.1f profile requests per login' % (elapsed / runs * 1000, profile_requests / float(runs))))
+    finally:
+        sys.stdout = stdout
+        fake.stop()
+        shutil.rmtree(app.cache_folder)
+
+    _print_table('Startup: %d logins each' % runs, rows)
+
+# Seconds a fresh interpreter takes to run code, measured inside the child. None if it fails.
+def _child_seconds(code):
+    script = 'import time\n_start = time.time()\n%s\nprint(time.time() - _start)' % code
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=os.path.dirname(os.path.realpath(__file__)),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, _ = process.communicate()
+    if process.returncode != 0:
+        return None
+    return float(out.decode('utf-8').strip().splitlines()[-1])
+
+# Cold start of both entry points: import time, and for the daemon, process launch to first processed poll.
+def bench_coldstart(runs=5):
+    username = 'listener'
+    fake = FakeSpotify().start()
+    folder = tempfile.mkdtemp()
+    with open('%s/.cache-%s' % (folder, username), 'w') as cache:
+        json.dump({'access_token': username, 'refresh_token': 'refresh', 'token_type': 'Bearer', 'expires_in': 3600,
+                   'expires_at': int(time.time()) + 3600, 'scope': 'user-read-currently-playing'}, cache)
+
+    first_polls = []
+    try:
+        for _ in range(runs):
+            start = time.time()
+            process = subprocess.Popen(
+                [sys.executable, '-u', 'Daemon.py', username, '--mute-backend', 'none', '--quiet-polls',
+                 '--cache-folder', folder, '--log-folder', os.path.join(folder, 'logs'), '--api-prefix', fake.url],
+                cwd=os.path.dirname(os.path.realpath(__file__)), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            for line in iter(process.stdout.readline, b''):
+                if line.startswith(b'Currently playing') or line.startswith(b'Playing ad') or line.startswith(b'Not playing'):
+                    first_polls.append(time.time() - start)
+                    break
+            process.kill()
+            process.wait()
+    finally:
+        fake.stop()
+        shutil.rmtree(folder)
+
+    def describe(samples):
+        samples = [sample for sample in samples if sample != None]
+        if not samples:
+            return 'failed'
+        return '%.0f ms (best of %d)' % (min(samples) * 1000, len(samples))
+
+    _print_table('Cold start', [
+        ('daemon import', describe([_child_seconds('import Daemon') for _ in range(runs)])),
+        ('daemon first poll', describe(first_polls) + ', from process launch'),
+        ('gui import', describe([_child_seconds('import Gui') for _ in range(runs)])),
+        ('gui window', describe([_child_seconds('import Gui\nGui.root = Gui.Tk()\nGui.App(Gui.root)') for _ in range(runs)]) + ', needs a display'),
+    ])
+
+# Latency from a poll-thread request to its service on the Tk main loop. Needs a display.
+def bench_dispatch(requests=1000, interval=0.002):
+    try:
+        from Tkinter import Tk
+        from Dispatch import TkDispatcher
+        root = Tk()
+    except Exception as err:
+        print('Dispatch: skipped, Tk is not available (%s)\n' % str(err))
+        return
+    root.withdraw()
+
+    dispatcher = TkDispatcher(root, _quiet_logger())
+    counts = {'repaints': 0, 'requests': 0}
+    def repaint():
+        counts['repaints'] += 1
+    def update():
+        counts['requests'] += 1
+    dispatcher.coalesce(repaint)
+
+    # Mimic the poll thread: every state change repaints the label several times
+    def produce():
+        for i in range(requests):
+            dispatcher.request(update if i % 4 == 0 else repaint)
+            time.sleep(interval)
+        dispatcher.request(root.quit)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    root.mainloop()
+    producer.join()
+    root.destroy()
+
+    _print_table('Dispatch: %d requests from another thread' % requests, [
+        ('mean latency', '%.2f ms' % (dispatcher.latency_total / dispatcher.serviced * 1000)),
+        ('max latency', '%.2f ms' % (dispatcher.latency_max * 1000)),
+        ('repaints', '%d for %d repaint requests' % (counts['repaints'], requests - counts['requests'])),
+    ])
+
+# Resident memory of this process in megabytes.
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576.0
+    except (IOError, OSError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Peak, not current
+
+# Check timeline queries against the simulator's own accounting, then time them over a year of synthetic history.
+def bench_timeline(hours=200, days=365, listening_hours=16):
+    import random
+    import Simulation
+    import Timeline
+
+    folder = tempfile.mkdtemp()
+    rows = []
+    try:
+        writers = []
+        def configure(ad_mute):
+            ad_mute.timeline = Timeline.TimelineWriter(folder, 'simulated')
+            writers.append(ad_mute.timeline)
+        result = Simulation.simulate(hours, configure=configure)
+        writers[0].close()
+        timeline = Timeline.Timeline(folder, 'simulated')
+        accuracy = timeline.mute_accuracy(end=hours * 3600)
+        frequency = timeline.ad_frequency(end=hours * 3600)
+        rows.append(('simulated ads heard', '%.0f s from timeline, %.0f s from simulator' % (accuracy['ad_heard_seconds'], result.leaked_ad_seconds)))
+        rows.append(('simulated ad breaks', '%d from timeline, %d from simulator' % (
+            frequency['breaks'], len(result.mute_latencies) + result.missed_breaks)))
+        timeline.close()
+
+        # A heavy listener: listening_hours a day of 3-4 minute tracks with an ad break every 3 tracks
+        rng = random.Random(1)
+        writer = Timeline.TimelineWriter(folder, 'year')
+        day_start = time.mktime(datetime.date(2025, 1, 1).timetuple())
+        for day in range(days):
+            t = day_start + day * 86400 + 8 * 3600
+            end = t + listening_hours * 3600
+            track = 0
+            while t < end:
+                writer.append(t, Timeline.MUSIC, Timeline.UNMUTED, 'track%d' % rng.randint(0, 5000))
+                t += rng.uniform(180, 240)
+                track += 1
+                if track % 3 == 0:
+                    writer.append(t, Timeline.AD, Timeline.MUTED, lag=rng.uniform(0, 2))
+                    t += rng.choice([15, 30, 45])
+            writer.append(t, Timeline.STOPPED, Timeline.MUTE_UNKNOWN)
+        writer.close()
+
+        timeline = Timeline.Timeline(folder, 'year')
+        size = os.path.getsize(timeline.path) + os.path.getsize(timeline.tracks_path)
+        rows.append(('year of history', '%d records, %.1f MB with track table' % (len(timeline), size / 1048576.0)))
+        for name, query in [('ad minutes per day', timeline.ad_seconds_per_day),
+                            ('ad frequency', timeline.ad_frequency),
+                            ('mute accuracy', timeline.mute_accuracy)]:
+            start = time.time()
+            query()
+            rows.append((name, '%.1f ms' % ((time.time() - start) * 1000)))
+        start = time.time()
+        timeline.ad_frequency(day_start + 180 * 86400, day_start + 187 * 86400)
+        rows.append(('one week', '%.2f ms' % ((time.time() - start) * 1000)))
+        timeline.close()
+    finally:
+        shutil.rmtree(folder)
+
+    _print_table('Timeline: %d simulated hours, %d days of history' % (hours, days), rows)
+
+# Write log files like a long-running poll loop would, then analyze them with one process and with a pool.
+def bench_logs(files=8, megabytes_per_file=16):
+    import random
+    import LogAnalyzer
+
+    folder = tempfile.mkdtemp()
+    rng = random.Random(1)
+    rows = []
+    try:
+        paths = []
+        t = time.mktime(datetime.date(2025, 1, 1).timetuple())
+        for index in range(files):
+            path = os.path.join(folder, '%d.log' % index)
+            with open(path, 'w') as log:
+                while log.tell() < megabytes_per_file * 1048576:
+                    def write(level, message, at):
+                        log.write('%s,%03d %s %s\n' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at)), int(at % 1 * 1000), level, message))
+                    write('INFO', 'SpotifyAdMute: Begin polling.', t)
+                    write('INFO', 'Querying Spotify.', t)
+                    if rng.random() < 0.01:
+                        write('ERROR', 'SpotifyAdMute: While polling for currently playing track information, got exception http status: 503', t + 0.2)
+                        t += 0.7
+                        continue
+                    t += rng.uniform(0.05, 0.4)
+                    write('INFO', 'Queried Spotify.', t)
+                    if rng.random() < 0.05:
+                        write('INFO', 'SpotifyAdMute: Playing ad. Muting!', t)
+                    elif rng.random() < 0.1:
+                        write('INFO', 'SpotifyAdMute: Currently playing "Track" by Artist', t)
+                    write('INFO', "SpotifyAdMute: Entering music state. Current track: {PlaybackSnapshot('id', 'Track', 'Artist', 200000, 1000, True, 'track')}. Current state: {State.Music}.", t)
+                    sleep = rng.choice([1, 4, 10, 10, 10])
+                    write('INFO', 'SpotifyAdMute: Sleeping for %d seconds.' % sleep, t)
+                    t += sleep
+                    write('INFO', 'SpotifyAdMute: Woke up.', t)
+            paths.append(path)
+
+        size = sum(os.path.getsize(path) for path in paths) / 1048576.0
+        for processes in sorted(set([1, multiprocessing.cpu_count()])):
+            rss = _rss_mb()
+            start = time.time()
+            summary = LogAnalyzer.analyze(paths, processes)
+            elapsed = time.time() - start
+            rows.append(('%d process%s' % (processes, '' if processes == 1 else 'es'), '%.1f s, %.0f MB/s, rss %+.1f MB' % (
+                elapsed, size / elapsed, _rss_mb() - rss)))
+        polls = sum(day.polls for day in summary.days.values())
+        rows.append(('found', '%d days, %d polls, %d ads, %d errors' % (len(summary.days), polls,
+                     sum(day.ads for day in summary.days.values()), sum(day.poll_errors for day in summary.days.values()))))
+    finally:
+        shutil.rmtree(folder)
+
+    _print_table('Logs: %d files, %.0f MB' % (files, size), rows)
+
+# Bytes held by obj and everything it references, counting shared objects once.
+def _deep_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(value, seen) for value in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_deep_size(getattr(obj, name), seen) for name in obj.__slots__)
+    return size
+
+# Per-account memory and parse cost of raw currently-playing dicts vs PlaybackSnapshots.
+def bench_snapshot(parses=20000):
+    import hashlib
+    import Playback
+
+    rows = []
+    for name, options in [('track', {'ad_seconds': 0}), ('ad', {'ad_every': 0})]:
+        fake = FakeSpotify(**options)  # Only plays tracks or only plays ads
+        fake.server.server_close()
+        payload = json.dumps(fake.currently_playing('listener')).encode('utf-8')
+        results = json.loads(payload.decode('utf-8'))
+
+        # Transport kept the payload and decoded results. SpotifyAdMute kept the track dict.
+        raw = _deep_size([payload, results])
+        snapshot = Playback.parse(results)
+        compact = _deep_size([hashlib.sha1(payload).digest(), snapshot])
+
+        start = time.time()
+        for _ in range(parses):
+            Playback.parse(results)
+        parse = (time.time() - start) / parses
+        rows.append((name, 'raw %d bytes, snapshot %d bytes, parse %.2f us' % (raw, compact, parse * 1000000)))
+
+    _print_table('Snapshot: memory held per account between polls', rows)
+
+# Soak the details console with days of output and check that memory stays flat.
+# A widget stand-in keeps only what the real widget would after trimming.
+def bench_console(lines=2000000, max_lines=1000, flush_every=50):
+    import collections
+    from Console import ConsoleBuffer
+
+    buffer = ConsoleBuffer(max_lines)
+    widget = collections.deque(maxlen=max_lines)
+    samples = []
+    start = time.time()
+    for i in range(lines):
+        buffer.write('SpotifyAdMute: Currently playing "Track %d" by Artist %d' % (i, i % 97))
+        buffer.write('\n')
+        if i % flush_every == 0:
+            widget.extend(buffer.take_pending())
+        if i % (lines // 5) == 0:
+            samples.append('%.1f' % _rss_mb())
+    samples.append('%.1f' % _rss_mb())
+    elapsed = time.time() - start
+
+    _print_table('Console: %d lines, %d line cap' % (lines, max_lines), [
+        ('rss', ' -> '.join(samples) + ' MB'),
+        ('write', '%.2f us per line' % (elapsed / lines * 1000000)),
+        ('kept', '%d lines' % len(widget)),
+    ])
+
+# Poll in a loop on a thread of its own until stopped, the way sessions ran before the TimerQueue.
+def _poll_thread(ad_mute, stopped):
+    while not stopped.is_set():
+        ad_mute.poll()
+
+# Run many polling sessions on one TimerQueue, and on a thread per session for comparison:
+# thread count, poll rate, and how long stopping takes.
+def bench_timers(session_counts=(1, 10, 100), seconds=5, track_seconds=3, ad_seconds=1):
+    import threading
+    import Timers
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+    from Transport import Transport
+
+    process, conn, url = _spawn_fake(track_seconds=track_seconds, ad_seconds=ad_seconds)
+    logger = _quiet_logger()
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    rows = []
+    try:
+        for count in session_counts:
+            for mode in ['thread per session', 'timers']:
+                baseline = threading.active_count()
+                timers = Timers.TimerQueue(logger).start() if mode == 'timers' else None
+                sessions = []
+                stopped = threading.Event()
+                threads = []
+                for i in range(count):
+                    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+                    ad_mute.transport = Transport(logger, 'session%d' % i, url)
+                    if timers:
+                        ad_mute.start_polling(timers)
+                    else:
+                        threads.append(threading.Thread(target=_poll_thread, args=(ad_mute, stopped)))
+                        threads[-1].start()
+                    sessions.append(ad_mute)
+                time.sleep(seconds)
+                thread_count = threading.active_count() - baseline
+                polls = sum(ad_mute.transport.requests for ad_mute in sessions)
+
+                # Stop every session and wait until none is polling
+                start = time.time()
+                stopped.set()
+                for ad_mute in sessions:
+                    ad_mute.stop_poll()
+                for ad_mute in sessions:
+                    ad_mute.poll_idle.wait()
+                for thread in threads:
+                    thread.join()
+                if timers:
+                    timers.stop(1)
+                stop = time.time() - start
+                for ad_mute in sessions:
+                    ad_mute.transport.close()
+
+                rows.append(('%d sessions, %s' % (count, mode), '%3d threads, %5.1f polls/s, stop %.1f ms' % (
+                    thread_count, polls / float(seconds), stop * 1000)))
+    finally:
+        sys.stdout = stdout
+        conn.send(None)
+        process.join()
+
+    _print_table('Timers: %d workers, %d s per run' % (Timers.TimerQueue.workers, seconds), rows)
+
+# Time to stop polling sessions stuck in stalled requests, in retry waits, and degraded with a circuit breaker open, against
+# a fake API that holds every request. "no cancellation" only interrupts sleeps, as stop_poll() used to.
+def bench_shutdown(sessions=10, deadline=10, stall_seconds=30):
+    import Cancellation
+    import Timers
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+    from Transport import Transport
+
+    class NeverCancelled(Cancellation.Cancellation):
+        def cancel(self):
+            pass
+
+    process, conn, url = _spawn_fake(stall=(1, stall_seconds))
+    logger = _quiet_logger()
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    rows = []
+    try:
+        # (name, read timeout, seconds before stopping)
+        for name, read_timeout, run_seconds in [('stalled request', Transport.read_timeout, 1), ('retry wait', 0.2, 1.5), ('degraded', 0.2, 6)]:
+            for cancellation in [True, False]:
+                timers = Timers.TimerQueue(logger, workers=sessions).start()
+                ad_mutes = []
+                for i in range(sessions):
+                    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+                    ad_mute.transport = Transport(logger, 'session%d' % i, url)
+                    ad_mute.transport.read_timeout = read_timeout
+                    ad_mute.start_polling(timers)
+                    if not cancellation:
+                        ad_mute.cancellation = NeverCancelled()
+                    ad_mutes.append(ad_mute)
+                time.sleep(run_seconds)
+
+                start = time.time()
+                for ad_mute in ad_mutes:
+                    ad_mute.stop_poll()
+                latencies = []
+                for ad_mute in ad_mutes:
+                    if ad_mute.poll_idle.wait(max(start + deadline - time.time(), 0)):
+                        latencies.append(time.time() - start)
+                timers.stop(0)
+                for ad_mute in ad_mutes:
+                    ad_mute.transport.close()
+
+                stuck = sessions - len(latencies)
+                rows.append(('%s, %s' % (name, 'cancellation' if cancellation else 'no cancellation'), 'max %7.1f ms%s' % (
+                    max(latencies or [0]) * 1000, ', %d sessions still polling after %d s' % (stuck, deadline) if stuck else '')))
+    finally:
+        sys.stdout = stdout
+        conn.send(None)
+        process.join()
+
+    _print_table('Shutdown: %d sessions, every request stalls %d s' % (sessions, stall_seconds), rows)
+
+# Start a private session bus. Returns (address, pid).
+def _start_dbus():
+    output = subprocess.check_output(['dbus-launch'], universal_newlines=True)
+    values = dict(line.split('=', 1) for line in output.splitlines() if '=' in line)
+    return values['DBUS_SESSION_BUS_ADDRESS'], int(values['DBUS_SESSION_BUS_PID'])
+
+# Send the PropertiesChanged signal the Spotify client would for properties, with gdbus.
+def _gdbus_emit(address, properties):
+    def gvariant(value):
+        if isinstance(value, dict):
+            return '{%s}' % ', '.join('%s: <%s>' % (gvariant(key), gvariant(item)) for key, item in sorted(value.items()))
+        if isinstance(value, list):
+            return '[%s]' % ', '.join(gvariant(item) for item in value)
+        if isinstance(value, int):
+            return 'uint64 %d' % value
+        return "'%s'" % value.replace('\\', '\\\\').replace("'", "\\'")
+    subprocess.call(['gdbus', 'emit', '--address', address, '--object-path', '/org/mpris/MediaPlayer2', '--signal',
+                           'org.freedesktop.DBus.Properties.PropertiesChanged', "'org.mpris.MediaPlayer2.Player'", gvariant(properties), '@as []'],
+                    stderr=open(os.devnull, 'w'))  # A signal that did not go out shows up as a missed ad
+
+# Play token's part of the fake playlist on a bus: call emit with each new currently-playing response as it starts.
+def _drive_player(fake, token, emit, end, stopped):
+    for at, _ in fake.changes(token, time.time(), end):
+        if stopped.wait(max(at + 0.001 - time.time(), 0)):
+            return
+        emit(fake.currently_playing(token))
+
+# Detection latency (ad start to mute) and Web API requests of each playback source, for accounts playing the fake
+# API's playlist. The mpris sources hear the same playlist as signals from the local client: through the in-process
+# session bus stand-in, and through a private dbus-daemon per account if dbus-launch and gdbus are installed.
+def bench_sources(sessions=5, seconds=30, track_seconds=6, ad_seconds=2):
+    import distutils.spawn
+    import Mpris
+    import Timers
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+    from Transport import Transport
+
+    logger = _quiet_logger()
+    fake = FakeSpotify(track_seconds=track_seconds, ad_seconds=ad_seconds, ad_every=1).start()
+    daemons = []  # pids of the dbus-daemons started
+    runs = [('web, Fixed', 'web', SpotifyAdMute.Scheduler.Fixed),
+            ('web, Predictive', 'web', SpotifyAdMute.Scheduler.Predictive),
+            ('mpris, bus stand-in', 'stand-in', SpotifyAdMute.Scheduler.Fixed)]
+    if all(distutils.spawn.find_executable(tool) for tool in ['dbus-launch', 'dbus-monitor', 'gdbus']):
+        runs.append(('mpris, dbus-daemon', 'dbus-daemon', SpotifyAdMute.Scheduler.Fixed))
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    rows = []
+    try:
+        for name, source, scheduler in runs:
+            timers = Timers.TimerQueue(logger, workers=sessions).start()
+            stopped = threading.Event()
+            start = time.time()
+            end = start + seconds
+            ad_mutes = []
+            drivers = []
+            for i in range(sessions):
+                token = 'session%d' % i
+                ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+                ad_mute.scheduler = scheduler
+                transport = Transport(logger, token, fake.url)
+                if source == 'stand-in':
+                    bus = Mpris.FakeSessionBus()
+                    bus.start_player()
+                    ad_mute.transport = Mpris.MprisSource(logger, bus, transport)
+                    emit = bus.play
+                elif source == 'dbus-daemon':
+                    address, pid = _start_dbus()
+                    daemons.append(pid)
+                    ad_mute.transport = Mpris.MprisSource(logger, Mpris.DBusMonitorBus(logger, address, any_sender=True), transport)
+                    emit = lambda results, address=address: _gdbus_emit(address, Mpris.player_properties(results))
+                else:
+                    ad_mute.transport = transport
+                    emit = None
+                if emit:
+                    emit(fake.currently_playing(token))
+                    drivers.append(threading.Thread(target=_drive_player, args=(fake, token, emit, end, stopped)))
+                    drivers[-1].start()
+                ad_mute.start_polling(timers)
+                ad_mutes.append((token, ad_mute))
+            time.sleep(max(end - time.time(), 0))
+
+            stopped.set()
+            for thread in drivers:
+                thread.join()
+            for _, ad_mute in ad_mutes:
+                ad_mute.stop_poll()
+            for _, ad_mute in ad_mutes:
+                ad_mute.poll_idle.wait()
+            timers.stop(1)
+
+            # Ads that started and ended while polling, and how long each played before it was muted
+            latencies = []
+            missed = 0
+            requests = 0
+            for token, ad_mute in ad_mutes:
+                mutes = [at for at, mute in ad_mute.mute_backend.history if mute]
+                for at, is_ad in fake.changes(token, start + 1, end - ad_seconds):
+                    if is_ad:
+                        muted = [muted_at - at for muted_at in mutes if at <= muted_at < at + ad_seconds]
+                        if muted:
+                            latencies.append(muted[0])
+                        else:
+                            missed += 1
+                requests += ad_mute.transport.requests
+                ad_mute.transport.close()
+
+            latencies.sort()
+            rows.append((name, 'mean %6.1f ms, p95 %6.1f ms, max %6.1f ms, %d missed of %d ads, %4.0f requests/hour per account' % (
+                sum(latencies) / max(len(latencies), 1) * 1000, latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+                max(latencies or [0]) * 1000, missed, missed + len(latencies), requests * 3600.0 / seconds / sessions)))
+    finally:
+        sys.stdout = stdout
+        fake.stop()
+        for pid in daemons:
+            os.kill(pid, signal.SIGTERM)
+
+    _print_table('Playback sources: %d accounts, %d s each, %d s tracks and %d s ads' % (sessions, seconds, track_seconds, ad_seconds), rows)
+
+# Requests and CPU of accounts with nothing playing: polling every ad_default_sleep seconds as before, backing off, and
+# backing off while suspended because no Spotify client runs here. Then how soon polls resume once a client starts.
+def bench_idle(sessions=20, seconds=90):
+    import ProcessWatch
+    import Timers
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import SpotifyAdMute
+    from Transport import Transport
+
+    process, conn, url = _spawn_fake()
+    logger = _quiet_logger()
+    client = ' (a client is running)' if ProcessWatch.ProcessWatch().running() else ', no client running'
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    rows = []
+    folder = tempfile.mkdtemp()
+    try:
+        for name, backoff, watch in [('every %d s' % SpotifyAdMute.ad_default_sleep, 1, False), ('backoff', SpotifyAdMute.idle_backoff, False),
+                                     ('backoff, client watch' + client, SpotifyAdMute.idle_backoff, True)]:
+            timers = Timers.TimerQueue(logger).start()
+            ad_mutes = []
+            cpu_start = _cpu_time()
+            for i in range(sessions):
+                ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+                ad_mute.transport = Transport(logger, 'paused%d' % i, url)
+                ad_mute.idle_backoff = backoff
+                ad_mute.process_watch = ProcessWatch.ProcessWatch() if watch else None
+                ad_mute.start_polling(timers)
+                ad_mutes.append(ad_mute)
+            time.sleep(seconds)
+            cpu = _cpu_time() - cpu_start
+            for ad_mute in ad_mutes:
+                ad_mute.stop_poll()
+            timers.stop(1)
+
+            requests = sum(ad_mute.transport.requests for ad_mute in ad_mutes)
+            scans = sum(ad_mute.process_watch.scans for ad_mute in ad_mutes if ad_mute.process_watch)
+            for ad_mute in ad_mutes:
+                ad_mute.transport.close()
+            rows.append((name, '%5.0f requests/hour, %6.1f ms CPU/hour per account%s' % (
+                requests * 3600.0 / seconds / sessions, cpu * 1000 * 3600 / seconds / sessions,
+                ', %d /proc scans' % scans if watch else '')))
+
+        # Cost of one check of /proc: reading every process name, and only those of processes started since the last check
+        watch = ProcessWatch.ProcessWatch()
+        start = time.time()
+        for _ in range(100):
+            ProcessWatch.ProcessWatch().running()
+        full = (time.time() - start) / 100
+        start = time.time()
+        for _ in range(1000):
+            watch.running()
+        incremental = (time.time() - start) / 1000
+        rows.append(('/proc check', '%.0f us reading every name, %.0f us reading new ones (%d processes)' % (
+            full * 1000000, incremental * 1000000, len([name for name in os.listdir('/proc') if name.isdigit()]))))
+
+        # A client starts (shows up in a stand-in /proc) while polls are suspended
+        timers = Timers.TimerQueue(logger).start()
+        ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+        ad_mute.transport = Transport(logger, 'session0', url)
+        ad_mute.process_watch = ProcessWatch.ProcessWatch(folder)
+        ad_mute.start_polling(timers)
+        time.sleep(3)
+        os.mkdir(os.path.join(folder, '4242'))
+        with open(os.path.join(folder, '4242', 'comm'), 'w') as comm:
+            comm.write('spotify\n')
+        started = time.time()
+        while not ad_mute.transport.requests and time.time() - started < 10:
+            time.sleep(0.005)
+        resumed = time.time() - started
+        ad_mute.stop_poll()
+        timers.stop(1)
+        ad_mute.transport.close()
+        rows.append(('client starts', 'first request %.2f s later (checks every %g s)' % (resumed, ProcessWatch.ProcessWatch.interval)))
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(folder)
+        conn.send(None)
+        process.join()
+
+    _print_table('Idle: %d accounts with nothing playing, %d s' % (sessions, seconds), rows)
+
+# Inject each kind of fault into the fake API while sessions poll it, half of them retrying as the poll loop used to
+# (doubling from 0.5 s to 2 s, as if the error dialog was always answered "Try again" at once) and half with the
+# retry policy. Reports failed requests per session, the worst burst of requests right after the fault cleared,
+# and how long sessions took to get a good answer after it did, and after their own first failed request. The auth
+# fault expires every token at once, which sessions fix by refreshing theirs without waiting for the fault to clear.
+def bench_faults(sessions=20, fault_seconds=10, gap_seconds=35):
+    import Retry
+    import Timers
+    import TokenStore
+    from Engine import HeadlessApp
+    from MuteBackend import FakeMuteBackend
+    from SpotifyAdMute import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, SpotifyAdMute
+    from TokenManager import TokenManager
+    from Transport import Transport
+
+    class RecordingTransport(Transport):
+        def __init__(self, *args):
+            Transport.__init__(self, *args)
+            self.successes = []
+        def get_currently_playing(self):
+            results = Transport.get_currently_playing(self)
+            self.successes.append(time.time())
+            return results
+
+    kinds = ['server', 'network', 'auth', 'throttle']
+    faults = [(3 + i * (fault_seconds + gap_seconds), 3 + i * (fault_seconds + gap_seconds) + fault_seconds, kind) for i, kind in enumerate(kinds)]
+    policies = [('before', dict((kind, (0.5, 2, None, 1, 1)) for kind in Retry.KINDS), 0),
+                ('retry policy', Retry.RetryPolicy.policies, Retry.RetryPolicy.jitter)]
+    logger = _quiet_logger()
+    fake = FakeSpotify(faults=faults).start()
+    sp_oauth = TokenStore.oauth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, fake.token_url)
+    timers = Timers.TimerQueue(logger, workers=sessions * len(policies)).start()
+    groups = []
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    try:
+        for name, policy, jitter in policies:
+            ad_mutes = []
+            for i in range(sessions):
+                ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+                username = '%s%d' % (name, i)
+                ad_mute.transport = RecordingTransport(logger, username, fake.url)
+                ad_mute.token_manager = TokenManager(logger, sp_oauth, {'access_token': username, 'refresh_token': username, 'token_type': 'Bearer',
+                                                                        'expires_in': 3600, 'expires_at': int(time.time()) + 3600})
+                ad_mute.retry = Retry.RetryPolicy(policies=policy)
+                ad_mute.retry.jitter = jitter
+                ad_mute.start_polling(timers)
+                ad_mutes.append(ad_mute)
+            groups.append((name, ad_mutes))
+        time.sleep(faults[-1][1] + gap_seconds)
+        for _, ad_mutes in groups:
+            for ad_mute in ad_mutes:
+                ad_mute.stop_poll()
+        for _, ad_mutes in groups:
+            for ad_mute in ad_mutes:
+                ad_mute.poll_idle.wait()
+    finally:
+        sys.stdout = stdout
+        timers.stop(1)
+        fake.stop()
+
+    for name, ad_mutes in groups:
+        accounts = set(account(ad_mute.transport.token) for ad_mute in ad_mutes)
+        rows = []
+        for start, end, kind in faults:
+            end += fake.start_time
+            failed = [at for at, token, fault in fake.failed if fault == kind and account(token) in accounts]
+            after = sorted(at for ad_mute in ad_mutes for at in ad_mute.transport.successes if end <= at < end + 5)
+            burst = max([len([other for other in after if at <= other < at + 0.1]) for at in after] or [0])
+            recoveries = []
+            outages = []
+            for ad_mute in ad_mutes:
+                recovered = [at - end for at in ad_mute.transport.successes if at >= end]
+                if recovered:
+                    recoveries.append(recovered[0])
+                username = account(ad_mute.transport.token)
+                first = min([at for at, token, fault in fake.failed if fault == kind and account(token) == username] or [None])
+                if first != None:
+                    outages.append(min([at for at in ad_mute.transport.successes if at > first] or [float('inf')]) - first)
+            rows.append((kind, '%4.1f failed requests per session, burst of %2d requests in 100 ms, recovered %5.2f s mean, %5.2f s max after it cleared, '
+                         '%5.2f s mean after the first failure%s' % (
+                len(failed) / float(sessions), burst, sum(recoveries) / max(len(recoveries), 1), max(recoveries or [0]), sum(outages) / max(len(outages), 1),
+                '' if len(recoveries) == sessions else ', %d sessions never recovered' % (sessions - len(recoveries)))))
+        rows.append(('breaker trips', '%d' % sum(ad_mute.retry.trips() for ad_mute in ad_mutes)))
+        for ad_mute in ad_mutes:
+            ad_mute.transport.close()
+        _print_table('Faults, %s: %d sessions, %d s faults %d s apart' % (name, sessions, fault_seconds, gap_seconds), rows)
+
+# `pactl list sink-inputs` output for other_streams streams of other programs, then Spotify's.
+def _sink_inputs(other_streams):
+    blocks = []
+    binaries = [['firefox', 'discord', 'chromium', 'vlc'][index % 4] for index in range(other_streams)] + ['spotify']
+    for index, binary in enumerate(binaries):
+        blocks.append('Sink Input #%d\n\tDriver: protocol-native.c\n\tOwner Module: 9\n\tClient: %d\n\tSink: 0\n\tSample Specification: s16le 2ch 44100Hz\n'
+                      '\tMute: no\n\tVolume: front-left: 65536 / 100%% / 0.00 dB,   front-right: 65536 / 100%% / 0.00 dB\n\tProperties:\n'
+                      '\t\tmedia.name = "Playback"\n\t\tapplication.name = "%s"\n\t\tapplication.process.id = "%d"\n\t\tapplication.process.binary = "%s"\n'
+                      % (index, 100 + index, binary.capitalize(), 2000 + index, binary))
+    return '\n'.join(blocks)
+
+# Mute Spotify's audio session. Lookup cost and mute latency run the real pactl provider against a stand-in pactl
+# script, so each call pays a real process start; device switches in the middle of ads run against fake sessions.
+def bench_mute(calls=200, stream_counts=(5, 50, 200), ads=200, switch_every=10):
+    import Timers
+    from MuteBackend import FakeSessions, MuteBackend, PulseSessions, SessionMuteBackend
+
+    rows = []
+    folder = tempfile.mkdtemp()
+    try:
+        pactl = os.path.join(folder, 'pactl')
+        with open(pactl, 'w') as script:
+            script.write('#!/bin/sh\ncase "$1" in\n  list) cat "%s" ;;\nesac\n' % os.path.join(folder, 'sink-inputs'))
+        os.chmod(pactl, 0o755)
+        for streams in stream_counts:
+            with open(os.path.join(folder, 'sink-inputs'), 'w') as listing:
+                listing.write(_sink_inputs(streams))
+            for name, cache in [('lookup every call', False), ('cached', True)]:
+                provider = PulseSessions()
+                provider.pactl = pactl
+                backend = SessionMuteBackend(provider, cache)
+                latencies = []
+                for i in range(calls):
+                    start = time.time()
+                    backend.set_mute(i % 2 == 0)
+                    latencies.append(time.time() - start)
+                backend.close()
+                latencies.sort()
+                rows.append(('%3d streams, %s' % (streams + 1, name), 'lookup %6.2f ms x %3d, mute latency mean %6.2f ms, p95 %6.2f ms' % (
+                    backend.lookup_seconds / max(backend.lookups, 1) * 1000, backend.lookups,
+                    sum(latencies) / len(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000)))
+    finally:
+        shutil.rmtree(folder)
+    _print_table('Mute: %d calls through a stand-in pactl' % calls, rows)
+
+    # Mutes whatever plays on the device that was the default when it started, as the device-wide backends did.
+    class CapturedDevice(MuteBackend):
+        name = 'device'
+
+        def __init__(self, sessions):
+            self.sessions = sessions
+            self.device = sessions.device
+
+        def _apply(self, mute):
+            with self.sessions.lock:
+                for session in self.sessions.live:
+                    if session.handle == self.device:
+                        self.sessions.mutes[session.id] = mute
+
+    timers = Timers.TimerQueue(_quiet_logger()).start()
+    rows = []
+    try:
+        for name, watching, make in [
+                ('device captured at start', True, CapturedDevice),
+                ('session, no change events', False, lambda sessions: SessionMuteBackend(sessions, True, timers)),
+                ('session, lookup every call', False, lambda sessions: SessionMuteBackend(sessions, False, timers)),
+                ('session, cached', True, lambda sessions: SessionMuteBackend(sessions, True, timers))]:
+            sessions = FakeSessions(('firefox', 'discord', 'spotify'), lookup_seconds=0.002, watching=watching)
+            backend = make(sessions)
+            audible = 0
+            switches = 0
+            remutes = []
+            for ad in range(ads):
+                backend.set_mute(True)
+                if ad % switch_every == switch_every - 1:
+                    switches += 1
+                    switched_at = time.time()
+                    sessions.switch_device()
+                    time.sleep(0.05)
+                    if sessions.spotify_muted():
+                        remutes.append(sessions.muted_at - switched_at)
+                if not sessions.spotify_muted():
+                    audible += 1
+                backend.set_mute(False)
+            backend.close()
+            rows.append((name, '%3d of %d ads audible, %d of %d switches muted again after %s, %4d lookups' % (
+                audible, ads, len(remutes), switches, '%.2f ms' % (sum(remutes) / len(remutes) * 1000) if remutes else '-',
+                getattr(backend, 'lookups', 0))))
+    finally:
+        timers.stop(1)
+    _print_table('Mute: %d ads, output device switched during every %dth' % (ads, switch_every), rows)
+
+# Store a token for each of usernames in a new TokenStore at path, expiring in expires_in seconds.
+def _seed_store(path, usernames, expires_in=3600):
+    import TokenStore
+    store = TokenStore.TokenStore(path)
+    for username in usernames:
+        store.put_token(username, {'access_token': username, 'refresh_token': username, 'token_type': 'Bearer',
+                                   'expires_in': expires_in, 'expires_at': int(time.time()) + expires_in, 'scope': 'user-read-currently-playing'})
+    return store
+
+# Refresh the token of each of usernames at start_at, as a process whose copy of it expired, and report failures on conn.
+def _refresh_at(conn, usernames, store_path, token_url, start_at):
+    import TokenStore
+    from SpotifyAdMute import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE
+    from TokenManager import TokenManager
+    from spotipy.oauth2 import SpotifyOauthError
+
+    logger = _quiet_logger()
+    sp_oauth = TokenStore.oauth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, token_url)
+    if store_path:
+        store = TokenStore.TokenStore(store_path)
+        managers = [TokenStore.StoredTokenManager(logger, sp_oauth, store, username) for username in usernames]
+    else:
+        managers = [TokenManager(logger, sp_oauth, {'access_token': username, 'refresh_token': username, 'expires_at': 0}) for username in usernames]
+    time.sleep(max(start_at - time.time(), 0))
+    failed = 0
+    for manager in managers:
+        try:
+            manager.refresh(manager.token_info)
+        except SpotifyOauthError:
+            failed += 1
+    conn.send(failed)
+
+# Fleet mode against a fake API in its own process: throughput by number of worker processes, a worker killed and
+# the fleet resized while polling, and many processes refreshing the same accounts at once.
+def bench_fleet(accounts=2000, process_counts=(1, 2, 4), seconds=10, supervised_accounts=400, track_seconds=3, ad_seconds=1, refreshers=4, refreshed_accounts=50):
+    from Fleet import Fleet
+
+    logger = _quiet_logger()
+    usernames = ['account%d' % i for i in range(accounts)]
+    folder = tempfile.mkdtemp()
+    process, conn, url = _spawn_fake(track_seconds=track_seconds, ad_seconds=ad_seconds)
+    rows = []
+    try:
+        store_path = os.path.join(folder, 'fleet.db')
+        _seed_store(store_path, usernames)
+        for processes in process_counts:
+            fleet = Fleet(logger, store_path, processes, api_prefix=url, mute_backend='none').start()
+            time.sleep(2)  # Let workers start and spread their first polls
+            fleet.check()
+            start = fleet.stats()
+            time.sleep(seconds)
+            fleet.check()
+            end = fleet.stats()
+            fleet.stop()
+            polls = end['polls'] - start['polls']
+            cpu_per_poll = (end['cpu'] - start['cpu']) / max(polls, 1)
+            rows.append(('%d processes' % processes, '%6.1f polls/s, worker cpu/poll %.3f ms (%4.0f polls/s per core), %d errors' % (
+                polls / float(seconds), cpu_per_poll * 1000, 1 / cpu_per_poll, end['errors'] - start['errors'])))
+        rows.append(('cores', '%d on this machine, shared with the fake API' % multiprocessing.cpu_count()))
+        _print_table('Fleet: %d accounts, %d s per run' % (accounts, seconds), rows)
+
+        rows = []
+        usernames = usernames[:supervised_accounts]
+        fleet = Fleet(logger, store_path, 4, api_prefix=url, mute_backend='none')
+        fleet.check_interval = 0.1
+        fleet.start(usernames)
+        time.sleep(2)
+        fleet.check()
+        victim = fleet.slots[0]
+        killed_at = time.time()
+        os.kill(victim.process.pid, signal.SIGKILL)
+        while not victim.restarts or not victim.report.get('polls'):
+            time.sleep(fleet.check_interval)
+            fleet.check()
+        rows.append(('worker killed', 'restarted and polling its %d accounts again after %.2f s' % (len(victim.accounts), time.time() - killed_at)))
+        for processes in [3, 4]:
+            moves = fleet.moves
+            resized_at = time.time()
+            fleet.resize(processes)
+            while sum(slot.report.get('accounts', 0) for slot in fleet.slots if slot.alive()) != len(usernames) or any(not slot.report for slot in fleet.slots):
+                time.sleep(fleet.check_interval)
+                fleet.check()
+            rows.append(('resized to %d' % processes, '%3d accounts moved, all polled by their new workers after %.2f s, shards %s' % (
+                fleet.moves - moves, time.time() - resized_at, '/'.join(str(len(slot.accounts)) for slot in fleet.slots))))
+        fleet.stop()
+        stats = fleet.stats()
+        rows.append(('totals', '%d polls, %d errors, %d restarts' % (stats['polls'], stats['errors'], stats['restarts'])))
+        _print_table('Fleet: 4 processes, %d accounts' % len(usernames), rows)
+    finally:
+        conn.send(None)
+        process.join()
+
+    fake = FakeSpotify().start()
+    rows = []
+    try:
+        for name, shared in [('token file per process', False), ('shared token store', True)]:
+            usernames = ['%s%d' % ('shared' if shared else 'files', i) for i in range(refreshed_accounts)]
+            store_path = os.path.join(folder, 'refresh%d.db' % shared)
+            _seed_store(store_path, usernames, expires_in=0)
+            refreshes = fake.refreshes
+            rejected = fake.rejected_refreshes
+            start_at = time.time() + 1
+            pipes = []
+            for _ in range(refreshers):
+                parent, child = multiprocessing.Pipe()
+                refresher = multiprocessing.Process(target=_refresh_at, args=(child, usernames, store_path if shared else None, fake.token_url, start_at))
+                refresher.start()
+                pipes.append((refresher, parent))
+            failed = 0
+            for refresher, parent in pipes:
+                failed += parent.recv()
+                refresher.join()
+            rows.append((name, '%3d refreshes, %3d rejected, %3d of %d process-accounts left without a token, %.2f s' % (
+                fake.refreshes - refreshes, fake.rejected_refreshes - rejected, failed, refreshers * refreshed_accounts, time.time() - start_at)))
+    finally:
+        fake.stop()
+        shutil.rmtree(folder)
+    _print_table('Fleet: %d processes refreshing the same %d accounts at once' % (refreshers, refreshed_accounts), rows)
+
+# Compare the fixed and predictive schedulers over simulated listening with skips, pauses and API outages.
+def bench_scheduler(hours=1000, seed=1):
+    import Simulation
+    from SpotifyAdMute import SpotifyAdMute
+
+    for scheduler in SpotifyAdMute.Scheduler:
+        start = time.time()
+        result = Simulation.simulate(hours, seed, scheduler)
+        _print_table('Scheduler %s: %d simulated hours in %.1f s' % (scheduler.name, hours, time.time() - start), result.rows())
+
+# Replay listening histories (one simulated session per seed) under the fixed policy and under the cadence scheduler,
+# once learning from scratch every session and once keeping the learned model on disk between sessions.
+def bench_cadence(sessions=40, hours=6):
+    import Cadence
+    import Simulation
+    from SpotifyAdMute import SpotifyAdMute
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = Cadence.cache_path(folder, 'bench')
+        policies = [('Fixed', SpotifyAdMute.Scheduler.Fixed, None),
+                    ('Predictive', SpotifyAdMute.Scheduler.Predictive, None),
+                    ('Cadence, new model', SpotifyAdMute.Scheduler.Cadence, None),
+                    ('Cadence, saved model', SpotifyAdMute.Scheduler.Cadence, path)]
+        rows = []
+        fixed_calls = None
+        for name, scheduler, model_path in policies:
+            calls = leaked = false_mute = 0
+            for seed in range(1, sessions + 1):
+                def configure(ad_mute):
+                    if model_path:
+                        ad_mute.cadence = Cadence.load(model_path)
+                        configure.ad_mute = ad_mute
+                result = Simulation.simulate(hours, seed, scheduler, configure)
+                if model_path:
+                    configure.ad_mute.cadence.save()
+                calls += result.api_calls
+                leaked += result.leaked_ad_seconds
+                false_mute += result.false_mute_seconds
+            fixed_calls = fixed_calls or calls
+            rows.append((name, '%6.1f calls/hour (%+5.1f%%), leaked %.1f s/hour, false mute %.1f s/hour' % (
+                calls / float(sessions * hours), 100.0 * (calls - fixed_calls) / fixed_calls,
+                leaked / (sessions * hours), false_mute / (sessions * hours))))
+        _print_table('Ad cadence: %d replayed sessions of %d hours' % (sessions, hours), rows)
+    finally:
+        shutil.rmtree(folder)
+
+# Trade ad audio heard against music muted by pre-muting at predicted track ends, for both schedulers and several leads.
+def bench_premute(hours=1000, seed=1, leads=(0, 0.1, 0.5, 1)):
+    import Simulation
+    from SpotifyAdMute import SpotifyAdMute
+
+    for scheduler in SpotifyAdMute.Scheduler:
+        rows = []
+        for lead in (None,) + tuple(leads):
+            def configure(ad_mute):
+                ad_mute.premute = lead != None
+                ad_mute.premute_lead = lead or 0
+            result = Simulation.simulate(hours, seed, scheduler, configure)
+            latencies = result.mute_latencies or [0]
+            rows.append(('off' if lead == None else 'lead %g s' % lead, 'leaked %5.0f ms/hour, false mute %6.0f ms/hour, mute latency %.2f s, %d API calls' % (
+                result.leaked_ad_seconds / hours * 1000, result.false_mute_seconds / hours * 1000,
+                sum(latencies) / len(latencies), result.api_calls)))
+        _print_table('Pre-mute, scheduler %s: %d simulated hours' % (scheduler.name, hours), rows)
+
+# Poll more accounts than a rate-limited fake API allows, with and without a shared request budget.
+def bench_ratelimit(accounts=200, seconds=20, workers=8, limit=150, window=5, track_seconds=3, ad_seconds=1):
+    from Engine import Engine
+    from MuteBackend import FakeMuteBackend
+    from RateLimit import RequestBudget
+
+    rate = float(limit) / window
+    for budget in [None, RequestBudget(rate * 0.9, burst=int(rate))]:
+        process, conn, url = _spawn_fake(track_seconds=track_seconds, ad_seconds=ad_seconds, rate_limit=(limit, window))
+        engine = Engine(_quiet_logger(), workers=workers, api_prefix=url, budget=budget, mute_backend=FakeMuteBackend)
+        stdout = sys.stdout
+        sys.stdout = NullWriter()
+        try:
+            for i in range(accounts):
+                engine.add_account('account%d' % i, 'account%d' % i)
+            engine.start()
+            time.sleep(seconds)
+            engine.stop()
+        finally:
+            sys.stdout = stdout
+            conn.send(None)
+            process.join()
+
+        polls = sum(account.polls for account in engine.accounts.values())
+        throttled = sum(account.throttled for account in engine.accounts.values())
+        lateness = sum(account.lateness for account in engine.accounts.values())
+        rows = [
+            ('polls', '%d (%.1f/s)' % (polls, polls / float(seconds))),
+            ('429 responses', '%d' % throttled),
+            ('useful polls', '%d' % (polls - throttled)),
+            ('mean lateness', '%.3f ms' % (lateness / polls * 1000 if polls else 0)),
+        ]
+        if budget:
+            stats = budget.stats()
+            rows += [
+                ('budget wait', 'mean %.3f s' % stats['mean_wait']),
+                ('prioritized', '%d near track ends' % stats['prioritized']),
+                ('throttled', '%d times, %d s' % (stats['throttles'], stats['throttled_seconds'])),
+            ]
+        _print_table('Rate limit %d requests/%ds, %d accounts, %s' % (
+            limit, window, accounts, 'budget %.0f/s' % budget.rate if budget else 'no budget'), rows)
+
+# Cost of metric updates, of collecting them across a simulated poll loop, and of a scrape.
+def bench_metrics(updates=200000, hours=200):
+    import Metrics
+    import Simulation
+    import requests
+
+    rows = []
+    for name, update in [('counter inc', lambda: Metrics.retries_total.inc()),
+                         ('labelled inc', lambda: Metrics.requests_total.inc(labels=('ok',))),
+                         ('histogram observe', lambda: Metrics.request_seconds.observe(0.12, ('ok',))),
+                         ('gauge set', lambda: Metrics.queue_depth.set(3, ('dispatch',)))]:
+        start = time.time()
+        for _ in range(updates):
+            update()
+        rows.append((name, '%.2f us' % ((time.time() - start) / updates * 1000000)))
+
+    # Best of alternating runs, since the difference is small next to run-to-run noise
+    timings = {False: float('inf'), True: float('inf')}
+    for _ in range(3):
+        for enabled in [False, True]:
+            Metrics.registry.reset()
+            Metrics.enabled = enabled
+            start = time.time()
+            result = Simulation.simulate(hours)
+            timings[enabled] = min(timings[enabled], (time.time() - start) / result.api_calls)
+    overhead = timings[True] - timings[False]
+    rows.append(('simulated poll', '%.1f us without metrics, %.1f us with' % (timings[False] * 1000000, timings[True] * 1000000)))
+    rows.append(('overhead', '%+.1f us per poll' % (overhead * 1000000)))
+
+    count, total = Metrics.time_to_mute_seconds.totals()
+    rows.append(('time to mute', 'mean %.2f s over %d ad breaks' % (total / count if count else 0, count)))
+
+    server = Metrics.MetricsServer(0).start()
+    session = requests.Session()
+    start = time.time()
+    for _ in range(100):
+        payload = session.get(server.url).content
+    rows.append(('scrape', '%.2f ms, %d bytes' % ((time.time() - start) / 100 * 1000, len(payload))))
+    session.close()
+    server.stop()
+
+    _print_table('Metrics: %d updates each, %d simulated hours' % (updates, hours), rows)
+
+benchmarks = {
+    'coldstart': bench_coldstart,
+    'cadence': bench_cadence,
+    'console': bench_console,
+    'dispatch': bench_dispatch,
+    'engine': bench_engine,
+    'faults': bench_faults,
+    'fleet': bench_fleet,
+    'idle': bench_idle,
+    'logs': bench_logs,
+    'metrics': bench_metrics,
+    'mute': bench_mute,
+    'premute': bench_premute,
+    'ratelimit': bench_ratelimit,
+    'scheduler': bench_scheduler,
+    'shutdown': bench_shutdown,
+    'snapshot': bench_snapshot,
+    'sources': bench_sources,
+    'startup': bench_startup,
+    'timers': bench_timers,
+    'timeline': bench_timeline,
+    'transport': bench_transport,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run Spotify Ad Mute benchmarks.')
+    parser.add_argument('names', nargs='*', default=sorted(benchmarks), help='benchmarks to run (default: all)')
+    args = parser.parse_args()
+
+    for name in args.names:
+        benchmarks[name]()
@@ -0,0 +1,127 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Learns how often an account gets ads and how long they last
+'''
+
+import json
+import os
+
+VERSION = 1
+
+# Learns an account's ad cadence from what the poll loop sees: how many tracks play between ad breaks, and how long
+# each ad runs. Older observations fade out, so the model follows Spotify if it changes the cadence.
+class CadenceModel(object):
+    max_tracks = 32  # Longer gaps between ad breaks are counted as this many tracks
+    decay = 0.98  # Weight kept by older observations each time a new one comes in
+    min_breaks = 5  # Gaps to see before trusting the model; until then every track end may bring an ad
+    min_ad_share = 0.05  # Ignore ad lengths seen less often than this
+    missed_track_seconds = 5  # A track starting this long after the last one was predicted to end means one was missed
+    max_ad_seconds = 120
+
+    def __init__(self, path=None):
+        self.path = path  # Where save() writes the model, if anywhere
+        self.gaps = [0.0] * (self.max_tracks + 1)  # Weight of ad breaks that came after each number of tracks
+        self.ad_lengths = {}  # Whole seconds -> weight
+
+        # What has been seen since the last ad break. Not saved, since Spotify keeps counting while we are not running.
+        self.tracks = None  # Tracks started since the last ad break, or None if we have not seen one yet
+        self.last_track = None
+        self.ad_started_at = None  # Clock time the current ad started
+
+    # A poll saw track key playing. started_at is when it started, and previous_ends_at when the track before it
+    # was predicted to end, if one was playing.
+    def track_playing(self, key, started_at, previous_ends_at=None):
+        if key == self.last_track:
+            return
+        self.last_track = key
+        if self.tracks != None:
+            self.tracks += 1
+            if previous_ends_at != None and started_at - previous_ends_at > self.missed_track_seconds:
+                self.tracks += 1  # Something short played between polls
+
+    # A poll saw the first ad of a break.
+    def ad_break_started(self):
+        if self.tracks != None:
+            self._fade(self.gaps)
+            self.gaps[min(self.tracks, self.max_tracks)] += 1
+        self.tracks = 0
+        self.last_track = None
+
+    # A poll saw an ad that started at started_at. If it is a new ad, the one before it ended then.
+    def ad_playing(self, started_at):
+        if self.ad_started_at != None and started_at - self.ad_started_at >= 1:
+            self.ad_ended(started_at)
+        if self.ad_started_at == None:
+            self.ad_started_at = started_at
+
+    # The ad that was playing ended at ended_at.
+    def ad_ended(self, ended_at):
+        if self.ad_started_at != None:
+            seconds = int(round(ended_at - self.ad_started_at))
+            if 1 <= seconds <= self.max_ad_seconds:
+                self._fade(self.ad_lengths)
+                self.ad_lengths[seconds] = self.ad_lengths.get(seconds, 0) + 1
+        self.ad_started_at = None
+
+    # Playback stopped, so we cannot tell when the current ad ends.
+    def paused(self):
+        self.ad_started_at = None
+
+    def _fade(self, weights):
+        for key in (weights.keys() if isinstance(weights, dict) else range(len(weights))):
+            weights[key] *= self.decay
+
+    # Probability that an ad break follows the track playing now.
+    def ad_probability(self):
+        if self.tracks == None or sum(self.gaps) < self.min_breaks:
+            return 1.0
+        track = min(self.tracks, self.max_tracks)
+        later = sum(self.gaps[track:])
+        return (self.gaps[track] + 1) / (later + 1)  # Never fully rules out an ad, and is 1 past the longest gap seen
+
+    # Length of the shortest common ad that is still playing after elapsed seconds, or None if unknown.
+    def ad_ends_after(self, elapsed):
+        total = sum(self.ad_lengths.values())
+        if total < self.min_breaks:
+            return None
+        lengths = [seconds for seconds, weight in self.ad_lengths.items() if weight >= self.min_ad_share * total and seconds > elapsed]
+        return min(lengths) if lengths else None
+
+    def to_json(self):
+        return {'version': VERSION, 'gaps': self.gaps, 'ad_lengths': dict((str(seconds), weight) for seconds, weight in self.ad_lengths.items())}
+
+    # Write the model to path, replacing the previous copy in one step.
+    def save(self):
+        if not self.path:
+            return
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as cache:
+            json.dump(self.to_json(), cache)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Windows cannot rename over an existing file
+        os.rename(temporary, self.path)
+
+# Model saved at path, or a new one that will be saved there. Raises ValueError if the file is unreadable.
+def load(path):
+    model = CadenceModel(path)
+    try:
+        with open(path, 'r') as cache:
+            saved = json.load(cache)
+    except (IOError, OSError):
+        return model
+
+    try:
+        if saved['version'] != VERSION:
+            raise ValueError()
+        gaps = [float(weight) for weight in saved['gaps']][:model.max_tracks + 1]
+        ad_lengths = dict((int(seconds), float(weight)) for seconds, weight in saved['ad_lengths'].items())
+    except (KeyError, TypeError, AttributeError, ValueError):
+        raise ValueError('%s is not a version %d cadence model' % (path, VERSION))
+    model.gaps[:len(gaps)] = gaps
+    model.ad_lengths = ad_lengths
+    return model
+
+# Where an account's model is kept.
+def cache_path(cache_folder, username):
+    return '%s/.cadence-%s' % (cache_folder, username)
@@ -0,0 +1,44 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Cancels blocking work, such as a request in progress, from another thread
+'''
+
+import threading
+
+# Set once, from any thread, when work should stop. Code about to block registers a callback that unblocks it,
+# e.g. aborting a request or waking a queue, so cancelling does not have to wait for timeouts.
+class Cancellation(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.callbacks = []
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # Unblocking is best effort; the deadline still holds
+
+    # Call callback when cancelled, right away if already cancelled.
+    def register(self, callback):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def unregister(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
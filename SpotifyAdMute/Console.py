@@ -0,0 +1,87 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Bounded details console for Spotify Ad Mute
+'''
+
+import collections
+import threading
+import time
+
+# Thread-safe buffer of the lines written since the last take_pending(), capped at max_lines.
+# The widget itself keeps the lines already shown, trimmed to the same cap.
+class ConsoleBuffer(object):
+    def __init__(self, max_lines=1000):
+        self.max_lines = max_lines
+        self.pending = collections.deque(maxlen=max_lines)
+        self.partial = ''  # Text after the last newline
+        self.lock = threading.Lock()
+
+    # Append text. Returns True if it completed at least one line.
+    def write(self, string):
+        with self.lock:
+            parts = (self.partial + string).split('\n')
+            self.partial = parts.pop()
+            self.pending.extend(parts)
+            return len(parts) > 0
+
+    # Get and forget lines that have not been shown yet.
+    def take_pending(self):
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            return lines
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.partial = ''
+
+# File-like stdout replacement that shows output in a Tk Text widget.
+# Writes from any thread are buffered and flushed to the widget at most once per flush_interval.
+class TkConsole(object):
+    flush_interval = 0.1  # Seconds
+
+    def __init__(self, widget, dispatcher, max_lines=1000):
+        self.widget = widget
+        self.dispatcher = dispatcher
+        self.buffer = ConsoleBuffer(max_lines)
+        self.flush_scheduled = False
+        self.last_flush = 0
+
+    def write(self, string):
+        if self.buffer.write(string) and not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.dispatcher.request(self._schedule_flush)
+
+    def flush(self):
+        pass
+
+    # Clear buffered output and the widget. Runs on the Tk main thread.
+    def clear(self):
+        self.buffer.clear()
+        self.widget.configure(state='normal')
+        self.widget.delete('1.0', 'end')
+        self.widget.configure(state='disabled')
+
+    def _schedule_flush(self):
+        delay = max(0, self.last_flush + self.flush_interval - time.time())
+        self.widget.after(int(delay * 1000), self._flush_to_widget)
+
+    def _flush_to_widget(self):
+        self.flush_scheduled = False  # Clear before taking so later writes schedule another flush
+        self.last_flush = time.time()
+        lines = self.buffer.take_pending()
+        if not lines:
+            return
+
+        self.widget.configure(state='normal')
+        self.widget.insert('end', '\n'.join(lines) + '\n')
+
+        # Drop the oldest lines beyond the cap. The widget always ends with an empty line.
+        line_count = int(self.widget.index('end-1c').split('.')[0]) - 1
+        if line_count > self.buffer.max_lines:
+            self.widget.delete('1.0', '%d.0' % (line_count - self.buffer.max_lines + 1))
+
+        self.widget.see('end')
+        self.widget.configure(state='disabled')
@@ -0,0 +1,116 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Headless command-line entry point for Spotify Ad Mute
+'''
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import signal
+import sys
+
+import Logs
+import MuteBackend
+import ProcessWatch
+import Timers
+import TokenStore
+from Engine import HeadlessApp
+from SpotifyAdMute import SpotifyAdMute, SpotifyAdMuteException
+from Transport import API_PREFIX
+
+# Talks to the user through the terminal instead of dialogs.
+class DaemonApp(HeadlessApp):
+    def __init__(self, username, cache_folder):
+        self.username = username
+        self.cache_folder = cache_folder
+
+    def prompt_user(self, title, message):
+        print('%s\n%s' % (title, message))
+        return raw_input('> ')
+
+    # Nobody is around to answer, so keep trying.
+    def ask_user_yesno(self, title, message):
+        return True
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt()
+
+# Log in and poll until interrupted. Returns the process exit code.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mute Spotify ads without the GUI.')
+    parser.add_argument('username', help='Spotify username to monitor')
+    parser.add_argument('--scheduler', choices=[scheduler.name for scheduler in SpotifyAdMute.Scheduler], default='Fixed')
+    parser.add_argument('--premute', action='store_true', help='mute at the predicted end of each track in case an ad follows')
+    parser.add_argument('--premute-lead', type=float, default=SpotifyAdMute.premute_lead, help='seconds before the predicted track end to pre-mute')
+    parser.add_argument('--source', choices=['web', 'mpris'], default=SpotifyAdMute.playback_source,
+                        help='where to read playback: web polls the Web API, mpris listens to the local Linux client (falling back to web)')
+    parser.add_argument('--idle-max-sleep', type=float, default=SpotifyAdMute.idle_max_sleep, help='longest wait between polls while nothing plays')
+    parser.add_argument('--no-client-watch', action='store_true',
+                        help='keep polling while no Spotify desktop client runs on this machine (e.g. for the web player)')
+    parser.add_argument('--mute-backend', choices=MuteBackend.BACKENDS, default='auto',
+                        help="how to mute: the *-session backends (auto) mute only Spotify's audio, pycaw and pactl the whole output device, none only logs what would happen")
+    parser.add_argument('--cache-folder', default='.data')
+    parser.add_argument('--token-store', help='keep the token and profile in this SQLite file, shared with Fleet.py, instead of the cache folder')
+    parser.add_argument('--log-folder', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), '.logs'))
+    parser.add_argument('--quiet-polls', action='store_true', help='skip per-poll log lines')
+    parser.add_argument('--polls', type=int, default=0, help='stop after this many polls (default: run forever)')
+    parser.add_argument('--api-prefix', default=API_PREFIX, help='Spotify Web API root, e.g. a local stand-in for testing')
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve metrics at http://127.0.0.1:PORT/metrics (default: off)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.cache_folder):
+        os.makedirs(args.cache_folder)
+    logger = logging.getLogger('SpotifyAdMute')
+    Logs.init_logger(logger, args.log_folder, {'Poll': logging.WARNING if args.quiet_polls else logging.INFO})
+    logger.info('Daemon: Starting for %s.' % args.username)
+
+    signal.signal(signal.SIGTERM, _terminate)
+    ad_mute = None
+    metrics_server = None
+    try:
+        if args.metrics_port:
+            import Metrics
+            metrics_server = Metrics.MetricsServer(args.metrics_port).start()
+            logger.info('Daemon: Serving metrics at %s.' % metrics_server.url)
+        ad_mute = SpotifyAdMute(DaemonApp(args.username, args.cache_folder), logger, MuteBackend.create(args.mute_backend))
+        ad_mute.scheduler = SpotifyAdMute.Scheduler[args.scheduler]
+        ad_mute.premute = args.premute
+        ad_mute.premute_lead = args.premute_lead
+        ad_mute.playback_source = args.source
+        ad_mute.idle_max_sleep = args.idle_max_sleep
+        if not args.no_client_watch:
+            ad_mute.process_watch = ProcessWatch.default()
+        ad_mute.api_prefix = args.api_prefix
+        if args.token_store:
+            ad_mute.token_store = TokenStore.TokenStore(args.token_store)
+        ad_mute.login(args.username)
+        print('Monitoring Spotify for %s. Press Ctrl+C to stop.' % ad_mute.first_name)
+
+        polls = 0
+        while not args.polls or polls < args.polls:
+            ad_mute.poll()
+            polls += 1
+    except (SpotifyAdMuteException, MuteBackend.MuteBackendException, TokenStore.TokenStoreException) as err:
+        print(str(err), file=sys.stderr)
+        logger.error('Daemon: Stopping after exception: %s' % str(err))
+        return 1
+    except KeyboardInterrupt:
+        print('Stopped monitoring.')
+    finally:
+        if metrics_server:
+            metrics_server.stop()
+        if ad_mute and ad_mute.mute_backend:
+            ad_mute.clear_cache()
+            ad_mute.mute_backend.close()  # Stops pactl subscribe for the pactl-session backend
+        if ad_mute and ad_mute.transport:
+            ad_mute.transport.close()  # Stops dbus-monitor for the mpris source
+        Timers.shutdown(1)
+        logger.info('Daemon: Stopped.')
+        Logs.shutdown(logger)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Runs requests from other threads on the Tk main thread
+'''
+
+import time
+import Queue
+from Tkinter import TclError
+
+import Metrics
+
+# Queues requests from any thread and wakes the Tk main loop with a virtual event, so requests are serviced
+# as soon as Tk is idle instead of on a timer. Repeated repaint-only requests queued in the meantime
+# are serviced once.
+class TkDispatcher(object):
+    event = '<<DispatchRequest>>'
+
+    def __init__(self, master, logger):
+        self.master = master
+        self.logger = logger
+        self.requests = Queue.Queue()
+        self.coalesced = []  # Functions that only repaint, so one call stands in for many
+        self.wakeup_pending = False
+        self.closed = False
+
+        # End-to-end latency from request to service (in seconds)
+        self.serviced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+        self.master.bind(self.event, self.service)
+
+    # Service func once per wakeup no matter how many times it was requested.
+    def coalesce(self, func):
+        self.coalesced.append(func)
+
+    # Add a request to the queue. Safe to call from any thread.
+    def request(self, func, arg=None, response_queue=None):
+        self.requests.put((func, arg, response_queue, time.time()))
+        if self.wakeup_pending or self.closed:
+            return
+
+        self.wakeup_pending = True
+        try:
+            self.master.event_generate(self.event, when='tail')
+        except (TclError, RuntimeError) as err:
+            self.wakeup_pending = False  # Tk is shutting down
+            self.logger.warn('Dispatch: Could not wake Tk main loop: %s' % str(err))
+
+    # Stop waking the Tk main loop, e.g. while it is being destroyed.
+    def close(self):
+        self.closed = True
+
+    # Service all queued requests. Runs on the Tk main thread.
+    def service(self, event=None):
+        self.wakeup_pending = False  # Clear before draining so later requests wake us again
+        Metrics.queue_depth.set(self.requests.qsize(), ('dispatch',))
+        repaints = []
+        while True:
+            try:
+                func, arg, response_queue, queued_at = self.requests.get_nowait()
+            except Queue.Empty:
+                break
+
+            if arg == None and response_queue == None and func in self.coalesced:
+                if func not in [repaint for repaint, _ in repaints]:
+                    repaints.append((func, queued_at))
+                continue
+
+            self.logger.info('Dispatch: Got request: {%s} {%s} {%s}.', func, arg, response_queue)
+            try:
+                if arg == None:
+                    response = func()
+                else:
+                    response = func(*arg)
+            except Exception as err:
+                self.logger.error('Dispatch: While servicing request {%s}, got exception: %s' % (func, str(err)))
+                response = None
+            if response_queue:
+                response_queue.put(response)
+            self._record_latency(queued_at)
+
+        for func, queued_at in repaints:
+            try:
+                func()
+            except Exception as err:
+                self.logger.error('Dispatch: While servicing request {%s}, got exception: %s' % (func, str(err)))
+            self._record_latency(queued_at)
+
+    def _record_latency(self, queued_at):
+        latency = time.time() - queued_at
+        self.serviced += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def log_stats(self):
+        if self.serviced:
+            self.logger.info('Dispatch: Serviced %d requests. Mean latency %.1f ms, max %.1f ms.' % (
+                self.serviced, self.latency_total / self.serviced * 1000, self.latency_max * 1000))
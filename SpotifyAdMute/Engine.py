@@ -0,0 +1,213 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Polls many Spotify accounts from a single scheduler thread
+'''
+
+from __future__ import print_function
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+import Queue
+
+import Cancellation
+import Metrics
+import Retry
+from SpotifyAdMute import SpotifyAdMute
+from Transport import API_PREFIX, Transport
+
+# Stands in for the Gui when accounts are monitored without one.
+class HeadlessApp(object):
+    cache_folder = '.data'
+    username = None
+
+    # Service requests immediately on the calling thread.
+    def request(self, func, arg=None, response_queue=None):
+        if arg == None:
+            response = func()
+        else:
+            response = func(*arg)
+        if response_queue:
+            response_queue.put(response)
+
+    def set_currently_playing_label(self):
+        pass
+
+    def ask_user_yesno(self, title, message):
+        return False
+
+    def stop_ad_mute(self):
+        pass
+
+# A monitored account and its scheduling bookkeeping.
+class Account(object):
+    def __init__(self, username, transport, ad_mute, token_manager=None):
+        self.username = username
+        self.transport = transport
+        self.ad_mute = ad_mute
+        self.token_manager = token_manager
+        self.polls = 0
+        self.errors = 0
+        self.throttled = 0  # Polls answered with 429
+        self.lateness = 0.0  # Total seconds that polls were dispatched after they were due
+
+# Polls every account on one scheduler thread. Blocking HTTP runs on a fixed pool of workers,
+# so the number of threads does not grow with the number of accounts.
+# Pass a RateLimit.RequestBudget to keep all accounts together under the app's rate limit, and mute_backend, a function
+# returning a MuteBackend, to mute some other way than the platform default (e.g. FakeMuteBackend in benchmarks).
+# Failed polls are retried when each account's Retry.RetryPolicy says, as they are for a single account.
+class Engine(object):
+    error_sleep = 4  # Seconds to wait before polling an account whose poll failed unexpectedly
+    scheduler = SpotifyAdMute.Scheduler.Fixed
+
+    def __init__(self, logger, workers=8, api_prefix=API_PREFIX, budget=None, mute_backend=None):
+        self.logger = logger
+        self.workers = workers
+        self.api_prefix = api_prefix
+        self.budget = budget
+        self.mute_backend = mute_backend
+        self.app = HeadlessApp()
+        self.accounts = {}
+
+        self.lock = threading.Lock()
+        self.schedule = []  # Heap of (due, sequence, account)
+        self.sequence = itertools.count()
+        self.fetches = Queue.PriorityQueue()  # (-priority, sequence, account) waiting for a worker; polls near a track end go first
+        self.completed = Queue.Queue()  # (account, results, failure, retry_in) from workers, as _try_get_currently_playing returns them
+        self.threads = []
+        self.quit = threading.Event()
+
+    # Start monitoring an account. Its first poll happens as soon as possible.
+    # Pass a TokenManager to keep a long-running account's token fresh, and refresh it when Spotify rejects it.
+    # Raises SpotifyAdMuteException if the account's mute backend could not be set up.
+    def add_account(self, username, token, token_manager=None):
+        transport = Transport(self.logger, token, self.api_prefix)
+        ad_mute = SpotifyAdMute(self.app, self.logger, self.mute_backend() if self.mute_backend else None)
+        account = Account(username, transport, ad_mute, token_manager)
+        ad_mute.username = username
+        ad_mute.transport = transport
+        ad_mute.token_manager = token_manager
+        account.ad_mute.scheduler = self.scheduler
+        account.ad_mute.budget = self.budget
+        with self.lock:
+            self.accounts[username] = account
+            self._schedule(account, time.time())
+        self.completed.put(None)  # Wake the scheduler
+        self.logger.info('Engine: Added account %s.' % username)
+        return account
+
+    # Stop monitoring an account. An in-flight poll is discarded when it completes.
+    def remove_account(self, username):
+        with self.lock:
+            account = self.accounts.pop(username, None)
+        if account:
+            account.transport.close()
+            account.ad_mute.mute_backend.close()
+        self.logger.info('Engine: Removed account %s.' % username)
+
+    def _schedule(self, account, due):
+        heapq.heappush(self.schedule, (due, next(self.sequence), account))
+
+    # Start the scheduler and worker threads.
+    def start(self):
+        self.quit.clear()
+        with self.lock:
+            for account in self.accounts.values():
+                account.ad_mute.cancellation = Cancellation.Cancellation()  # Replaces the one a previous stop() cancelled
+        self.threads = [threading.Thread(target=self._work) for _ in range(self.workers)]
+        self.threads.append(threading.Thread(target=self.run))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+        self.logger.info('Engine: Started with %d workers.' % self.workers)
+
+    # Stop all threads, ending requests in progress and waits for the request budget at once. Waits up to timeout seconds (forever if None) for threads to exit.
+    # Returns True if they all did.
+    def stop(self, timeout=None):
+        self.logger.info('Engine: Stopping.')
+        self.quit.set()
+        self.completed.put(None)
+        for _ in range(self.workers):
+            self.fetches.put((-sys.maxsize, next(self.sequence), None))
+        with self.lock:
+            accounts = list(self.accounts.values())
+        for account in accounts:
+            account.ad_mute.cancellation.cancel()
+
+        deadline = None if timeout == None else time.time() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline == None else max(deadline - time.time(), 0))
+        stopped = not any(thread.is_alive() for thread in self.threads)
+        if not stopped:
+            self.logger.warning('Engine: Threads did not stop within %g seconds.' % timeout)
+        self.threads = []
+        if self.budget:
+            self.logger.info('Engine: Request budget stats: %s' % self.budget.stats())
+        self.logger.info('Engine: Stopped.')
+        return stopped
+
+    # Scheduler loop: dispatch due polls and feed completed polls through each account's state machine.
+    def run(self):
+        while not self.quit.is_set():
+            now = time.time()
+            with self.lock:
+                while self.schedule and self.schedule[0][0] <= now:
+                    due, _, account = heapq.heappop(self.schedule)
+                    account.lateness += now - due
+                    self.fetches.put((-account.ad_mute.boundary_priority(), next(self.sequence), account))
+                Metrics.queue_depth.set(self.fetches.qsize(), ('fetches',))
+                timeout = self.schedule[0][0] - now if self.schedule else None
+
+            try:
+                event = self.completed.get(timeout=timeout)
+            except Queue.Empty:
+                continue
+
+            while event:
+                self._complete(*event)
+                try:
+                    event = self.completed.get_nowait()
+                except Queue.Empty:
+                    event = None
+
+    def _complete(self, account, results, failure, retry_in):
+        if self.accounts.get(account.username) is not account:
+            return  # Removed while polling
+
+        account.polls += 1
+        if failure == None:
+            try:
+                duration = account.ad_mute.update_state(results)
+            except Exception as err:
+                self.logger.error('Engine: While updating the state of %s, got exception: %s' % (account.username, str(err)))
+                account.errors += 1
+                duration = self.error_sleep
+        else:
+            if failure == Retry.THROTTLE:
+                account.throttled += 1
+            else:
+                account.errors += 1
+            duration = retry_in
+
+        with self.lock:
+            self._schedule(account, time.time() + duration)
+
+    # Worker loop: run blocking requests for accounts handed over by the scheduler. Each goes through the account's own
+    # request path, which waits for the budget, refreshes a rejected token and classifies failures for its retry policy.
+    def _work(self):
+        while True:
+            _, _, account = self.fetches.get()
+            if account is None:
+                return
+
+            try:
+                results, failure, retry_in = account.ad_mute._try_get_currently_playing()
+            except Exception as err:
+                self.logger.error('Engine: While polling %s, got unexpected exception: %s' % (account.username, str(err)))
+                results, failure, retry_in = None, Retry.SERVER, self.error_sleep
+            if self.quit.is_set():
+                continue  # Aborted by stop()
+            self.completed.put((account, results, failure, retry_in))
@@ -0,0 +1,268 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Local stand-in for the Spotify Web API, used by benchmarks
+'''
+
+from __future__ import print_function
+
+import collections
+import json
+import math
+import threading
+import time
+import zlib
+import BaseHTTPServer
+import SocketServer
+import urlparse
+
+# Real track objects list every market they are available in, which dominates the payload size
+MARKETS = ['%s%s' % (a, b) for a in 'ABCDEFGHIJKLMN' for b in 'ABCDEFGHIJKLM']
+
+# Handles requests against the fake API.
+class FakeSpotifyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive
+    wbufsize = -1  # Send each response in one write rather than one per header
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        fake = self.server.fake
+        path = self.path.split('?')[0].rstrip('/')
+        fake.count_request(path)
+        token = self.headers.get('Authorization', '').replace('Bearer ', '')
+
+        if fake.should_stall():
+            time.sleep(fake.stall[1])  # The client sees a request that hangs
+
+        fault, fault_ends_in = fake.fault(token)
+        if fault == 'network':
+            self.close_connection = True  # Hang up without answering
+            return
+        retry_after = fake.check_rate_limit()
+        if fault == 'throttle':
+            retry_after = max(1, int(math.ceil(fault_ends_in)))
+        if fault == 'auth':
+            self._send(401, {'error': {'status': 401, 'message': 'The access token expired'}})
+        elif fault == 'server':
+            self._send(503, {'error': {'status': 503, 'message': 'Service unavailable'}})
+        elif retry_after:
+            self._send(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, headers={'Retry-After': str(retry_after)})
+        elif path == '/v1/me/player/currently-playing':
+            self._send(200, fake.currently_playing(token), fake.etags)
+        elif path == '/v1/me':
+            self._send(200, {'id': account(token), 'display_name': account(token)})
+        else:
+            self._send(404, {'error': {'status': 404, 'message': 'Not found'}})
+
+    # Token endpoint (accounts.spotify.com/api/token), for refreshes only.
+    def do_POST(self):
+        fake = self.server.fake
+        path = self.path.split('?')[0].rstrip('/')
+        fake.count_request(path)
+        form = urlparse.parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        if path != '/api/token' or form.get('grant_type') != ['refresh_token']:
+            self._send(404, {'error': {'status': 404, 'message': 'Not found'}})
+            return
+        token_info = fake.refresh(form.get('refresh_token', [''])[0])
+        if token_info == None:
+            self._send(400, {'error': 'invalid_grant', 'error_description': 'Invalid refresh token'})
+        else:
+            self._send(200, token_info)
+
+    def _send(self, status, body, etags=False, headers=None):
+        payload = json.dumps(body, sort_keys=True).encode('utf-8')
+        etag = '"%08x"' % (zlib.crc32(payload) & 0xffffffff)
+        if etags and self.headers.get('If-None-Match') == etag:
+            status = 304
+            payload = b''
+
+        self.send_response(status)
+        if etags:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Keep benchmark output clean.
+    def log_message(self, format, *args):
+        pass
+
+# Account a token was issued for.
+def account(token):
+    return token.split('~')[0]
+
+class FakeSpotifyServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+# Serves a scripted playlist per token: ad_every tracks of track_seconds, then an ad of ad_seconds.
+# Tokens starting with 'paused' are always paused.
+# rate_limit=(requests, seconds) answers 429 with Retry-After once more than requests arrive in a rolling window, like Spotify does.
+# stall=(every, seconds) holds every n-th request for seconds before answering, like a stalled network.
+# faults=[(start, end, kind)] fails every request between start and end seconds after starting: 'throttle' answers 429
+# with Retry-After, 'server' 503, and 'network' hangs up without an answer. 'auth' answers 401 to tokens issued before
+# the fault started, as if they had all expired or been revoked at once; tokens refreshed since work.
+# Refreshes at token_url hand out tokens lasting token_seconds and rotate the refresh token, so using one twice fails
+# as it does for Spotify. Tokens are '<account>~<n>'; the account part picks the playlist.
+class FakeSpotify(object):
+    def __init__(self, host='127.0.0.1', port=0, track_seconds=30, ad_seconds=5, ad_every=3, etags=False, rate_limit=None, stall=None, faults=None,
+                 token_seconds=3600):
+        self.track_seconds = track_seconds
+        self.ad_seconds = ad_seconds
+        self.ad_every = ad_every
+        self.etags = etags
+        self.rate_limit = rate_limit
+        self.stall = stall
+        self.stalled = 0  # Requests held
+        self.faults = faults or []
+        self.failed = []  # (time, token, kind) of every request failed by a fault
+        self.window = collections.deque()  # Times of requests allowed in the rate limit window
+        self.requests = 0
+        self.throttled = 0  # Requests answered with 429
+        self.hits = {}  # Requests per path
+        self.token_seconds = token_seconds
+        self.used_refresh_tokens = set()
+        self.issued = {}  # Refreshed token -> seconds after starting it was handed out
+        self.refreshes = 0  # Tokens handed out by refreshes
+        self.rejected_refreshes = 0  # Refreshes with a refresh token that was already used
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+        self.server = FakeSpotifyServer((host, port), FakeSpotifyHandler)
+        self.server.fake = self
+        self.url = 'http://%s:%d/v1/' % self.server.server_address
+        self.token_url = 'http://%s:%d/api/token' % self.server.server_address
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count_request(self, path):
+        with self.lock:
+            self.requests += 1
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def should_stall(self):
+        if not self.stall:
+            return False
+        with self.lock:
+            if self.requests % self.stall[0]:
+                return False
+            self.stalled += 1
+            return True
+
+    # The kind of fault failing requests now and seconds until it ends, or (None, 0) if there is none.
+    def fault(self, token):
+        elapsed = time.time() - self.start_time
+        for start, end, kind in self.faults:
+            if start <= elapsed < end and (kind != 'auth' or self.issued.get(token, 0) <= start):
+                with self.lock:
+                    self.failed.append((time.time(), token, kind))
+                return kind, end - elapsed
+        return None, 0
+
+    # Returns seconds the client must wait if this request is over the rate limit, otherwise 0.
+    def check_rate_limit(self):
+        if not self.rate_limit:
+            return 0
+        limit, seconds = self.rate_limit
+        now = time.time()
+        with self.lock:
+            while self.window and self.window[0] <= now - seconds:
+                self.window.popleft()
+            if len(self.window) >= limit:
+                self.throttled += 1
+                return max(1, int(math.ceil(self.window[0] + seconds - now)))
+            self.window.append(now)
+            return 0
+
+    # A new token for the account behind refresh_token, or None if refresh_token was used before.
+    def refresh(self, refresh_token):
+        with self.lock:
+            if refresh_token in self.used_refresh_tokens:
+                self.rejected_refreshes += 1
+                return None
+            self.used_refresh_tokens.add(refresh_token)
+            self.refreshes += 1
+            token = '%s~%d' % (account(refresh_token), self.refreshes)
+            self.issued[token] = time.time() - self.start_time
+        return {'access_token': token, 'token_type': 'Bearer', 'expires_in': self.token_seconds, 'refresh_token': token,
+                'scope': 'user-read-currently-playing'}
+
+    # Build a currently-playing response for the account behind token.
+    def currently_playing(self, token):
+        token = account(token)
+        if token.startswith('paused'):
+            return {
+                'is_playing': False,
+                'progress_ms': 61000,
+                'currently_playing_type': 'track',
+                'item': {'id': 'track0', 'name': 'Track 0', 'artists': [{'name': 'Artist 0'}], 'duration_ms': 180000,
+                         'available_markets': MARKETS},
+                'timestamp': int(self.start_time * 1000)}
+
+        cycle, offset = self._cycle(token)
+        elapsed = time.time() - self.start_time + offset
+        position = elapsed % cycle
+        loop = int(elapsed // cycle)
+
+        if position >= self.ad_every * self.track_seconds:
+            return {
+                'is_playing': True,
+                'progress_ms': int((position - self.ad_every * self.track_seconds) * 1000),
+                'currently_playing_type': 'ad',
+                'item': None,
+                'timestamp': int(time.time() * 1000)}
+
+        index = int(position // self.track_seconds)
+        track_number = loop * self.ad_every + index
+        return {
+            'is_playing': True,
+            'progress_ms': int((position - index * self.track_seconds) * 1000),
+            'currently_playing_type': 'track',
+            'item': {
+                'id': 'track%d' % track_number,
+                'name': 'Track %d' % track_number,
+                'artists': [{'name': 'Artist %d' % (track_number % 7)}],
+                'duration_ms': int(self.track_seconds * 1000),
+                'available_markets': MARKETS},
+            'timestamp': int(time.time() * 1000)}
+
+    # Seconds in one pass through the playlist, and how far into it token's account was at start_time.
+    def _cycle(self, token):
+        cycle = self.ad_every * self.track_seconds + self.ad_seconds
+        return cycle, zlib.crc32(account(token).encode('utf-8')) % int(cycle * 1000) / 1000.0  # Stagger accounts
+
+    # Clock times between start and end at which something new starts playing for token, as (time, is_ad).
+    def changes(self, token, start, end):
+        cycle, offset = self._cycle(token)
+        loop = int((start - self.start_time + offset) // cycle)
+        changes = []
+        while True:
+            for index in range(self.ad_every + 1):
+                at = self.start_time - offset + loop * cycle + index * self.track_seconds
+                if at > end:
+                    return changes
+                if at >= start:
+                    changes.append((at, index == self.ad_every))
+            loop += 1
+
+# Serve until interrupted.
+if __name__ == '__main__':
+    fake = FakeSpotify(port=8765).start()
+    print('Serving fake Spotify API at %s' % fake.url)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,352 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Monitors many accounts across worker processes sharing one token store
+'''
+
+from __future__ import print_function
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import Logs
+import MuteBackend
+import Timers
+import TokenStore
+from Engine import Engine
+from SpotifyAdMute import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, SpotifyAdMuteException
+from Transport import API_PREFIX
+
+# Worker process: polls its shard of accounts on an Engine, takes new shards from the supervisor over conn, and sends
+# back stats every report_interval seconds. Tokens come from the store, so any worker can take over any account.
+def _run_worker(index, conn, store_path, options):
+    Timers.after_fork()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the whole process group; the supervisor stops us
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    sys.stdout = open(os.devnull, 'w')  # Status lines of thousands of accounts would only interleave; the log has them
+    logger = logging.getLogger('SpotifyAdMute')
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)  # Inherited, and its writer thread did not survive the fork
+    if options['log_folder']:
+        Logs.init_logger(logger, os.path.join(options['log_folder'], 'worker%d' % index), {'Poll': logging.WARNING})
+    else:
+        logger.addHandler(logging.NullHandler())
+
+    store = TokenStore.TokenStore(store_path)
+    sp_oauth = TokenStore.oauth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, options['token_url'])
+    engine = Engine(logger, options['workers'], options['api_prefix'], mute_backend=lambda: MuteBackend.create(options['mute_backend']))
+    engine.start()
+    logger.info('Fleet: Worker %d started.' % index)
+    try:
+        while True:
+            if conn.poll(options['report_interval']):
+                command, usernames = conn.recv()
+                if command == 'stop':
+                    break
+                _assign(logger, engine, store, sp_oauth, usernames)
+            conn.send(_report(engine))
+    except (EOFError, IOError):
+        logger.error('Fleet: Worker %d lost the supervisor. Stopping.' % index)
+    finally:
+        engine.stop(options['stop_timeout'])
+        try:
+            conn.send(_report(engine))
+        except (EOFError, IOError):
+            pass
+        Logs.shutdown(logger)
+
+# Make engine poll exactly usernames.
+def _assign(logger, engine, store, sp_oauth, usernames):
+    with engine.lock:
+        current = set(engine.accounts)
+    for username in current - set(usernames):
+        engine.remove_account(username)
+    for username in usernames:
+        if username in current:
+            continue
+        try:
+            token_manager = TokenStore.StoredTokenManager(logger, sp_oauth, store, username)
+            engine.add_account(username, token_manager.token_info['access_token'], token_manager)
+        except (TokenStore.TokenStoreException, SpotifyAdMuteException, MuteBackend.MuteBackendException) as err:
+            logger.error('Fleet: Not monitoring %s: %s' % (username, str(err)))
+
+def _report(engine):
+    with engine.lock:
+        accounts = list(engine.accounts.values())
+    times = os.times()
+    return {
+        'pid': os.getpid(),
+        'accounts': len(accounts),
+        'polls': sum(account.polls for account in accounts),
+        'errors': sum(account.errors for account in accounts),
+        'throttled': sum(account.throttled for account in accounts),
+        'cpu': times[0] + times[1]}
+
+# A worker process and the accounts assigned to it. Survives the process, so a restarted worker gets the same shard.
+class WorkerSlot(object):
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.accounts = []  # Usernames assigned, as last sent to the process
+        self.started_at = None
+        self.down_since = None  # Clock time the process was found dead, or None while it runs
+        self.backoff = 0  # Seconds to wait before restarting it
+        self.restarts = 0
+        self.report = {}  # Latest stats from the running process
+        self.finished = {}  # Stats summed over processes that exited
+
+    def alive(self):
+        return self.process != None and self.process.is_alive()
+
+    # Stats of every process this slot has run.
+    def totals(self):
+        return dict((key, self.finished.get(key, 0) + self.report.get(key, 0)) for key in ('polls', 'errors', 'throttled', 'cpu'))
+
+# Spreads accounts over worker processes, so polling scales past one core. The supervisor only hands out shards and
+# watches the workers: a worker that dies is restarted after a backoff that doubles while it keeps crashing, and if it
+# stays down longer than rebalance_after its accounts move to the other workers until it is back. Shards are rebalanced
+# whenever accounts or workers come or go, moving as few accounts as possible.
+# Accounts are muted with mute_backend, a MuteBackend.create() name. It defaults to 'none', since the accounts play on
+# other machines; any other backend mutes this machine's audio and is created once per account, so the session
+# backends would start a pactl subscribe process for each.
+class Fleet(object):
+    check_interval = 0.5  # Seconds between checks on the workers
+    report_interval = 1  # Seconds between stats reports from each worker
+    restart_backoff = 1  # Seconds before restarting a worker that died
+    max_restart_backoff = 60
+    stable_seconds = 60  # A worker that ran this long before dying restarts after restart_backoff again
+    rebalance_after = 10  # Seconds a dead worker keeps its accounts waiting for its restart
+    accounts_interval = 30  # Seconds between checks of the store for added or removed accounts, in run()
+    stop_timeout = 10
+
+    def __init__(self, logger, store_path, processes=None, workers=8, api_prefix=API_PREFIX, token_url=None, log_folder=None, mute_backend='none'):
+        self.logger = logger
+        self.store_path = store_path
+        self.processes = processes or multiprocessing.cpu_count()
+        self.options = {'workers': workers, 'api_prefix': api_prefix, 'token_url': token_url, 'log_folder': log_folder,
+                        'mute_backend': mute_backend, 'report_interval': self.report_interval, 'stop_timeout': self.stop_timeout}
+        self.clock = time.time
+        self.accounts = []
+        self.slots = []
+        self.finished_slots = []  # Slots removed by resize(), for stats
+        self.moves = 0  # Accounts moved from one worker to another by rebalancing
+        self.running = False
+
+    # Start processes workers polling usernames (default: every account in the store).
+    def start(self, usernames=None):
+        if usernames == None:
+            usernames = TokenStore.TokenStore(self.store_path).usernames()
+        self.accounts = list(usernames)
+        self.slots = [WorkerSlot(index) for index in range(self.processes)]
+        self.running = True
+        self._rebalance()
+        for slot in self.slots:
+            self._spawn(slot)
+        self.logger.info('Fleet: Started %d workers for %d accounts.' % (self.processes, len(self.accounts)))
+        return self
+
+    # Monitor usernames from now on, moving accounts between workers as needed.
+    def set_accounts(self, usernames):
+        self.accounts = list(usernames)
+        self._rebalance()
+
+    # Run processes workers from now on.
+    def resize(self, processes):
+        removed = self.slots[processes:]
+        self.slots = self.slots[:processes] + [WorkerSlot(index) for index in range(len(self.slots), processes)]
+        self.processes = processes
+        self._rebalance()
+        for slot in self.slots:
+            if slot.process == None:
+                self._spawn(slot)
+        self.moves += sum(len(slot.accounts) for slot in removed)
+        for slot in removed:
+            if slot.alive():
+                self._send(slot, ('stop', None))
+            self._stop_slot(slot, self.stop_timeout)
+            self.finished_slots.append(slot)
+
+    # Collect reports, restart dead workers and rebalance. Call every check_interval seconds.
+    def check(self):
+        now = self.clock()
+        for slot in self.slots:
+            self._read_reports(slot)
+            if slot.down_since == None and slot.process != None and not slot.alive():
+                self._died(slot, now)
+            if slot.down_since != None and now >= slot.down_since + slot.backoff:
+                slot.restarts += 1
+                self._spawn(slot)
+        self._rebalance()
+
+    # Supervise until stop() or an interrupt, picking up accounts added to or removed from the store.
+    def run(self):
+        store = TokenStore.TokenStore(self.store_path)
+        accounts_checked = self.clock()
+        while self.running:
+            time.sleep(self.check_interval)
+            self.check()
+            if self.clock() - accounts_checked >= self.accounts_interval:
+                accounts_checked = self.clock()
+                usernames = store.usernames()
+                if usernames != sorted(self.accounts):
+                    self.logger.info('Fleet: Accounts changed in the store. Now monitoring %d.' % len(usernames))
+                    self.set_accounts(usernames)
+
+    # Stop every worker. Waits up to timeout seconds (default stop_timeout) for them to exit, then kills the rest.
+    def stop(self, timeout=None):
+        self.running = False
+        deadline = self.clock() + (self.stop_timeout if timeout == None else timeout)
+        for slot in self.slots:
+            if slot.alive():
+                self._send(slot, ('stop', None))
+        for slot in self.slots:
+            self._stop_slot(slot, max(deadline - self.clock(), 0))
+        self.logger.info('Fleet: Stopped. %s' % self.stats())
+
+    # Totals over every worker process, past and present.
+    def stats(self):
+        totals = [slot.totals() for slot in self.slots + self.finished_slots]
+        return {
+            'processes': len([slot for slot in self.slots if slot.alive()]),
+            'accounts': len(self.accounts),
+            'polls': sum(total['polls'] for total in totals),
+            'errors': sum(total['errors'] for total in totals),
+            'throttled': sum(total['throttled'] for total in totals),
+            'cpu': sum(total['cpu'] for total in totals),
+            'restarts': sum(slot.restarts for slot in self.slots + self.finished_slots),
+            'moves': self.moves}
+
+    def _spawn(self, slot):
+        conn, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_run_worker, args=(slot.index, child, self.store_path, self.options), name='FleetWorker%d' % slot.index)
+        process.daemon = True
+        process.start()
+        child.close()  # So a dead worker shows up as EOF
+        slot.process = process
+        slot.conn = conn
+        slot.started_at = self.clock()
+        slot.down_since = None
+        slot.report = {}
+        self._send(slot, ('assign', slot.accounts))
+
+    def _send(self, slot, command):
+        try:
+            slot.conn.send(command)
+        except (EOFError, IOError):
+            pass  # Dead. check() restarts it with its accounts
+
+    def _read_reports(self, slot):
+        try:
+            while slot.conn != None and slot.conn.poll():
+                slot.report = slot.conn.recv()
+        except (EOFError, IOError):
+            pass
+
+    def _died(self, slot, now):
+        self._read_reports(slot)
+        slot.conn.close()
+        slot.conn = None
+        for key, value in slot.totals().items():
+            slot.finished[key] = value
+        slot.report = {}
+        if now - slot.started_at < self.stable_seconds:
+            slot.backoff = min(max(slot.backoff * 2, self.restart_backoff), self.max_restart_backoff)
+        else:
+            slot.backoff = self.restart_backoff
+        slot.down_since = now
+        self.logger.error('Fleet: Worker %d (pid %d) exited with %s. Restarting in %g seconds.' % (
+            slot.index, slot.process.pid, slot.process.exitcode, slot.backoff))
+
+    def _stop_slot(self, slot, timeout=0):
+        if slot.process == None:
+            return
+        slot.process.join(timeout)
+        if slot.process.is_alive():
+            self.logger.warn('Fleet: Worker %d did not stop in time. Killing it.' % slot.index)
+            slot.process.terminate()
+            slot.process.join()
+        self._read_reports(slot)
+        if slot.conn != None:
+            slot.conn.close()
+            slot.conn = None
+
+    # Spread accounts evenly over the workers that are up or expected back soon. Workers keep as many of their
+    # accounts as their share allows, so only the surplus and the accounts of workers that stayed down move.
+    def _rebalance(self):
+        now = self.clock()
+        live = [slot for slot in self.slots if slot.down_since == None or now - slot.down_since < self.rebalance_after]
+        if not live:
+            return
+        wanted = set(self.accounts)
+        assigned = set()
+        shares = {}
+        base, extra = divmod(len(self.accounts), len(live))
+        for slot in sorted(live, key=lambda slot: -len(slot.accounts)):
+            share = base + (1 if extra > 0 else 0)
+            extra -= 1
+            keep = [username for username in slot.accounts if username in wanted and username not in assigned][:share]
+            assigned.update(keep)
+            shares[slot.index] = (keep, share)
+        rest = iter([username for username in self.accounts if username not in assigned])
+        owners = dict((username, slot.index) for slot in self.slots for username in slot.accounts)
+        for slot in self.slots:
+            if slot.index in shares:
+                keep, share = shares[slot.index]
+                accounts = keep + [next(rest) for _ in range(share - len(keep))]
+            else:
+                accounts = []
+            if accounts == slot.accounts:
+                continue
+            self.moves += len([username for username in accounts if owners.get(username, slot.index) != slot.index])
+            slot.accounts = accounts
+            if slot.alive():
+                self._send(slot, ('assign', accounts))
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt()
+
+# Supervise workers for every account in the store until interrupted. Returns the process exit code.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monitor every account in a token store across worker processes.')
+    parser.add_argument('--store', default=os.path.join('.data', 'fleet.db'), help='SQLite token store shared by the workers')
+    parser.add_argument('--import-cache', metavar='FOLDER', help='first copy the tokens and profiles in this cache folder into the store')
+    parser.add_argument('--processes', type=int, default=0, help='worker processes (default: one per core)')
+    parser.add_argument('--workers', type=int, default=8, help='request threads per worker process')
+    parser.add_argument('--api-prefix', default=API_PREFIX, help='Spotify Web API root, e.g. a local stand-in for testing')
+    parser.add_argument('--mute-backend', choices=MuteBackend.BACKENDS, default='none',
+                        help='how to mute each account, as for Daemon.py (default: none, which only records what would be muted). '
+                             'Others mute this machine and are created once per account')
+    parser.add_argument('--log-folder', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), '.logs', 'fleet'))
+    args = parser.parse_args(argv)
+
+    logger = logging.getLogger('SpotifyAdMute')
+    Logs.init_logger(logger, args.log_folder)
+    signal.signal(signal.SIGTERM, _terminate)
+    fleet = None
+    try:
+        store = TokenStore.TokenStore(args.store)
+        if args.import_cache:
+            print('Imported %d accounts into %s.' % (len(store.import_cache_folder(args.import_cache)), args.store))
+        fleet = Fleet(logger, args.store, args.processes, args.workers, args.api_prefix, log_folder=args.log_folder, mute_backend=args.mute_backend).start()
+        print('Monitoring %d accounts with %d worker processes. Press Ctrl+C to stop.' % (len(fleet.accounts), fleet.processes))
+        fleet.run()
+    except TokenStore.TokenStoreException as err:
+        print(str(err), file=sys.stderr)
+        logger.error('Fleet: Stopping after exception: %s' % str(err))
+        return 1
+    except KeyboardInterrupt:
+        print('Stopped monitoring.')
+    finally:
+        if fleet:
+            fleet.stop()
+        Logs.shutdown(logger)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
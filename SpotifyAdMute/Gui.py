@@ -8,14 +8,17 @@ from __future__ import print_function
 
 import sys
 import os
-import threading
 import logging
 import time
 from Tkinter import *
 import tkMessageBox
 import tkFont
-from PIL import ImageTk, Image
 from SpotifyAdMute import SpotifyAdMute, SpotifyAdMuteException
+from Dispatch import TkDispatcher
+from Console import TkConsole
+import Logs
+import Metrics
+import Timers
 import Queue
 from enum import Enum
 
@@ -27,26 +30,12 @@ bug: entrywindow should spawn centered respective to main window
 bug: something about pressing enter twice at log in crashes the gui...
 todo: try manually raising exception in SpotifyAdMute::_try_get_currently_playing()
 feature: file menu -> about, submit feedback
-feature: remove logs older than 30 days
 feature: make url part more intuitive...have a welcome box and have them click to progress.
 feature: check for updates
 feature: make hide/show details button prettier
 feature: open window at location prior to previous close?
 '''
 
-# Redirect from output stream to a text widget.
-class StdRedirector(object):
-    def __init__(self, widget):
-        self.widget = widget
-    def write(self, string):
-        if not exit_thread:
-            self.widget.configure(state='normal')
-            self.widget.insert(END,string)
-            self.widget.see(END)
-            self.widget.configure(state='disabled')
-    def flush(self):
-        pass
-
 # Place Tkinter window outside of screen (bottom right)
 def hide(root):
     ws = root.winfo_screenwidth()
@@ -93,48 +82,27 @@ class EntryWindow(object):
         self.value = self.entry.get()
         self.top.destroy()
 
-# Periodically runs the specified function.
-class RepeatingTimer(threading._Timer):
-    def run(self):
-        while not self.finished.is_set():
-            self.function(*self.args, **self.kwargs)
-            self.finished.wait(self.interval)
-
-# A thread customized for Spotify Ad Mute.
-class Job(threading.Thread):
-    def __init__(self, logger, target):
-        threading.Thread.__init__(self)
-        self.target = target
-        self.logger = logger
-        self.shutdown_flag = threading.Event()
-
-    def run(self):
-        self.logger.info('Job: Thread %d started.' % self.ident)
-        while not self.shutdown_flag.is_set():
-            try:
-                self.target()
-            except SpotifyAdMuteException as err:
-                self.logger.error('Job: While running target, got exception: %s' % str(err))
-                break
-            except:
-                self.logger.error('Job: While running target, got unexpected exception!')
-                break
- 
-        self.logger.info('Job: Thread %d stopped.' % self.ident)
-
 # Main gui class.
 class App(object):
-    requests = Queue.Queue()  # Let other threads create widgets by submitting requests
-
     version = '1.0.8'
-    run_thread = None
+    spotify_ad_mute = None
     username = None
     running_ad_mute = False
     log_folder = '.logs'
+    log_levels = {'Poll': logging.INFO}  # Set 'Poll' to logging.WARNING to skip per-poll log lines
     cache_folder = '.data'
     cache_path = '%s/.spotify_ad_mute_cache' % cache_folder
     view = None
     show_details = False
+    music_img = None  # Loaded when the running view is first shown
+    pause_img = None
+    mute_img = None
+    console_lines = 1000  # Lines kept in the details text
+    metrics_port = None  # Serve metrics at http://127.0.0.1:metrics_port/metrics if set
+    metrics_server = None
+    shutdown_timeout = 2  # Seconds to wait for a poll underway to stop when quitting
+    idle_check_interval = 0.1  # Seconds between checks for a stopped poll to finish, see stop_ad_mute()
+    clear_timer = None  # Timers.Timer clearing the poll state once the stopped poll is done
 
     class View(Enum):
         Login = 0
@@ -143,6 +111,7 @@ class App(object):
     # Initialize the App, creating the logger and widgets.
     def __init__(self, master):
         self._init_logger()
+        self.timers = Timers.default()  # Runs the heartbeat and polls
 
         self.master = master
         hide(self.master)
@@ -155,6 +124,10 @@ class App(object):
 
         self.master.iconbitmap(default='assets/spotifyadmute_icon.ico')
 
+        # Let other threads create widgets by submitting requests
+        self.dispatcher = TkDispatcher(self.master, self.logger)
+        self.dispatcher.coalesce(self.set_currently_playing_label)
+
         # Initialize widgets
         self.frame = Frame(self.master)
         self.frame.pack(fill='both', expand=True)
@@ -186,10 +159,7 @@ class App(object):
         self.frame.grid_columnconfigure(2, minsize=110)
         self.frame.grid_rowconfigure(1, minsize=35)
 
-        # Load images
-        self.music_img = ImageTk.PhotoImage(Image.open('assets/music-50.png'))
-        self.pause_img = ImageTk.PhotoImage(Image.open('assets/pause-50.png'))
-        self.mute_img = ImageTk.PhotoImage(Image.open('assets/mute-50.png'))
+        # Images are loaded by _load_images()
         self.image_label = Label(self.frame)
         self.image_label.grid(row=0, column=0, rowspan=2, padx=(0, 0), pady=(0, 0))
 
@@ -221,7 +191,8 @@ class App(object):
         # Details text
         self.text = Text(self.frame, borderwidth=3, relief='sunken', width=50, height=10, wrap='word', state='disabled')
         self.text.grid(row=3, columnspan=4, sticky=NSEW, padx=(5, 0), pady=5)
-        sys.stdout = StdRedirector(self.text)
+        self.console = TkConsole(self.text, self.dispatcher, self.console_lines)
+        sys.stdout = self.console
 
         # Details text scrollbar
         self.text_scroll = Scrollbar(self.frame, command=self.text.yview)
@@ -236,6 +207,10 @@ class App(object):
 
         self._heartbeat()
 
+        if self.metrics_port:
+            self.metrics_server = Metrics.MetricsServer(self.metrics_port).start()
+            self.logger.info('Gui: Serving metrics at %s.' % self.metrics_server.url)
+
         self.logger.info('Gui: Successfully initialized all widgets.')
 
     # Cleanup all resources used by app.
@@ -245,69 +220,60 @@ class App(object):
             print('Thanks for using Spotify Ad Mute!')
             exit_thread = True
             exit_success = True
+            deadline = time.time() + self.shutdown_timeout
             self.heartbeat.cancel()
-            if self.run_thread:
-                self.run_thread.shutdown_flag.set()
+            self.dispatcher.close()
+            if self.spotify_ad_mute:
+                # Cancelling aborts a request in progress, so the poll need not be serviced
                 self.spotify_ad_mute.stop_poll()
-                self.run_thread.join()
+                if not self.spotify_ad_mute.poll_idle.wait(self.shutdown_timeout):
+                    self.logger.warn('Gui: Poll did not stop within %g seconds. Exiting anyway.' % self.shutdown_timeout)
+                if self.spotify_ad_mute.mute_backend:
+                    self.spotify_ad_mute.mute_backend.close()
+            if not Timers.shutdown(max(deadline - time.time(), 0)):
+                self.logger.warn('Gui: Timer threads did not stop in time. Exiting anyway.')
+            self.dispatcher.log_stats()
+            if self.metrics_server:
+                self.metrics_server.stop()
 
             self.frame.quit()
             self.master.destroy()
             self.logger.info('Gui: Successfully cleaned up application.')
+            Logs.shutdown(self.logger)  # Write out queued log records
 
     # Initialize logger
     def _init_logger(self):
         self.logger = logging.getLogger('SpotifyAdMute')
-        current_time = time.strftime('%Y_%m_%d_%H_%M_%S', time.gmtime())
         log_folder = os.path.join(os.path.dirname(os.path.realpath(__file__)), self.log_folder)
-        if not os.path.exists(log_folder):
-            os.makedirs(log_folder)
-
-        hdlr = logging.FileHandler('%s/%s.log' % (log_folder, current_time))
-        formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
-        hdlr.setFormatter(formatter)
-        self.logger.addHandler(hdlr)
-        self.logger.setLevel(logging.INFO)
+        Logs.init_logger(self.logger, log_folder, self.log_levels)
         self.logger.info('Gui: Initialized logger.')
 
     # Periodically make sure invariants are satisfied
     def _heartbeat(self):
-        self.heartbeat = RepeatingTimer(10, self._heartbeat_tick)
-        self.heartbeat.start()
+        self.heartbeat = self.timers.call_every(10, self._heartbeat_tick)
 
     # Heartbeat function
     def _heartbeat_tick(self):
         #self.master.update()
-        if self.running_ad_mute and not (self.run_thread and self.run_thread.is_alive()):
-            self.stop_ad_mute()
+        if self.running_ad_mute and not self.spotify_ad_mute.polling:
+            self.request(self.stop_ad_mute)
 
-    # Periodically service requests from other threads
+    # Service requests from other threads. Later requests wake the main loop themselves.
     def tk_loop(self):
-        try:
-            while True:
-                func, arg, response_queue = self.requests.get_nowait()
-                self.logger.info("Got request: {%s} {%s} {%s}." % (func, arg, response_queue))
-                if arg == None:
-                    response = func()
-                else:
-                    response = func(*arg)
-                if response_queue:
-                    response_queue.put(response)
-        except:
-            pass
-
-        root.after(1500, self.tk_loop)
+        self.dispatcher.service()
 
     # Add a request to the queue
     def request(self, func, arg = None, response_queue = None):
-        self.requests.put((func, arg, response_queue))
+        self.dispatcher.request(func, arg, response_queue)
 
     # Log into Spotify account.
     def _login(self):
+        ad_mute = None
         try:
             # Initialize SpotifyAdMute and log in
             self.username = self.username_input.get()
-            self.spotify_ad_mute = SpotifyAdMute(self, self.logger)
+            ad_mute = SpotifyAdMute(self, self.logger)
+            self.spotify_ad_mute = ad_mute
 
             self.logger.info('Gui: Attempting to login with username: %s.' % self.username)
             self.spotify_ad_mute.login(self.username)
@@ -318,9 +284,7 @@ class App(object):
             self._running_view()
 
             # Clear text before showing.
-            self.text.configure(state='normal')
-            self.text.delete(1.0, END)
-            self.text.configure(state='disabled')
+            self.console.clear()
             self._print_intro()
 
             # Start polling
@@ -328,12 +292,15 @@ class App(object):
 
             self.logger.info('Gui: Logged in with username: %s, started polling.' % self.username)
         except SpotifyAdMuteException as err:
+            if ad_mute:
+                ad_mute.mute_backend.close()  # The next login creates a new one
             tkMessageBox.showerror(title='Error', message=err)
 
     # Log out from Spotify account. Transitions back to login screen.
     def _logout(self):
         self.stop_ad_mute()
         self.spotify_ad_mute.logout()
+        self.spotify_ad_mute.mute_backend.close()  # Stops pactl subscribe for the pactl-session backend. The next login creates a new one
 
         # Transition to logged-out widgets
         self._login_view()
@@ -356,9 +323,8 @@ class App(object):
         self.logger.info('Gui: Starting ad mute.')
         self.running_ad_mute = True
 
-        # Start a new thread to poll
-        self.run_thread = Job(self.logger, self.spotify_ad_mute.poll)
-        self.run_thread.start()
+        # Poll on the shared timer threads
+        self.spotify_ad_mute.start_polling(self.timers)
 
         self.monitoring_button_text.set('Stop Monitoring')
         self.monitoring_button.config(command=self.stop_ad_mute)
@@ -372,18 +338,45 @@ class App(object):
         self.running_ad_mute = False
         self.set_currently_playing_label()
 
-        # Kill the polling thread
-        if self.run_thread:
-            self.run_thread.shutdown_flag.set()
-            self.spotify_ad_mute.stop_poll()
-            
-        self.spotify_ad_mute.clear_cache()
+        # Cancel the next poll. A poll under way still reads the cached state, so clear it only once that poll is done,
+        # checking on a timer rather than blocking the main loop.
+        self.spotify_ad_mute.stop_poll()
+        self._cancel_clear_timer()
+        if self.spotify_ad_mute.poll_idle.is_set():
+            self.spotify_ad_mute.clear_cache()
+        else:
+            self.logger.info('Gui: Poll still under way. Clearing its state once it is done.')
+            self.clear_timer = self.timers.call_every(self.idle_check_interval, self._clear_when_idle, self.spotify_ad_mute)
         self.monitoring_button_text.set('Start Monitoring')
         self.monitoring_button.config(command=self._start_ad_mute)
 
         print('Stopped monitoring.')
         self.logger.info('Gui: Successfully stopped ad mute.')
 
+    # Runs on a timer thread every idle_check_interval after stop_ad_mute() found ad_mute's poll under way.
+    def _clear_when_idle(self, ad_mute):
+        if ad_mute.polling:
+            self._cancel_clear_timer()  # Restarted in the meantime; the new polls keep the state
+        elif ad_mute.poll_idle.is_set():
+            self._cancel_clear_timer()
+            ad_mute.clear_cache()
+
+    def _cancel_clear_timer(self):
+        timer, self.clear_timer = self.clear_timer, None
+        if timer:
+            timer.cancel()
+
+    # Decode the status images. Deferred until needed so the login window shows sooner.
+    def _load_images(self):
+        if self.music_img:
+            return
+
+        from PIL import ImageTk, Image
+        self.music_img = ImageTk.PhotoImage(Image.open('assets/music-50.png'))
+        self.pause_img = ImageTk.PhotoImage(Image.open('assets/pause-50.png'))
+        self.mute_img = ImageTk.PhotoImage(Image.open('assets/mute-50.png'))
+        self.logger.info('Gui: Loaded images.')
+
     # Switch to the login view.
     def _login_view(self):
         self.logger.info('Gui: Switching to login view.')
@@ -408,6 +401,7 @@ class App(object):
     # Switch to the running view.
     def _running_view(self):
         self.logger.info('Gui: Switching to running view.')
+        self._load_images()
         x = self.master.winfo_x()
         y = self.master.winfo_y()
         hide(self.master)
@@ -441,6 +435,12 @@ class App(object):
                 self.image_label.grid_remove()
             return
 
+        degraded = self.spotify_ad_mute.retry.degraded
+        if self.spotify_ad_mute.state == None:
+            if degraded:
+                self.currently_playing_label_text.set('Cannot reach Spotify. Still trying.')
+            return  # Nothing polled yet
+
         if self.spotify_ad_mute.state == SpotifyAdMute.State.Music:
             track = self.spotify_ad_mute.print_current_track()
             current_image = self.music_img
@@ -456,7 +456,10 @@ class App(object):
         if not self.image_label.grid_info():
             self.image_label.grid()
 
-        self.currently_playing_label_text.set('Currently playing %s.' % track)
+        if degraded:
+            self.currently_playing_label_text.set('Cannot reach Spotify. Still trying (last seen: %s).' % track)
+        else:
+            self.currently_playing_label_text.set('Currently playing %s.' % track)
 
     def _toggle_details(self):
         self.logger.info('Gui: Toggling details.')
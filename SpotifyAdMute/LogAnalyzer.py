@@ -0,0 +1,214 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Streaming analyzer for Spotify Ad Mute log files
+'''
+
+from __future__ import print_function
+
+import argparse
+import glob
+import multiprocessing
+import os
+
+# Histogram bucket upper bounds: request latency in milliseconds, sleeps in seconds. The last bucket is unbounded.
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SLEEP_BUCKETS = (0.5, 1, 2, 4, 6, 8, 10, 15, 30)
+
+# Messages we look for, as bytes since files are read in binary. Each line is classified by the start of its message
+# (after the timestamp and level): poll lines by their first 16 bytes, SpotifyAdMute lines by 8 bytes after the prefix.
+QUERYING = b'Querying Spotify'
+QUERIED = b'Queried Spotify.'
+SPOTIFY_AD_MUTE = b'SpotifyAdMute: '
+SLEEPING = b'Sleeping'  # Sleeping for %d seconds.
+AD = b'Playing '  # Playing ad. Muting!
+TRACK = b'Currentl'  # Currently playing ...
+POLL_ERROR = b'While po'  # While polling for currently playing track information, got ...
+
+# Fixed-size counts per bucket, so memory does not grow with the number of observations.
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+
+    def add(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def total(self):
+        return sum(self.counts)
+
+    # Upper bound of the bucket holding the given fraction of observations, or None if empty.
+    def percentile(self, fraction):
+        total = self.total()
+        if not total:
+            return None
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * total:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+# Counts for one day of logs.
+class DaySummary(object):
+    def __init__(self):
+        self.ads = 0
+        self.tracks = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def merge(self, other):
+        self.ads += other.ads
+        self.tracks += other.tracks
+        self.polls += other.polls
+        self.poll_errors += other.poll_errors
+        self.latency.merge(other.latency)
+
+# Totals over any number of log files. Summaries of different files can be merged in any order.
+class LogSummary(object):
+    def __init__(self):
+        self.days = {}  # 'YYYY-MM-DD' -> DaySummary
+        self.sleep = Histogram(SLEEP_BUCKETS)
+        self.files = 0
+        self.lines = 0
+        self.bytes = 0
+
+    def day(self, date):
+        summary = self.days.get(date)
+        if summary is None:
+            summary = self.days[date] = DaySummary()
+        return summary
+
+    def merge(self, other):
+        for date, summary in other.days.items():
+            self.day(date).merge(summary)
+        self.sleep.merge(other.sleep)
+        self.files += other.files
+        self.lines += other.lines
+        self.bytes += other.bytes
+        return self
+
+# Seconds since midnight of a line starting with a '2017-11-13 20:01:02,345' timestamp, or None.
+def _seconds(line):
+    try:
+        return int(line[11:13]) * 3600 + int(line[14:16]) * 60 + int(line[17:19]) + int(line[20:23]) / 1000.0
+    except ValueError:
+        return None
+
+# Lines of the file at path, read lazily. Files are read as bytes so stray encodings cannot stop the analysis.
+def read_lines(path):
+    with open(path, 'rb') as log:
+        for line in log:
+            yield line
+
+# Fold log lines from the poll loop into a LogSummary. Lines that do not start with a timestamp (e.g. the rest of a multi-line
+# message) are skipped. Latency is the time between a 'Querying' line and the 'Queried' line that follows it.
+def summarize(lines, summary=None):
+    summary = summary or LogSummary()
+    querying_at = None
+    date = day = None
+    line_count = byte_count = 0
+    for line in lines:
+        line_count += 1
+        byte_count += len(line)
+        if line[19:20] != b',':
+            continue
+        if line[:10] != date:
+            date = line[:10]
+            day = summary.day(date.decode('ascii'))
+
+        start = line.find(b' ', 24) + 1  # After the level
+        message = line[start:start + 16]
+        if message == QUERYING:
+            day.polls += 1
+            querying_at = _seconds(line)
+        elif message == QUERIED:
+            queried_at = _seconds(line)
+            if querying_at != None and queried_at != None and queried_at >= querying_at:
+                day.latency.add((queried_at - querying_at) * 1000)
+            querying_at = None
+        elif message.startswith(SPOTIFY_AD_MUTE):
+            kind = line[start + 15:start + 23]
+            if kind == SLEEPING:
+                try:
+                    summary.sleep.add(int(line[start + 28:].split()[0]))
+                except (IndexError, ValueError):
+                    pass
+            elif kind == AD:
+                day.ads += 1
+            elif kind == TRACK:
+                day.tracks += 1
+            elif kind == POLL_ERROR:
+                day.poll_errors += 1
+                querying_at = None
+
+    summary.lines += line_count
+    summary.bytes += byte_count
+    return summary
+
+def summarize_file(path):
+    summary = summarize(read_lines(path))
+    summary.files = 1
+    return summary
+
+# Summarize log files, using a pool of processes when processes > 1. Memory stays flat no matter how big the files are.
+def analyze(paths, processes=1):
+    summary = LogSummary()
+    if processes > 1 and len(paths) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for file_summary in pool.imap_unordered(summarize_file, paths):
+                summary.merge(file_summary)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for path in paths:
+            summary.merge(summarize_file(path))
+    return summary
+
+def _format_bound(bound, unit):
+    return 'n/a' if bound == None else ('>%g %s' % (LATENCY_BUCKETS[-1], unit) if bound == float('inf') else '%g %s' % (bound, unit))
+
+def report(summary):
+    print('%d files, %d lines, %.1f MB' % (summary.files, summary.lines, summary.bytes / 1048576.0))
+    print('')
+    print('%-10s  %5s  %6s  %6s  %7s  %9s  %9s' % ('Day', 'Ads', 'Tracks', 'Polls', 'Errors', 'p50', 'p95'))
+    total = DaySummary()
+    for date in sorted(summary.days):
+        day = summary.days[date]
+        total.merge(day)
+        errors = '%.1f%%' % (100.0 * day.poll_errors / day.polls) if day.polls else 'n/a'  # Poll lines may be turned off
+        print('%-10s  %5d  %6d  %6d  %7s  %9s  %9s' % (
+            date, day.ads, day.tracks, day.polls, errors,
+            _format_bound(day.latency.percentile(0.5), 'ms'), _format_bound(day.latency.percentile(0.95), 'ms')))
+
+    print('')
+    print('Request latency (%d requests):' % total.latency.total())
+    _print_histogram(total.latency, 'ms')
+    print('Sleep between polls (%d sleeps):' % summary.sleep.total())
+    _print_histogram(summary.sleep, 's')
+
+def _print_histogram(histogram, unit):
+    total = histogram.total() or 1
+    labels = ['<= %g %s' % (bound, unit) for bound in histogram.buckets] + ['> %g %s' % (histogram.buckets[-1], unit)]
+    for label, count in zip(labels, histogram.counts):
+        print('  %-12s  %8d  %s' % (label, count, '#' * int(40.0 * count / total)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize Spotify Ad Mute log files: ads per day, poll errors and latency.')
+    parser.add_argument('paths', nargs='*', help='log files or folders (default: .logs)')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='files analyzed in parallel')
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths or [os.path.join(os.path.dirname(os.path.realpath(__file__)), '.logs')]:
+        paths.extend(sorted(glob.glob(os.path.join(path, '*.log'))) if os.path.isdir(path) else [path])
+    report(analyze(paths, args.processes))
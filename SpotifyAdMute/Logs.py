@@ -0,0 +1,154 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Logging setup for Spotify Ad Mute: queued, rotated and pruned log files
+'''
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import Queue
+
+# Hands records to a QueueListener so the calling thread never formats or writes them.
+# The message is merged with its arguments on the listener thread, so arguments mutated right after logging may show their new value.
+class QueueHandler(logging.Handler):
+    def __init__(self, listener):
+        logging.Handler.__init__(self)
+        self.listener = listener
+
+    def emit(self, record):
+        try:
+            self.listener.queue.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    # Format any traceback into the record now, while it still describes the exception being handled.
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+# Writes queued records to a handler on a background thread.
+# A record or call that fails is reported on stderr and the thread carries on, so one bad sweep does not stop logging.
+class QueueListener(object):
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue = Queue.Queue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    # Run function on the listener thread, after the records queued so far.
+    def call(self, function):
+        self.queue.put(function)
+
+    # Write out everything queued so far and stop.
+    def stop(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                if callable(record):
+                    record()
+                elif record.levelno >= self.handler.level:
+                    self.handler.handle(record)
+            except Exception:
+                self._report(record)
+        self.handler.flush()
+
+    def _report(self, record):
+        try:
+            sys.stderr.write('--- Logging error in %s ---\n' % ('call' if callable(record) else 'record'))
+            traceback.print_exc(file=sys.stderr)
+        except Exception:
+            pass  # Nowhere left to report to
+
+# Writes to a timestamped file in folder, starting a new file once the current one is too big or too old.
+# Files older than retention_days are removed on every rollover, and at startup by init_logger on the listener thread.
+class RotatingLogHandler(logging.FileHandler):
+    def __init__(self, folder, max_bytes=10 * 1024 * 1024, max_age=24 * 60 * 60, retention_days=30):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retention_days = retention_days
+        logging.FileHandler.__init__(self, self._new_path())
+        self.opened_at = time.time()
+
+    def _new_path(self):
+        name = time.strftime('%Y_%m_%d_%H_%M_%S', time.gmtime())
+        path = os.path.join(self.folder, '%s.log' % name)
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.folder, '%s_%d.log' % (name, suffix))
+            suffix += 1
+        return path
+
+    def emit(self, record):
+        if self.stream and (self.stream.tell() >= self.max_bytes or time.time() - self.opened_at >= self.max_age):
+            self._rollover()
+        logging.FileHandler.emit(self, record)
+
+    def _rollover(self):
+        self.stream.close()
+        self.stream = None  # Reopened by FileHandler.emit
+        self.baseFilename = os.path.abspath(self._new_path())
+        self.opened_at = time.time()
+        sweep(self.folder, self.retention_days)
+
+# Remove log files in folder that were last written more than retention_days ago.
+def sweep(folder, retention_days):
+    cutoff = time.time() - retention_days * 24 * 60 * 60
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if name.endswith('.log') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass  # Removed or in use by someone else
+
+# Set up logger to write through a background thread into rotated files in log_folder.
+# levels maps component names (child loggers such as 'Poll') to their own levels.
+def init_logger(logger, log_folder, levels=None):
+    if not os.path.exists(log_folder):
+        os.makedirs(log_folder)
+
+    handler = RotatingLogHandler(log_folder)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    listener = QueueListener(handler)
+    listener.start()
+    listener.call(lambda: sweep(log_folder, handler.retention_days))  # Old folders can hold many files; keep the caller going
+
+    logger.addHandler(QueueHandler(listener))
+    logger.setLevel(logging.INFO)
+    for component, level in (levels or {}).items():
+        logger.getChild(component).setLevel(level)
+    return listener
+
+# Flush and stop background logging for logger.
+def shutdown(logger):
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            handler.listener.stop()
+
+# Path of the file logger currently writes to, for pointing users at it.
+def current_log_file(logger):
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            handler = handler.listener.handler
+        if hasattr(handler, 'baseFilename'):
+            return handler.baseFilename
+    return 'the logs'
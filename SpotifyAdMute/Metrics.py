@@ -0,0 +1,195 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   In-process metrics for Spotify Ad Mute, served in the Prometheus text format
+'''
+
+from __future__ import print_function
+
+import bisect
+import threading
+import BaseHTTPServer
+import SocketServer
+
+enabled = True  # Set to False to make every update a no-op
+
+# Metrics by name, rendered in registration order.
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # All metrics in the Prometheus text exposition format.
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    # Forget all recorded values.
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+registry = Registry()
+
+def _format_labels(names, values, extra=''):
+    pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Base for metrics keyed by a tuple of label values.
+class Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # Label values -> value
+        registry.register(self)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        return ['%s%s %s' % (self.name, _format_labels(self.labels, key), _format_value(value)) for key, value in items]
+
+# A count that only goes up.
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self.values.get(labels, 0)
+
+# A value that can go up and down, e.g. a queue depth.
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[labels] = value
+
+    def value(self, labels=()):
+        return self.values.get(labels, 0)
+
+# Observations counted into buckets by upper bound, plus their sum and count.
+class Histogram(Metric):
+    kind = 'histogram'
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds
+
+    def __init__(self, name, documentation, labels=(), buckets=None):
+        Metric.__init__(self, name, documentation, labels)
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+
+    def observe(self, value, labels=()):
+        if not enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    # (count, sum) observed so far.
+    def totals(self, labels=()):
+        state = self.values.get(labels)
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self.values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.labels, key, 'le="%s"' % _format_value(bound)), cumulative))
+            lines.append('%s_sum%s %s' % (self.name, _format_labels(self.labels, key), repr(total)))
+            lines.append('%s_count%s %d' % (self.name, _format_labels(self.labels, key), count))
+        return lines
+
+# Spotify Ad Mute metrics
+poll_seconds = Histogram('spotifyadmute_poll_seconds', 'Time to query Spotify and update the mute state, excluding the sleep between polls.')
+request_seconds = Histogram('spotifyadmute_request_seconds', 'Latency of currently-playing requests to Spotify.', ('outcome',))
+requests_total = Counter('spotifyadmute_requests_total', 'Currently-playing requests to Spotify by outcome (ok, or the kind of failure: auth, throttle, network, server).', ('outcome',))
+retries_total = Counter('spotifyadmute_retries_total', 'Currently-playing requests retried after a failure.')
+state_transitions_total = Counter('spotifyadmute_state_transitions_total', 'Playback state changes seen by the poll loop.', ('from_state', 'to_state'))
+mute_changes_total = Counter('spotifyadmute_mute_changes_total', 'Mute state changes applied to the audio system.', ('muted',))
+mute_seconds = Histogram('spotifyadmute_mute_seconds', 'Time the audio system took to apply a mute state change.')
+time_to_mute_seconds = Histogram('spotifyadmute_time_to_mute_seconds', 'Time from the start of an ad, as reported by Spotify, until it was muted.',
+                                 buckets=(0.25, 0.5, 1, 2, 3, 4, 5, 7.5, 10, 15, 30))
+premutes_total = Counter('spotifyadmute_premutes_total', 'Mutes applied at a predicted track end, by what the next poll found (ad, music, paused).', ('result',))
+breaker_trips_total = Counter('spotifyadmute_breaker_trips_total', 'Circuit breaker openings by kind of failure (auth, throttle, network, server).', ('kind',))
+degraded = Gauge('spotifyadmute_degraded', '1 while a circuit breaker is open and polls wait for it, otherwise 0.')
+recovery_seconds = Histogram('spotifyadmute_recovery_seconds', 'Time from the first failed request of an outage until the next successful one.',
+                             buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600))
+queue_depth = Gauge('spotifyadmute_queue_depth', 'Requests waiting in a queue (dispatch: Tk main loop, fetches: Engine workers).', ('queue',))
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+
+        payload = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Keep scrapes out of stderr.
+    def log_message(self, format, *args):
+        pass
+
+class MetricsHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+# Serves the registry at http://host:port/metrics from a background thread. Only listens locally by default.
+class MetricsServer(object):
+    def __init__(self, port, host='127.0.0.1', metrics=registry):
+        self.server = MetricsHTTPServer((host, port), MetricsHandler)
+        self.server.registry = metrics
+        self.url = 'http://%s:%d/metrics' % self.server.server_address
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
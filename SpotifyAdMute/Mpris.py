@@ -0,0 +1,388 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Playback pushed by the Spotify desktop client over MPRIS (D-Bus) on Linux
+'''
+
+import collections
+import io
+import os
+import re
+import subprocess
+import threading
+import time
+import Queue
+
+from Playback import PlaybackSnapshot
+from PlaybackSource import PlaybackSource
+
+BUS_NAME = 'org.mpris.MediaPlayer2.spotify'
+OBJECT_PATH = '/org/mpris/MediaPlayer2'
+PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+
+class MprisException(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+# Playback as the local Spotify client reports it over MPRIS. The client announces every track, ad and play/pause
+# change with a PropertiesChanged signal, so reads cost nothing and on_change() fires the moment an ad starts.
+# While the client is not on the bus (not running, or another machine is playing), reads go to fallback.
+class MprisSource(PlaybackSource):
+    name = 'mpris'
+
+    def __init__(self, logger, bus, fallback=None):
+        self.logger = logger
+        self.bus = bus  # DBusMonitorBus, or FakeSessionBus in benchmarks
+        self.fallback = fallback  # PlaybackSource to read while no player is on the bus
+        self.clock = time.time
+        self.lock = threading.Lock()
+        self.properties = None  # Player properties, or None while no player is on the bus
+        self.position = 0.0  # Seconds into the current track as of position_at
+        self.position_at = None
+        self.changes = 0  # Signals received
+
+        bus.subscribe(self._properties_changed, self._seeked, self._player_changed)
+        self._player_changed(True, notify=False)
+
+    @property
+    def push(self):
+        return self.properties != None
+
+    @property
+    def requests(self):
+        return self.fallback.requests if self.fallback else 0
+
+    def get_currently_playing(self):
+        with self.lock:
+            properties = self.properties
+            position = self._position()
+        if properties == None:
+            return self.fallback.get_currently_playing() if self.fallback else None
+        return snapshot(properties, position)
+
+    def set_token(self, token):
+        if self.fallback:
+            self.fallback.set_token(token)
+
+    def abort(self):
+        if self.fallback:
+            self.fallback.abort()
+
+    def clear_abort(self):
+        if self.fallback:
+            self.fallback.clear_abort()
+
+    def close(self):
+        self.bus.close()
+        if self.fallback:
+            self.fallback.close()
+
+    # Seconds into the current track now. Must hold lock.
+    def _position(self):
+        if self.position_at == None or self.properties.get('PlaybackStatus') != 'Playing':
+            return self.position
+        return self.position + self.clock() - self.position_at
+
+    # Bus callbacks, on the bus's thread.
+    def _properties_changed(self, changed, invalidated):
+        with self.lock:
+            self.changes += 1
+            if self.properties == None:
+                self.properties = {}  # Only a player sends these
+            now = self.clock()
+            metadata = changed.get('Metadata')
+            if metadata != None and metadata.get('mpris:trackid') != (self.properties.get('Metadata') or {}).get('mpris:trackid'):
+                self.position, self.position_at = 0.0, now  # New track or ad, playing from the start
+            elif 'PlaybackStatus' in changed:
+                self.position, self.position_at = self._position(), now  # Freeze or resume the position
+            self.properties.update(changed)
+            for name in invalidated:
+                self.properties.pop(name, None)
+        self._changed()
+
+    def _seeked(self, position_us):
+        with self.lock:
+            self.changes += 1
+            self.position, self.position_at = position_us / 1000000.0, self.clock()
+        self._changed()
+
+    # The player joined or left the bus.
+    def _player_changed(self, present, notify=True):
+        properties = self.bus.get_properties() if present else None
+        with self.lock:
+            self.properties = properties
+            if properties != None:
+                self.position, self.position_at = properties.get('Position', 0) / 1000000.0, self.clock()
+            else:
+                self.position, self.position_at = 0.0, None
+        self.logger.info('MprisSource: %s' % ('Reading playback from the Spotify client.' if properties != None else 'No Spotify client on the bus. Reading playback from %s.' % (self.fallback.name if self.fallback else 'nowhere')))
+        if notify:
+            self._changed()
+
+# Build a PlaybackSnapshot from MPRIS player properties, with the track position_seconds in. Returns None if
+# nothing is loaded. Spotify's track ids look like spotify:track:<id> or /com/spotify/track/<id>; ads are 'ad' items.
+def snapshot(properties, position_seconds):
+    metadata = properties.get('Metadata') or {}
+    track = metadata.get('mpris:trackid')
+    if not track:
+        return None
+
+    parts = re.split('[:/]', track)
+    kind = parts[-2] if len(parts) > 1 else 'track'
+    is_playing = properties.get('PlaybackStatus') == 'Playing'
+    progress_ms = int(position_seconds * 1000)
+    if kind == 'ad':
+        return PlaybackSnapshot(None, None, None, None, progress_ms, is_playing, 'ad')
+
+    artists = metadata.get('xesam:artist') or []
+    length = metadata.get('mpris:length')  # Microseconds
+    return PlaybackSnapshot(parts[-1], metadata.get('xesam:title') or '', artists[0] if artists else None,
+                            int(length // 1000) if length else 0, progress_ms, is_playing, kind)
+
+# Watches the session bus through the dbus-monitor and dbus-send tools, so no D-Bus bindings are needed.
+# Only signals from the process owning org.mpris.MediaPlayer2.spotify count, since browsers and other
+# players publish on the same object path; any_sender lifts that for tests that emit signals with gdbus.
+class DBusMonitorBus(object):
+    ready_timeout = 2  # Seconds to wait for dbus-monitor to start listening
+    call_timeout = 1  # Seconds to wait for a dbus-send reply
+
+    def __init__(self, logger, address=None, any_sender=False):
+        import distutils.spawn
+        self.logger = logger
+        self.address = address or os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+        self.any_sender = any_sender
+        if not self.address:
+            raise MprisException('MPRIS: No session bus. Is this a desktop session?')
+        for tool in ['dbus-monitor', 'dbus-send']:
+            if not distutils.spawn.find_executable(tool):
+                raise MprisException('MPRIS: %s not found. Install dbus (or dbus-tools).' % tool)
+
+        self.owner = None  # Unique name of the Spotify client's connection
+        self.process = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.closing = False
+        self.callbacks = None
+
+    def subscribe(self, on_properties, on_seeked, on_player):
+        self.callbacks = (on_properties, on_seeked, on_player)
+        rules = ["type='signal',path='%s',interface='org.freedesktop.DBus.Properties',member='PropertiesChanged'" % OBJECT_PATH,
+                 "type='signal',path='%s',interface='%s',member='Seeked'" % (OBJECT_PATH, PLAYER_INTERFACE),
+                 "type='signal',interface='org.freedesktop.DBus',member='NameOwnerChanged',arg0='%s'" % BUS_NAME]
+        try:
+            self.process = subprocess.Popen(['dbus-monitor', '--address', self.address] + rules, stdout=subprocess.PIPE,
+                                            stderr=open(os.devnull, 'w'), universal_newlines=True)
+        except OSError as err:
+            raise MprisException('MPRIS: Could not start dbus-monitor: %s' % str(err))
+        self.thread = threading.Thread(target=self._read, name='DBusMonitor')
+        self.thread.daemon = True
+        self.thread.start()
+
+        # dbus-monitor is told its own name first, so once anything arrives the match rules are in place
+        if not self.ready.wait(self.ready_timeout):
+            self.close()
+            raise MprisException('MPRIS: dbus-monitor did not connect to %s' % self.address)
+        self.owner = self._name_owner()
+
+    # The player's properties, or None if no player is on the bus.
+    def get_properties(self):
+        if not self.owner:
+            self.owner = self._name_owner()
+            if not self.owner:
+                return None
+        reply = self._call(self.owner, OBJECT_PATH, 'org.freedesktop.DBus.Properties.GetAll', 'string:' + PLAYER_INTERFACE)
+        return reply if isinstance(reply, dict) else None
+
+    def close(self):
+        self.closing = True
+        if self.process and self.process.poll() == None:
+            self.process.terminate()
+            self.process.wait()
+
+    def _name_owner(self):
+        return self._call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus.GetNameOwner', 'string:' + BUS_NAME)
+
+    # First value of a method call's reply, or None if the call failed.
+    def _call(self, destination, path, method, *args):
+        command = ['dbus-send', '--bus=' + self.address, '--print-reply', '--reply-timeout=%d' % (self.call_timeout * 1000),
+                   '--dest=' + destination, path, method] + list(args)
+        try:
+            output = subprocess.check_output(command, stderr=open(os.devnull, 'w'), universal_newlines=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        lines = _Lines(io.StringIO(output.decode('utf-8') if isinstance(output, bytes) else output))
+        try:
+            lines.next()  # method return ...
+            return _parse_value(lines.next(), lines)
+        except EOFError:
+            return None
+
+    # Reader thread: parse dbus-monitor's output and hand signals to the callbacks as soon as each is complete.
+    def _read(self):
+        lines = _Lines(self.process.stdout)
+        try:
+            while True:
+                match = HEADER.match(lines.next())
+                if not match:
+                    continue
+                self.ready.set()
+                sender, member = match.groups()
+                args = [_parse_value(lines.next(), lines) for _ in range(SIGNAL_ARGUMENTS.get(member, 0))]
+                if member not in SIGNAL_ARGUMENTS:
+                    while lines.peek().startswith(' '):
+                        lines.next()  # Arguments of a message we do not use
+                    continue
+                self._dispatch(sender, member, args)
+        except EOFError:
+            if not self.closing:
+                self.logger.error('MPRIS: dbus-monitor exited.')
+        except Exception as err:
+            self.logger.error('MPRIS: While reading dbus-monitor output, got exception: %s' % str(err))
+
+    def _dispatch(self, sender, member, args):
+        on_properties, on_seeked, on_player = self.callbacks
+        if member == 'NameOwnerChanged':
+            self.owner = args[2] or None
+            on_player(self.owner != None)
+        elif not self.any_sender and sender != self.owner:
+            return
+        elif member == 'PropertiesChanged' and args[0] == PLAYER_INTERFACE:
+            on_properties(args[1] or {}, args[2] or [])
+        elif member == 'Seeked':
+            on_seeked(args[0])
+
+# The MPRIS player properties the Spotify client would publish while playing what a Web API currently-playing
+# response describes. Used to replay FakeSpotify's playlist on a bus.
+def player_properties(results):
+    item = results.get('item')
+    if item:
+        metadata = {'mpris:trackid': 'spotify:track:%s' % item['id'], 'mpris:length': item['duration_ms'] * 1000,
+                    'xesam:title': item['name'], 'xesam:artist': [artist['name'] for artist in item['artists']]}
+    else:
+        metadata = {'mpris:trackid': 'spotify:ad:%d' % results['timestamp'], 'xesam:title': 'Advertisement'}
+    return {'Metadata': metadata, 'PlaybackStatus': 'Playing' if results['is_playing'] else 'Paused'}
+
+# dbus-monitor message header, e.g.
+# signal time=1.2 sender=:1.1 -> destination=(null destination) serial=2 path=/org/mpris/MediaPlayer2; interface=...; member=Seeked
+HEADER = re.compile(r'^\S.* sender=(\S+) .* member=(\S+)\s*$')
+SIGNAL_ARGUMENTS = {'PropertiesChanged': 3, 'Seeked': 1, 'NameOwnerChanged': 3}
+
+DictEntry = collections.namedtuple('DictEntry', ['key', 'value'])
+
+# Lines of dbus-monitor output, with one line of lookahead.
+class _Lines(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = None
+
+    def peek(self):
+        if self.pending == None:
+            self.pending = self.stream.readline()
+            if not self.pending:
+                raise EOFError()
+        return self.pending
+
+    def next(self):
+        line = self.peek()
+        self.pending = None
+        return line
+
+# Parse the value starting on line, reading the rest of it from lines. dbus-monitor prints one value per line, with
+# containers spanning lines (array [ ... ], dict entry( ... ), struct { ... }) and strings unescaped between quotes.
+# Arrays of dict entries become dicts. Returns None for types the poll loop has no use for.
+def _parse_value(line, lines):
+    kind, _, rest = line.strip().partition(' ')
+    rest = rest.strip()
+    if kind == 'variant':
+        return _parse_value(rest, lines)
+    if kind in ('string', 'signature', 'object'):  # object path "..."
+        return rest[rest.index('"') + 1:-1]
+    if kind == 'boolean':
+        return rest == 'true'
+    if kind == 'double':
+        return float(rest)
+    if kind in ('byte', 'int16', 'uint16', 'int32', 'uint32', 'int64', 'uint64'):
+        return int(rest)
+    if kind == 'array' and rest == '[':
+        items = _parse_items(']', lines)
+        if items and all(isinstance(item, DictEntry) for item in items):
+            return dict(items)
+        return items
+    if kind == 'struct':
+        return tuple(_parse_items('}', lines))
+    if kind == 'dict':
+        key = _parse_value(lines.next(), lines)
+        value = _parse_value(lines.next(), lines)
+        lines.next()  # )
+        return DictEntry(key, value)
+    if rest.endswith('['):
+        _parse_items(']', lines)  # array of bytes [ 00 01 ... ]
+    return None
+
+def _parse_items(end, lines):
+    items = []
+    while lines.peek().strip() != end:
+        items.append(_parse_value(lines.next(), lines))
+    lines.next()
+    return items
+
+# In-process stand-in for the session bus and the Spotify client on it, used by benchmarks. Signals are delivered on
+# a thread of their own, like dbus-monitor output, delay seconds after the change.
+class FakeSessionBus(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.properties = None  # None while no player is on the bus
+        self.events = Queue.Queue()  # (due, callback index, args), or None to stop
+        self.callbacks = None
+        self.thread = None
+        self.signals = 0
+
+    def subscribe(self, on_properties, on_seeked, on_player):
+        self.callbacks = (on_properties, on_seeked, on_player)
+        self.thread = threading.Thread(target=self._deliver, name='FakeSessionBus')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_properties(self):
+        return dict(self.properties) if self.properties != None else None
+
+    def close(self):
+        self.events.put(None)
+        if self.thread:
+            self.thread.join()
+
+    # Player side.
+    def start_player(self):
+        self.properties = {'PlaybackStatus': 'Stopped', 'Position': 0}
+        self._emit(2, True)
+
+    def stop_player(self):
+        self.properties = None
+        self._emit(2, False)
+
+    def set_properties(self, **changed):
+        self.properties.update(changed)
+        self._emit(0, changed, [])
+
+    def seek(self, position_us):
+        self._emit(1, position_us)
+
+    # Show a Web API currently-playing response (as served by FakeSpotify) the way the Spotify client would.
+    def play(self, results):
+        self.set_properties(**player_properties(results))
+
+    def _emit(self, callback, *args):
+        self.signals += 1
+        self.events.put((time.time() + self.delay, callback, args))
+
+    def _deliver(self):
+        while True:
+            event = self.events.get()
+            if event == None:
+                return
+            due, callback, args = event
+            time.sleep(max(due - time.time(), 0))
+            self.callbacks[callback](*args)
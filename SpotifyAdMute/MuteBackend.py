@@ -0,0 +1,489 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Mute backends for Spotify Ad Mute
+'''
+
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import Timers
+
+class MuteBackendException(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+# Remembers the last applied mute state and only talks to the audio system on transitions.
+# Subclasses implement _apply(), which returns False if there was nothing to apply the state to yet (e.g. Spotify has
+# no audio session); the state is then left unknown, so the next call tries again.
+class MuteBackend(object):
+    name = 'none'
+    muted = None  # Last applied state, None if unknown
+
+    # Instrumentation
+    calls = 0  # Mute calls that reached the audio system
+    skipped = 0  # Mute calls that matched the last applied state
+    seconds = 0.0  # Time spent inside the audio system
+
+    def set_mute(self, mute):
+        mute = bool(mute)
+        if mute == self.muted:
+            self.skipped += 1
+            return
+
+        start = time.time()
+        applied = self._apply(mute)
+        self.seconds += time.time() - start
+        self.calls += 1
+        self.muted = None if applied == False else mute
+
+    # Forget the last applied state, e.g. after the user or another program changed it.
+    def invalidate(self):
+        self.muted = None
+
+    # Release whatever the backend holds open.
+    def close(self):
+        pass
+
+    def _apply(self, mute):
+        raise NotImplementedError
+
+# Mutes the default Windows speakers through pycaw's IAudioEndpointVolume.
+class PycawMuteBackend(MuteBackend):
+    name = 'pycaw'
+
+    def __init__(self):
+        from ctypes import cast, POINTER
+        from comtypes import CLSCTX_ALL
+        from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+
+        devices = AudioUtilities.GetSpeakers()
+        interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+        self.volume = cast(interface, POINTER(IAudioEndpointVolume))
+
+    def _apply(self, mute):
+        import _ctypes
+        try:
+            self.volume.SetMute(int(mute), None)
+        except _ctypes.COMError as err:
+            raise MuteBackendException('pycaw: SetMute failed: %s' % str(err))
+
+# Mutes a PulseAudio or PipeWire sink through pactl.
+class PulseMuteBackend(MuteBackend):
+    name = 'pactl'
+
+    def __init__(self, sink='@DEFAULT_SINK@'):
+        self.sink = sink
+
+    def _apply(self, mute):
+        try:
+            subprocess.check_call(['pactl', 'set-sink-mute', self.sink, '1' if mute else '0'])
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise MuteBackendException('pactl: set-sink-mute failed: %s' % str(err))
+
+# An application's audio stream, as listed by a SessionProvider.
+# process is the lowercased program name without extension, e.g. 'spotify'. handle is whatever the provider needs to
+# mute it again.
+class AudioSession(object):
+    __slots__ = ('id', 'process', 'handle')
+
+    def __init__(self, id, process, handle=None):
+        self.id = id
+        self.process = process
+        self.handle = handle
+
+# Lists applications' audio sessions and mutes them one at a time. Providers that can watch the audio system call
+# on_change() when a session or output device may have come or gone, so cached sessions are looked up again only then.
+class SessionProvider(object):
+    name = None
+    on_change = None  # Called with no arguments, from any thread, when sessions or devices changed
+    reports_new_sessions = False  # True while on_change is also called when a session starts
+
+    # Every audio session, as AudioSession objects.
+    def sessions(self):
+        raise NotImplementedError
+
+    # Raises MuteBackendException if session cannot be muted, e.g. because it has ended.
+    def set_mute(self, session, mute):
+        raise NotImplementedError
+
+    # Start reporting changes through on_change.
+    def watch(self):
+        pass
+
+    # Also report when session itself ends, for providers that can only watch sessions one by one.
+    def watch_session(self, session):
+        pass
+
+    def close(self):
+        pass
+
+    def _changed(self):
+        on_change = self.on_change
+        if on_change:
+            on_change()
+
+# Mutes only Spotify's own audio session instead of the whole output device, so other sounds keep playing and muting
+# follows Spotify to whatever device it plays on. The session is looked up once and cached until the provider reports
+# a session or device change; the lookup then runs again off the provider's thread and the current mute state is
+# applied to the session found, so a device switch in the middle of an ad does not unmute it. While Spotify should be
+# muted but has no session, the mute is applied as soon as one starts: when the provider reports it, or otherwise at
+# the next lookup, repeated every missing_retry seconds.
+class SessionMuteBackend(MuteBackend):
+    processes = ('spotify',)  # AudioSession.process of the sessions to mute
+    missing_retry = 1  # Seconds between lookups for a session to mute, with providers that do not report new sessions
+
+    def __init__(self, provider, cache=True, timers=None):
+        self.provider = provider
+        self.name = '%s session' % provider.name
+        self.cache = cache  # False looks the session up on every call, for comparison
+        self.timers = timers  # Timers.TimerQueue for lookups after changes, or None for the shared one
+        self.lock = threading.Lock()
+        self.session = None  # Cached Spotify session, or None to look it up on the next call
+        self.wanted = None  # Mute state to keep on Spotify's session, whichever session that is
+        self.retry_timer = None  # Pending lookup for a session to mute, see _retry_missing()
+
+        # Instrumentation
+        self.lookups = 0  # Session lookups
+        self.lookup_seconds = 0.0
+        self.changes = 0  # Changes reported by the provider
+        self.missing = 0  # Calls made while Spotify had no audio session
+
+        provider.on_change = self._sessions_changed
+        provider.watch()
+
+    # Also forget the state kept on Spotify's session, so that once monitoring stops, neither a new session nor the
+    # lookup for a missing one is muted.
+    def invalidate(self):
+        MuteBackend.invalidate(self)
+        with self.lock:
+            self.session = None
+            self._forget_wanted()
+
+    def close(self):
+        with self.lock:
+            self._forget_wanted()
+        self.provider.on_change = None
+        self.provider.close()
+
+    def _apply(self, mute):
+        with self.lock:
+            self.wanted = mute
+            if not self.cache:
+                self.session = None
+            if self.session != None:
+                try:
+                    self.provider.set_mute(self.session, mute)
+                    return
+                except MuteBackendException:
+                    self.session = None  # Ended without a change being reported. Look it up again.
+            self._resolve()
+            if self.session == None:
+                self.missing += 1  # Nothing to mute. Applied when a session appears.
+                self._retry_missing()
+                return False
+            self.provider.set_mute(self.session, mute)
+
+    # Look up Spotify's session. Call with lock held.
+    def _resolve(self):
+        start = time.time()
+        self.session = None
+        for session in self.provider.sessions():
+            if session.process in self.processes:
+                self.session = session
+                break
+        self.lookups += 1
+        self.lookup_seconds += time.time() - start
+        if self.session != None:
+            self.provider.watch_session(self.session)
+
+    # Called from the provider's thread, where looking sessions up again may not be allowed. Do it on a timer thread.
+    def _sessions_changed(self):
+        with self.lock:
+            self.changes += 1
+            self.session = None
+            if self.wanted == None:
+                return  # Looked up on the next call
+        (self.timers or Timers.default()).call_later(0, self._reapply)
+
+    # Apply the wanted mute state to Spotify's session after a change.
+    def _reapply(self):
+        with self.lock:
+            if self.session != None or self.wanted == None:
+                return  # Already looked up by a call since the change
+            try:
+                self._resolve()
+                if self.session != None:
+                    self.provider.set_mute(self.session, self.wanted)
+                else:
+                    self._retry_missing()
+            except MuteBackendException:
+                self.session = None
+
+    # Look for Spotify's session again in a while if it should be muted but has none, and the provider will not say
+    # when one starts. Unmuting can wait for the next call, since new sessions start unmuted. Call with lock held.
+    def _retry_missing(self):
+        if self.wanted and not self.provider.reports_new_sessions and self.retry_timer == None:
+            self.retry_timer = (self.timers or Timers.default()).call_later(self.missing_retry, self._retry_tick)
+
+    # Call with lock held.
+    def _forget_wanted(self):
+        self.wanted = None
+        if self.retry_timer != None:
+            self.retry_timer.cancel()
+            self.retry_timer = None
+
+    def _retry_tick(self):
+        with self.lock:
+            self.retry_timer = None
+        self._reapply()
+
+# Windows audio sessions through pycaw. Default device changes are reported with an IMMNotificationClient and the
+# end of the cached session with its IAudioSessionEvents; pycaw versions without pycaw.callbacks report nothing, so
+# the session is only looked up again once muting it fails. pycaw has no notification for new sessions, so a session
+# started while Spotify should be muted is found by SessionMuteBackend's periodic lookup.
+class PycawSessions(SessionProvider):
+    name = 'pycaw'
+
+    def __init__(self):
+        from pycaw.pycaw import AudioUtilities
+        self.utilities = AudioUtilities
+        self.device_client = None
+        self.watched = None  # Session with our IAudioSessionEvents registered
+
+    def sessions(self):
+        sessions = []
+        for session in self.utilities.GetAllSessions():
+            process = session.Process.name() if session.Process else ''  # No process for system sounds
+            sessions.append(AudioSession(session.ProcessId, os.path.splitext(process)[0].lower(), session))
+        return sessions
+
+    def set_mute(self, session, mute):
+        import _ctypes
+        try:
+            session.handle.SimpleAudioVolume.SetMute(int(mute), None)
+        except _ctypes.COMError as err:
+            raise MuteBackendException('pycaw: SetMute on session %s failed: %s' % (session.id, str(err)))
+
+    def watch(self):
+        try:
+            from pycaw.callbacks import MMNotificationClient
+        except ImportError:
+            return
+        provider = self
+
+        class DeviceClient(MMNotificationClient):
+            def on_default_device_changed(self, flow, flow_id, role, role_id, default_device_id):
+                provider._changed()
+
+            def on_device_state_changed(self, device_id, new_state, new_state_id):
+                provider._changed()
+
+        self.device_client = DeviceClient()
+        self.utilities.GetDeviceEnumerator().RegisterEndpointNotificationCallback(self.device_client)
+
+    def watch_session(self, session):
+        try:
+            from pycaw.callbacks import AudioSessionEvents
+        except ImportError:
+            return
+        provider = self
+
+        class SessionEvents(AudioSessionEvents):
+            def on_state_changed(self, new_state, new_state_id):
+                if new_state == 'Expired':
+                    provider._changed()
+
+            def on_session_disconnected(self, disconnect_reason, disconnect_reason_id):
+                provider._changed()
+
+        self._unwatch_session()
+        session.handle.register_notification(SessionEvents())
+        self.watched = session
+
+    def _unwatch_session(self):
+        if self.watched != None:
+            self.watched.handle.unregister_notification()
+            self.watched = None
+
+    def close(self):
+        self._unwatch_session()
+        if self.device_client != None:
+            self.utilities.GetDeviceEnumerator().UnregisterEndpointNotificationCallback(self.device_client)
+            self.device_client = None
+
+# PulseAudio or PipeWire sink inputs (application streams) through pactl. pactl subscribe reports streams and sinks
+# coming and going and default sink changes. A stream moved to another sink keeps its mute state, so moves need no
+# lookup.
+class PulseSessions(SessionProvider):
+    name = 'pactl'
+    pactl = 'pactl'
+    EVENT = re.compile(r"Event '(\w+)' on ([\w-]+) #(\d+)")
+    CHANGES = set([('new', 'sink-input'), ('remove', 'sink-input'), ('new', 'sink'), ('remove', 'sink'), ('change', 'server')])
+
+    def __init__(self):
+        self.env = dict(os.environ, LC_ALL='C')  # Output is translated otherwise
+        self.subscriber = None
+
+    def sessions(self):
+        try:
+            output = subprocess.check_output([self.pactl, 'list', 'sink-inputs'], env=self.env, universal_newlines=True)
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise MuteBackendException('pactl: list sink-inputs failed: %s' % str(err))
+        return parse_sink_inputs(output)
+
+    def set_mute(self, session, mute):
+        try:
+            subprocess.check_call([self.pactl, 'set-sink-input-mute', session.id, '1' if mute else '0'], env=self.env)
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise MuteBackendException('pactl: set-sink-input-mute %s failed: %s' % (session.id, str(err)))
+
+    def watch(self):
+        try:
+            self.subscriber = subprocess.Popen([self.pactl, 'subscribe'], stdout=subprocess.PIPE, env=self.env, universal_newlines=True)
+        except OSError:
+            return  # Muting still works; sessions are looked up again when muting fails
+        self.reports_new_sessions = True
+        thread = threading.Thread(target=self._read_events, args=(self.subscriber,), name='PulseSessions')
+        thread.daemon = True
+        thread.start()
+
+    def _read_events(self, subscriber):
+        for line in iter(subscriber.stdout.readline, ''):
+            match = self.EVENT.match(line)
+            if match and (match.group(1), match.group(2)) in self.CHANGES:
+                self._changed()
+
+    def close(self):
+        self.reports_new_sessions = False
+        if self.subscriber != None:
+            try:
+                self.subscriber.terminate()
+            except OSError:
+                pass
+            self.subscriber.wait()
+            self.subscriber = None
+
+# AudioSessions from `pactl list sink-inputs` output (in the C locale).
+def parse_sink_inputs(output):
+    sessions = []
+    properties = None
+    for line in output.splitlines():
+        if line.startswith('Sink Input #'):
+            properties = {}
+            sessions.append((line[len('Sink Input #'):].strip(), properties))
+        elif properties != None and ' = ' in line:
+            key, value = line.strip().split(' = ', 1)
+            properties[key] = value.strip('"')
+    return [AudioSession(index, (properties.get('application.process.binary') or properties.get('application.name', '')).lower(), index)
+            for index, properties in sessions]
+
+# Records mute calls in memory. Used by the engine, simulations and benchmarks.
+class FakeMuteBackend(MuteBackend):
+    name = 'fake'
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.history = []  # (time, mute) for every applied change
+
+    def _apply(self, mute):
+        self.history.append((self.clock(), mute))
+
+# Audio sessions on simulated output devices, for benchmarks. Switching devices ends every session and starts new
+# ones on the new device, as Windows does; a session that has ended can still be "muted" without an error, so a
+# cached session that is not looked up again leaves Spotify audible. lookup_seconds is how long sessions() takes.
+class FakeSessions(SessionProvider):
+    name = 'fake'
+
+    def __init__(self, processes=('spotify',), lookup_seconds=0, watching=True):
+        self.processes = processes
+        self.lookup_seconds = lookup_seconds
+        self.watching = watching  # Report changes through on_change
+        self.reports_new_sessions = watching
+        self.lock = threading.Lock()
+        self.device = 0
+        self.next_id = 0
+        self.live = []  # Sessions playing now
+        self.mutes = {}  # Session id to mute state
+        self.muted_at = None  # Time Spotify's live session was last muted
+        self._start_sessions()
+
+    def _start_sessions(self):
+        self.live = []
+        for process in self.processes:
+            self.live.append(AudioSession(self.next_id, process, self.device))
+            self.next_id += 1
+
+    def sessions(self):
+        if self.lookup_seconds:
+            time.sleep(self.lookup_seconds)
+        with self.lock:
+            return list(self.live)
+
+    def set_mute(self, session, mute):
+        with self.lock:
+            self.mutes[session.id] = mute
+            if mute and session in self.live:
+                self.muted_at = time.time()
+
+    # Move playback to another device.
+    def switch_device(self):
+        with self.lock:
+            self.device += 1
+            self._start_sessions()
+        if self.watching:
+            self._changed()
+
+    # End every session, as when Spotify closes its audio stream while paused.
+    def end_sessions(self):
+        with self.lock:
+            self.live = []
+        if self.watching:
+            self._changed()
+
+    # Start new sessions on the current device, as when playback resumes.
+    def start_sessions(self):
+        with self.lock:
+            self._start_sessions()
+        if self.watching:
+            self._changed()
+
+    # True if Spotify's live session is muted.
+    def spotify_muted(self):
+        with self.lock:
+            return any(self.mutes.get(session.id, False) for session in self.live if session.process == 'spotify')
+
+# Names create() accepts, for command line options.
+BACKENDS = ('auto', 'pycaw-session', 'pactl-session', 'pycaw', 'pactl', 'none')
+
+# The backend called name, one of BACKENDS, or None for 'auto' to leave the choice to default_backend().
+def create(name):
+    if name == 'pycaw-session':
+        return SessionMuteBackend(PycawSessions())
+    if name == 'pactl-session':
+        return SessionMuteBackend(PulseSessions())
+    if name == 'pycaw':
+        return PycawMuteBackend()
+    if name == 'pactl':
+        return PulseMuteBackend()
+    if name == 'none':
+        return FakeMuteBackend()
+    if name == 'auto':
+        return None
+    raise MuteBackendException('Unknown mute backend %s' % name)
+
+# Pick a backend for this platform: Spotify's own audio session, or the whole output device with device set.
+def default_backend(device=False):
+    import distutils.spawn
+    if sys.platform == 'win32':
+        return PycawMuteBackend() if device else SessionMuteBackend(PycawSessions())
+    if distutils.spawn.find_executable('pactl'):
+        return PulseMuteBackend() if device else SessionMuteBackend(PulseSessions())
+    raise MuteBackendException('No supported audio system found. Install pycaw (Windows) or pactl (PulseAudio/PipeWire).')
@@ -0,0 +1,58 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Compact snapshots of Spotify's currently-playing responses
+'''
+
+# The parts of a currently-playing response the poll loop uses. Immutable, so the transport can hand the
+# same snapshot out again for an unchanged response. type is Spotify's currently_playing_type.
+class PlaybackSnapshot(object):
+    __slots__ = ('track_id', 'name', 'artist', 'duration_ms', 'progress_ms', 'is_playing', 'type')
+
+    def __init__(self, track_id, name, artist, duration_ms, progress_ms, is_playing, type):
+        set_slot = object.__setattr__
+        set_slot(self, 'track_id', track_id)
+        set_slot(self, 'name', name)
+        set_slot(self, 'artist', artist)
+        set_slot(self, 'duration_ms', duration_ms)
+        set_slot(self, 'progress_ms', progress_ms)
+        set_slot(self, 'is_playing', is_playing)
+        set_slot(self, 'type', type)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PlaybackSnapshot is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('PlaybackSnapshot is immutable')
+
+    # False when Spotify sent no track, which is how ads show up.
+    @property
+    def has_item(self):
+        return self.name != None
+
+    # Identifies the track. Local files have no id, so fall back to the name for them.
+    @property
+    def key(self):
+        return self.track_id or self.name
+
+    def same_track(self, other):
+        return other != None and self.has_item and self.key == other.key
+
+    def __repr__(self):
+        return 'PlaybackSnapshot(%r, %r, %r, %r, %r, %r, %r)' % (
+            self.track_id, self.name, self.artist, self.duration_ms, self.progress_ms, self.is_playing, self.type)
+
+# Pull a snapshot out of a decoded currently-playing response. Returns None if nothing is playing (empty response).
+def parse(results):
+    if not results:
+        return None
+
+    item = results.get('item')
+    if not item:
+        return PlaybackSnapshot(None, None, None, None, results.get('progress_ms'), bool(results.get('is_playing')),
+                                results.get('currently_playing_type'))
+
+    artists = item.get('artists')
+    artist = artists[0]['name'] if artists else (item.get('show') or {}).get('name')  # Episodes have a show instead
+    return PlaybackSnapshot(item.get('id'), item.get('name') or '', artist, item.get('duration_ms'),
+                            results.get('progress_ms'), bool(results.get('is_playing')), results.get('currently_playing_type'))
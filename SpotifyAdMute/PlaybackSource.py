@@ -0,0 +1,36 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Interface for the places the poll loop can read playback from
+'''
+
+# Where the poll loop reads what Spotify is playing. Sources that learn about changes on their own (push) call
+# on_change() as soon as playback changes, so the loop can poll right away instead of waiting out its sleep.
+class PlaybackSource(object):
+    name = None
+    push = False  # True while changes are being pushed, so polls only need to catch what pushes could miss
+    on_change = None  # Called with no arguments, from any thread, when playback changed
+    requests = 0  # Web API requests sent
+
+    # Currently playing information as a Playback.PlaybackSnapshot, or None when nothing is playing.
+    def get_currently_playing(self):
+        raise NotImplementedError()
+
+    def set_token(self, token):
+        pass
+
+    # Make a read in progress on another thread fail now instead of at its timeout.
+    def abort(self):
+        pass
+
+    # Forget an abort() that came while no read was in progress, so that it does not fail the next read.
+    def clear_abort(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _changed(self):
+        on_change = self.on_change
+        if on_change:
+            on_change()
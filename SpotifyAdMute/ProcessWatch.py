@@ -0,0 +1,55 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tells whether a Spotify desktop client is running, from /proc
+'''
+
+import os
+
+# Looks for a Spotify client process in /proc. There is nothing to mute while none runs, so the poll loop can stop
+# asking the Web API until one starts. Checks stay cheap: while the client runs only its own process is read, and
+# while it does not, a scan only reads the names of processes that started since the last one.
+class ProcessWatch(object):
+    names = ('spotify',)  # Process names (/proc/<pid>/comm) of the desktop client
+    interval = 2  # Seconds between checks while no client runs
+    full_scan_every = 15  # Read every name again this often, in case a process exec'd the client since it was read
+
+    def __init__(self, proc='/proc'):
+        self.proc = proc
+        self.pid = None  # Client process found last
+        self.others = set()  # Processes known not to be the client
+        self.scans = 0  # Scans of proc
+
+    # True if a client process is running now.
+    def running(self):
+        if self.pid and self._is_client(self.pid):
+            return True
+        self.pid = None
+        try:
+            pids = set(name for name in os.listdir(self.proc) if name.isdigit())
+        except OSError:
+            return True  # Cannot tell, so keep polling
+
+        self.scans += 1
+        if self.scans % self.full_scan_every == 0:
+            self.others = set()
+        self.others &= pids  # Forget processes that exited
+        for pid in pids - self.others:
+            if self._is_client(pid):
+                self.pid = pid
+                return True
+            self.others.add(pid)
+        return False
+
+    def _is_client(self, pid):
+        try:
+            with open(os.path.join(self.proc, pid, 'comm'), 'r') as comm:
+                return comm.read().strip().lower() in self.names
+        except (IOError, OSError):
+            return False  # Exited
+
+# A watch on this machine's /proc, or None where there is no /proc (Windows, OS X).
+def default():
+    if os.path.exists('/proc/self/comm'):
+        return ProcessWatch()
+    return None
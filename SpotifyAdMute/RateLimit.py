@@ -0,0 +1,120 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Request budget shared by all pollers, honoring Spotify's 429 Retry-After
+'''
+
+import heapq
+import itertools
+import threading
+import time
+
+# Token bucket shared by every poller using the same Spotify app. Waiting requests are granted by priority,
+# then in arrival order. A 429 pauses the whole budget for its Retry-After.
+class RequestBudget(object):
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)  # Requests per second
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.clock = time.time
+        self.updated = self.clock()
+        self.blocked_until = 0
+        self.cv = threading.Condition()
+        self.waiting = []  # Heap of (-priority, sequence)
+        self.sequence = itertools.count()
+
+        # Throttle metrics
+        self.granted = 0
+        self.prioritized = 0  # Grants with priority above 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0  # Total time requests spent waiting for the budget
+        self.throttles = 0  # 429 responses reported
+        self.throttled_seconds = 0.0  # Total Retry-After honored
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Wait until a request may be sent. Returns False if timeout (seconds) passed first, or if cancellation (a
+    # Cancellation.Cancellation) was cancelled, e.g. by stop_poll() while waiting out a long Retry-After.
+    def acquire(self, priority=0, timeout=None, cancellation=None):
+        if cancellation == None:
+            return self._acquire(priority, timeout, None)
+        cancellation.register(self._wake)
+        try:
+            return self._acquire(priority, timeout, cancellation)
+        finally:
+            cancellation.unregister(self._wake)
+
+    def _acquire(self, priority, timeout, cancellation):
+        start = self.clock()
+        ticket = (-priority, next(self.sequence))
+        with self.cv:
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                if cancellation != None and cancellation.cancelled:
+                    self._leave(ticket)
+                    return False
+
+                now = self.clock()
+                self._refill(now)
+                head = self.waiting[0] == ticket
+                if head and now >= self.blocked_until and self.tokens >= 1:
+                    heapq.heappop(self.waiting)
+                    self.tokens -= 1
+                    self.granted += 1
+                    self.wait_seconds += now - start
+                    if priority > 0:
+                        self.prioritized += 1
+                    self.cv.notify_all()  # Next in line
+                    return True
+
+                remaining = None if timeout == None else timeout - (now - start)
+                if remaining != None and remaining <= 0:
+                    self._leave(ticket)
+                    self.timed_out += 1
+                    return False
+
+                delay = remaining
+                if head:
+                    delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.001)
+                    if remaining != None:
+                        delay = min(delay, remaining)
+                self.cv.wait(delay)
+
+    # Give up waiting with ticket. Must hold cv.
+    def _leave(self, ticket):
+        self.waiting.remove(ticket)
+        heapq.heapify(self.waiting)
+        self.cv.notify_all()  # Whoever is next in line now
+
+    def _wake(self):
+        with self.cv:
+            self.cv.notify_all()
+
+    # Spotify answered 429: stop granting for retry_after seconds.
+    def throttle(self, retry_after):
+        with self.cv:
+            now = self.clock()
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            self.tokens = 0
+            self.updated = now
+            self.throttles += 1
+            self.throttled_seconds += retry_after
+
+    def stats(self):
+        return {
+            'granted': self.granted,
+            'prioritized': self.prioritized,
+            'timed_out': self.timed_out,
+            'mean_wait': self.wait_seconds / self.granted if self.granted else 0.0,
+            'throttles': self.throttles,
+            'throttled_seconds': self.throttled_seconds,
+        }
+
+# Seconds Spotify asked us to wait in a 429 SpotifyException.
+def retry_after(err, default=1):
+    try:
+        return max(int(err.headers.get('Retry-After')), 0)
+    except (AttributeError, TypeError, ValueError):
+        return default
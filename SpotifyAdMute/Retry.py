@@ -0,0 +1,144 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Retry schedules and circuit breakers for failed Spotify requests, by kind of failure
+'''
+
+import random
+import socket
+
+import requests
+from spotipy.client import SpotifyException
+from spotipy.oauth2 import SpotifyOauthError
+
+# Kinds of failure. Each gets its own backoff and circuit breaker, since each clears up on its own schedule.
+AUTH = 'auth'  # Token rejected or could not be refreshed
+THROTTLE = 'throttle'  # 429 Too Many Requests
+NETWORK = 'network'  # No connection, or it dropped or timed out
+SERVER = 'server'  # 5xx, unexpected answers and anything else
+KINDS = (AUTH, THROTTLE, NETWORK, SERVER)
+
+# Kind of failure err is.
+def classify(err):
+    if isinstance(err, SpotifyException):
+        if err.http_status in (401, 403):
+            return AUTH
+        if err.http_status == 429:
+            return THROTTLE
+        return SERVER
+    if isinstance(err, SpotifyOauthError):
+        return AUTH
+    if isinstance(err, (requests.ConnectionError, requests.Timeout, socket.error)):
+        return NETWORK
+    return SERVER
+
+# Backoff and circuit breaker for one kind of failure. Each consecutive failure doubles the wait before the next try.
+# After threshold of them in a row the breaker opens: no tries until cooldown has passed, then a single trial, and
+# if that fails too it opens again for twice as long.
+class Breaker(object):
+    def __init__(self, kind, base, cap, threshold, cooldown, max_cooldown):
+        self.kind = kind
+        self.base = base  # Seconds before the first retry
+        self.cap = cap  # Longest wait between retries while closed
+        self.threshold = threshold  # Consecutive failures that open the breaker, or None to never open
+        self.cooldown = cooldown  # Seconds the breaker first stays open
+        self.max_cooldown = max_cooldown
+        self.failures = 0  # Consecutive failures
+        self.opened = 0  # Times opened since the last success
+        self.open_until = None  # Clock time the breaker lets a trial through, or None while closed
+        self.trips = 0  # Times opened in total
+
+    # True from when the breaker opens until a success, including while it lets its trial through.
+    @property
+    def is_open(self):
+        return self.open_until != None
+
+    # Record a failure at now. jitter is the fraction to take off the backoff, and retry_after how long Spotify
+    # asked us to wait, if it did; that is a floor, so jitter is added on top of it instead. Returns seconds to wait
+    # before trying again.
+    def failed(self, now, jitter=0, retry_after=None):
+        self.failures += 1
+        delay = min(self.base * 2 ** (self.failures - 1), self.cap) * (1 - jitter)
+        if retry_after:
+            delay = max(delay, retry_after * (1 + jitter))
+        if self.threshold == None or self.failures < self.threshold:
+            return delay
+        cooldown = min(self.cooldown * 2 ** self.opened, self.max_cooldown)
+        self.opened += 1
+        self.trips += 1
+        self.open_until = now + max(cooldown, delay)
+        return self.open_until - now
+
+    def reset(self):
+        self.failures = 0
+        self.opened = 0
+        self.open_until = None
+
+# Decides how long to wait after each failed request. Failures are sorted into kinds, each with its own Breaker, and
+# waits are jittered so many pollers that failed together do not all come back at the same moment. While any breaker
+# is open the poller is degraded: it keeps running and tries again when the breaker allows, rather than giving up.
+class RetryPolicy(object):
+    # (base, cap, threshold, cooldown, max_cooldown) per kind, in seconds
+    policies = {
+        AUTH: (1, 8, 2, 5, 60),  # Only counted once a forced refresh failed, so the accounts service is having trouble
+        THROTTLE: (1, 60, 3, 30, 300),  # Retry-After is the floor for every wait
+        NETWORK: (0.5, 8, 4, 5, 30),  # Wifi drops usually last seconds
+        SERVER: (1, 8, 4, 5, 30),
+    }
+    jitter = 0.5  # Fraction of each wait that is randomized
+
+    def __init__(self, rng=None, policies=None):
+        self.rng = rng or random.Random()
+        policies = policies or self.policies
+        self.breakers = dict((kind, Breaker(kind, *policies[kind])) for kind in KINDS)
+        self.failing_since = None  # Clock time of the first failure since the last success
+        self.tripped = []  # Kinds whose breakers the latest failure opened
+
+        # Recovery times: seconds from the first failure of an outage to the next success
+        self.recoveries = 0
+        self.recovery_seconds = 0.0
+        self.max_recovery_seconds = 0.0
+
+    # Record err, which happened at now. retry_after is how long Spotify asked us to wait, if it did.
+    # Returns the kind of failure and seconds to wait before trying again, which is no sooner than every open breaker
+    # allows. A failed request that was the trial of an open breaker opens that breaker again, whatever kind it is.
+    def failed(self, err, now, retry_after=None):
+        kind = classify(err)
+        if self.failing_since == None:
+            self.failing_since = now
+        jitter = self.jitter * self.rng.random()
+        trials = [breaker for breaker in self.breakers.values() if breaker.kind != kind and breaker.is_open and now >= breaker.open_until]
+        delay = self.breakers[kind].failed(now, jitter, retry_after)
+        for breaker in trials:
+            breaker.failed(now, jitter)
+        self.tripped = [breaker.kind for breaker in [self.breakers[kind]] + trials if breaker.is_open]
+        return kind, max(delay, self.wait(now))
+
+    # Record a success at now. Returns seconds since the outage it ended began, or None if nothing was failing.
+    def succeeded(self, now):
+        for breaker in self.breakers.values():
+            breaker.reset()
+        if self.failing_since == None:
+            return None
+        recovery = now - self.failing_since
+        self.failing_since = None
+        self.recoveries += 1
+        self.recovery_seconds += recovery
+        self.max_recovery_seconds = max(self.max_recovery_seconds, recovery)
+        return recovery
+
+    # True while any breaker is open.
+    @property
+    def degraded(self):
+        return any(breaker.is_open for breaker in self.breakers.values())
+
+    # Seconds from now until every open breaker lets a trial through.
+    def wait(self, now):
+        return max([breaker.open_until - now for breaker in self.breakers.values() if breaker.is_open] + [0])
+
+    # Kinds whose breakers are open.
+    def open_kinds(self):
+        return [kind for kind in KINDS if self.breakers[kind].is_open]
+
+    def trips(self):
+        return sum(breaker.trips for breaker in self.breakers.values())
@@ -0,0 +1,270 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Deterministic simulation of the SpotifyAdMute poll loop on a virtual clock
+'''
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import logging
+import random
+import sys
+
+from spotipy.client import SpotifyException
+
+import Playback
+import Retry
+from Engine import HeadlessApp
+from MuteBackend import FakeMuteBackend
+from PlaybackSource import PlaybackSource
+from SpotifyAdMute import SpotifyAdMute
+
+# Time that only moves when someone sleeps or waits on the network.
+class VirtualClock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+# Kinds of playback segments
+TRACK = 'track'
+AD = 'ad'
+PAUSED = 'paused'
+
+# What the listener hears between start and end (virtual seconds).
+# offset is how far into the item playback was at start (in seconds), e.g. when resuming after a pause.
+class Segment(object):
+    __slots__ = ('start', 'end', 'kind', 'item', 'offset')
+
+    def __init__(self, start, end, kind, item=None, offset=0.0):
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.item = item
+        self.offset = offset
+
+# A scripted listening session: playback segments plus windows where the API fails.
+# Playback progresses playback_rate times as fast as the virtual clock, to model clock drift.
+class ScriptedPlayback(object):
+    def __init__(self, segments, outages=(), playback_rate=1.0):
+        self.segments = segments
+        self.starts = [segment.start for segment in segments]
+        self.outages = list(outages)
+        self.playback_rate = playback_rate
+
+    def segment_at(self, t):
+        return self.segments[max(0, bisect.bisect_right(self.starts, t) - 1)]
+
+    def in_outage(self, t):
+        for start, end in self.outages:
+            if start <= t < end:
+                return True
+        return False
+
+    # The currently-playing response Spotify would give at time t.
+    def results_at(self, t):
+        segment = self.segment_at(t)
+        progress = segment.offset
+        if segment.kind != PAUSED:
+            progress += (t - segment.start) * self.playback_rate
+        return {
+            'is_playing': segment.kind != PAUSED,
+            'progress_ms': int(progress * 1000),
+            'currently_playing_type': 'ad' if segment.kind == AD else 'track',
+            'item': segment.item}
+
+    # Ad breaks as (start, end), merging back-to-back ads.
+    def ad_breaks(self):
+        breaks = []
+        for segment in self.segments:
+            if segment.kind != AD:
+                continue
+            if breaks and breaks[-1][1] == segment.start:
+                breaks[-1] = (breaks[-1][0], segment.end)
+            else:
+                breaks.append((segment.start, segment.end))
+        return breaks
+
+# Build a random listening session: a few tracks (some skipped, some paused), then an ad break, repeated.
+def generate_session(rng, hours, skip_probability=0.1, pause_probability=0.02, outages_per_hour=0.05, playback_rate=1.002):
+    segments = []
+    now = 0.0
+    track_number = 0
+    while now < hours * 3600:
+        for _ in range(rng.randint(2, 4)):
+            duration = rng.uniform(150, 300)
+            item = {'id': 'track%d' % track_number, 'name': 'Track %d' % track_number,
+                    'artists': [{'name': 'Artist %d' % (track_number % 13)}], 'duration_ms': int(duration * 1000)}
+            played = duration * rng.uniform(0.1, 0.9) if rng.random() < skip_probability else duration
+            position = 0.0
+            if rng.random() < pause_probability:
+                # Pause partway through, then resume where we left off
+                position = played * rng.uniform(0.1, 0.9)
+                segments.append(Segment(now, now + position / playback_rate, TRACK, item))
+                now += position / playback_rate
+                pause = rng.uniform(10, 1800)
+                segments.append(Segment(now, now + pause, PAUSED, item, position))
+                now += pause
+            segments.append(Segment(now, now + (played - position) / playback_rate, TRACK, item, position))
+            now += (played - position) / playback_rate
+            track_number += 1
+        for _ in range(rng.randint(1, 2)):
+            duration = rng.choice([15, 30])
+            segments.append(Segment(now, now + duration / playback_rate, AD))
+            now += duration / playback_rate
+
+    outages = []
+    for _ in range(int(hours * outages_per_hour)):
+        start = rng.uniform(0, hours * 3600)
+        outages.append((start, start + rng.uniform(5, 120)))
+    return ScriptedPlayback(segments, outages, playback_rate)
+
+# Stands in for Transport, answering from a scripted session on the virtual clock.
+class SimulatedTransport(PlaybackSource):
+    name = 'simulated'
+
+    def __init__(self, playback, clock, rng, min_latency=0.05, max_latency=0.25):
+        self.playback = playback
+        self.clock = clock
+        self.rng = rng
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.requests = 0
+        self.errors = 0
+
+    def get_currently_playing(self):
+        latency = self.rng.uniform(self.min_latency, self.max_latency)
+        sampled_at = self.clock() + latency / 2
+        self.clock.sleep(latency)
+        self.requests += 1
+        if self.playback.in_outage(sampled_at):
+            self.errors += 1
+            raise SpotifyException(503, -1, 'Service unavailable (simulated)')
+
+        return Playback.parse(self.playback.results_at(sampled_at))
+
+# Swallows prints from the state machine while simulating.
+class NullWriter(object):
+    def write(self, string):
+        pass
+    def flush(self):
+        pass
+
+class SimulationResult(object):
+    def __init__(self, hours, api_calls, api_errors, mute_latencies, missed_breaks, leaked_ad_seconds, false_mute_seconds, mute_calls, retry=None):
+        self.hours = hours
+        self.api_calls = api_calls
+        self.api_errors = api_errors
+        self.mute_latencies = mute_latencies  # Seconds from each ad break start until muted, sorted
+        self.missed_breaks = missed_breaks  # Ad breaks that were never muted
+        self.leaked_ad_seconds = leaked_ad_seconds  # Ad audio heard while unmuted
+        self.false_mute_seconds = false_mute_seconds  # Music lost while muted
+        self.mute_calls = mute_calls  # Calls that reached the mute backend
+        self.retry = retry  # The poll loop's Retry.RetryPolicy, for recovery times
+
+    def rows(self):
+        latencies = self.mute_latencies or [0]
+        return [
+            ('api calls', '%d (%.0f/hour, %d errors)' % (self.api_calls, self.api_calls / self.hours, self.api_errors)),
+            ('mute latency', 'mean %.2f s, p95 %.2f s, max %.2f s' % (
+                sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.95)], latencies[-1])),
+            ('missed ad breaks', '%d' % self.missed_breaks),
+            ('leaked ad', '%.0f s (%.1f s/hour)' % (self.leaked_ad_seconds, self.leaked_ad_seconds / self.hours)),
+            ('false mute', '%.0f s (%.1f s/hour)' % (self.false_mute_seconds, self.false_mute_seconds / self.hours)),
+            ('mute calls', '%d' % self.mute_calls),
+        ] + ([('recovery', 'mean %.1f s, max %.1f s over %d outages, %d breaker trips' % (
+            self.retry.recovery_seconds / max(self.retry.recoveries, 1), self.retry.max_recovery_seconds, self.retry.recoveries, self.retry.trips()))] if self.retry else [])
+
+# Total length of the parts of intervals (sorted (start, end) pairs) where muted is equal to want.
+def _overlap(intervals, history, want):
+    total = 0.0
+    for start, end in intervals:
+        # Mute state at start is the last change before it
+        index = bisect.bisect_right(history, (start, True)) - 1
+        muted = history[index][1] if index >= 0 else False
+        t = start
+        index += 1
+        while index < len(history) and history[index][0] < end:
+            if muted == want:
+                total += history[index][0] - t
+            t, muted = history[index]
+            index += 1
+        if muted == want:
+            total += end - t
+    return total
+
+# Run SpotifyAdMute.poll over a generated session. configure(ad_mute) can tweak the instance before it starts.
+def simulate(hours=100, seed=1, scheduler=SpotifyAdMute.Scheduler.Fixed, configure=None, **session_options):
+    rng = random.Random(seed)
+    playback = generate_session(rng, hours, **session_options)
+    clock = VirtualClock()
+
+    logger = logging.getLogger('SpotifyAdMute.Simulation')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+
+    mute_backend = FakeMuteBackend(clock)
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, mute_backend)
+    ad_mute.retry = Retry.RetryPolicy(random.Random(seed))
+    ad_mute.clock = clock
+    ad_mute.sleep = clock.sleep
+    ad_mute.scheduler = scheduler
+    ad_mute.transport = SimulatedTransport(playback, clock, rng)
+    if configure:
+        configure(ad_mute)
+
+    stdout = sys.stdout
+    sys.stdout = NullWriter()
+    try:
+        while clock.now < hours * 3600:
+            ad_mute.poll()
+    finally:
+        sys.stdout = stdout
+
+    end = hours * 3600
+    history = [(t, mute) for t, mute in mute_backend.history]
+    ad_breaks = [(start, min(stop, end)) for start, stop in playback.ad_breaks() if start < end]
+    music = [(segment.start, min(segment.end, end)) for segment in playback.segments if segment.kind == TRACK and segment.start < end]
+
+    latencies = []
+    for start, stop in ad_breaks:
+        index = bisect.bisect_left(history, (start, False))
+        if index > 0 and history[index - 1][1]:
+            latencies.append(0.0)  # Already muted, e.g. pre-muted at the end of the track before
+            continue
+        while index < len(history) and not history[index][1]:
+            index += 1
+        if index < len(history) and history[index][0] < stop:
+            latencies.append(history[index][0] - start)
+    latencies.sort()
+
+    return SimulationResult(
+        hours, ad_mute.transport.requests, ad_mute.transport.errors, latencies, len(ad_breaks) - len(latencies),
+        _overlap(ad_breaks, history, False), _overlap(music, history, True), mute_backend.calls, ad_mute.retry)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate Spotify Ad Mute over scripted listening sessions.')
+    parser.add_argument('--hours', type=float, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scheduler', choices=[scheduler.name for scheduler in SpotifyAdMute.Scheduler], default='Fixed')
+    parser.add_argument('--premute', action='store_true', help='mute at the predicted end of each track')
+    parser.add_argument('--premute-lead', type=float, default=SpotifyAdMute.premute_lead)
+    parser.add_argument('--premute-check-delay', type=float, default=SpotifyAdMute.premute_check_delay)
+    args = parser.parse_args()
+
+    def configure(ad_mute):
+        ad_mute.premute = args.premute
+        ad_mute.premute_lead = args.premute_lead
+        ad_mute.premute_check_delay = args.premute_check_delay
+
+    result = simulate(args.hours, args.seed, SpotifyAdMute.Scheduler[args.scheduler], configure)
+    print('Scheduler %s%s: %g simulated hours' % (args.scheduler, ', pre-mute %g s' % args.premute_lead if args.premute else '', args.hours))
+    for name, value in result.rows():
+        print('  %s  %s' % (name.ljust(16), value))
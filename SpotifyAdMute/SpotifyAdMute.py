@@ -12,17 +12,29 @@ import time
 import requests
 import logging
 import threading
-import Queue
 from enum import Enum
 
 # Spotify API
 import spotipy
+import Cadence
+import Cancellation
 import Utility
-
-# Volume controller
-from ctypes import cast, POINTER
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+import Logs
+import Metrics
+import Mpris
+import MuteBackend
+import RateLimit
+import Retry
+import Timeline
+import TokenStore
+from TokenManager import TokenManager
+from Transport import API_PREFIX, Transport
+
+# Spotify app credentials
+SCOPE = 'user-read-currently-playing'
+CLIENT_ID = '56bfb83b714a4c708faef8e06bf7abcb'
+CLIENT_SECRET = '38b7264e4ea04523a7092a01d26081f8'
+REDIRECT_URI = 'http://google.com'
 
 class SpotifyAdMuteException(Exception):
     def __init__(self, msg):
@@ -38,183 +50,465 @@ class SpotifyAdMute(object):
         Music = 2
         Ad = 3
 
+    # Poll scheduling policies
+    class Scheduler(Enum):
+        Fixed = 1  # Sleep at most music_default_sleep, waking 1s after a track ends
+        Predictive = 2  # Sleep until just after a predicted track boundary, polling densely only if the track overruns it
+        Cadence = 3  # Like Predictive, but skip track boundaries where the learned ad cadence says no ad is due
+
     # Initialized in init().
     logger = None
     spotify = None
-    volume = None
+    token_manager = None
+    transport = None
+    mute_backend = None
+    timeline = None  # Timeline.TimelineWriter recording transitions, opened at login
 
     # Cached information
     username = None
     first_name = None
+    profile = None
+    profile_ttl = 24 * 60 * 60  # Seconds before a cached profile is queried again
+    token_store = None  # TokenStore.TokenStore to keep the token and profile in, instead of files in the cache folder
+    api_prefix = API_PREFIX
     state = None
     current_track = None
 
-    # To break out of sleep early
-    cv = threading.Condition()
+    # To break out of sleep early. Each instance gets its own cv in __init__.
+    cv = None
     notified = False
     quit = False
 
+    # Polling on a Timers.TimerQueue, see start_polling()
+    polling = False
+    poll_timer = None  # Timers.Timer for the next poll or pre-mute
+    poll_sequence = 0  # Bumped each time poll_timer is replaced
+    timers = None
+
+    # Where playback is read from: 'web' polls the Web API, 'mpris' listens to the local client and falls back to the Web API
+    playback_source = 'web'
+    push_max_sleep = 30  # Upper bound between polls while a push source reports changes as they happen
+    changed = False  # Set when a push source reported a change, to cut the current sleep short
+
     # Default poll sleep times (in seconds)
     ad_default_sleep = 4
     music_default_sleep = 10
 
-    # Initialize modules
-    def __init__(self, app, logger):
+    # Idle settings (in seconds): while nothing plays, each poll waits longer than the last, from ad_default_sleep up to idle_max_sleep
+    idle_backoff = 2  # Multiply the sleep by this after each poll that finds nothing playing
+    idle_max_sleep = 30  # Short enough that an ad after resuming is still caught
+    idle_sleep = None  # Sleep after the latest idle poll, or None while playing
+    process_watch = None  # ProcessWatch.ProcessWatch. If set, polls are suspended while no Spotify client runs here
+    suspended = False
+
+    # Predictive scheduler settings (in seconds)
+    scheduler = Scheduler.Fixed
+    predictive_max_sleep = 10  # Upper bound between polls until two polls of the track agree on its progress, as with Fixed
+    confirmed_max_sleep = 12  # Upper bound between polls once they do
+    boundary_margin = 0.2  # Poll this long after a predicted track end
+    boundary_poll_interval = 0.5  # Poll this often while a track overruns its predicted end
+    max_drift = 0.05  # Ignore playback rate samples further than this from real time (seeks)
+    drift_smoothing = 0.2
+
+    # Pre-mute settings (in seconds): mute at the predicted end of a track, before a poll can see whether an ad follows,
+    # and poll right after so music is unmuted at once. A longer lead leaks less of an ad but mutes more music.
+    premute = False
+    premute_lead = 0.1  # Mute this long before the predicted track end
+    premute_check_delay = 0.1  # Poll this long after the predicted track end to see what followed
+    premuted_at = None  # Clock time of a pre-mute not yet resolved by a poll
+
+    # Ad cadence settings
+    cadence = None  # Cadence.CadenceModel learning this account's ad cadence, loaded at login
+    cadence_unlikely = 0.1  # Stretch polls within a track if the chance of an ad after it is below this
+    cadence_max_sleep = 30  # Upper bound between polls within a track while no ad is due. Track ends are still polled
+    ad_end_margin = 0.3  # Poll this long after an ad is predicted to end
+
+    # Failed requests
+    retry = None  # Retry.RetryPolicy deciding how long to wait after each failure. Each instance gets its own in __init__
+
+    # Rate limiting
+    budget = None  # RateLimit.RequestBudget shared with other pollers of the same Spotify app, if any
+    boundary_window = 5  # Seconds around a predicted track end during which polls get priority
+    track_ends_at = None  # Clock time the current track is predicted to end
+
+    # Measured around each poll. drift is how much faster playback runs than our clock.
+    request_latency = 0.0
+    received_at = None
+    drift = 0.0
+    last_progress = None
+
+    # Initialize modules. Pass a mute backend to use instead of the platform default.
+    def __init__(self, app, logger, mute_backend=None):
         self.app = app
         self.logger = logger
-        self._init_volume()
+        self.poll_logger = logger.getChild('Poll')  # Per-poll chatter, with its own level
+        self.clock = time.time  # Simulations replace clock and sleep with virtual time
+        self.sleep = self._sleep
+        self.cv = threading.Condition()
+        self.cancellation = Cancellation.Cancellation()  # Cancelled by stop_poll(), replaced by start_polling()
+        self.poll_lock = threading.Lock()  # Orders scheduling the next poll against stop_poll()
+        self.poll_idle = threading.Event()  # Clear while a poll scheduled by start_polling() runs
+        self.poll_idle.set()
+        self.cadence = Cadence.CadenceModel()  # Replaced by the account's saved model at login
+        self.retry = Retry.RetryPolicy()
+        if mute_backend:
+            self.mute_backend = mute_backend
+        else:
+            self._init_volume()
 
         self.logger.info('SpotifyAdMute: Successful initialization.')
         
     # Initialize Spotify
     def _init_spotify(self):
-        scope = 'user-read-currently-playing'
-        client_id = '56bfb83b714a4c708faef8e06bf7abcb'
-        client_secret = '38b7264e4ea04523a7092a01d26081f8'
-        redirect_uri = 'http://google.com'
         cache_path = '%s/.cache-%s' % (self.app.cache_folder, self.app.username)
 
-        try:
-            token = Utility.get_user_token(self.logger, self.app, self.username, scope, client_id, client_secret, redirect_uri, cache_path)
-        except spotipy.oauth2.SpotifyOauthError as err:
-            self.logger.error('SpotifyAdMute: While initializing Spotify, got exception: %s' % str(err))
-            raise SpotifyAdMuteException('Error retrieving token for: %s' % self.username)
-        
-        if not token:
-            self.logger.error('SpotifyAdMute: Got token <None> for %s' % self.username)
-            raise SpotifyAdMuteException('Could not get token for %s' % self.username)
-
+        token_info = None
+        if self.token_store:
+            token_info = self.token_store.get_token(self.username)[0]
+        if not token_info:
+            try:
+                sp_oauth, token_info = Utility.get_user_token_info(self.logger, self.app, self.username, SCOPE, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, cache_path)
+            except spotipy.oauth2.SpotifyOauthError as err:
+                self.logger.error('SpotifyAdMute: While initializing Spotify, got exception: %s' % str(err))
+                raise SpotifyAdMuteException('Error retrieving token for: %s' % self.username)
+
+            if not token_info:
+                self.logger.error('SpotifyAdMute: Got token <None> for %s' % self.username)
+                raise SpotifyAdMuteException('Could not get token for %s' % self.username)
+            if self.token_store:
+                self.token_store.put_token(self.username, token_info)
+
+        # From here on the token lives in memory and is refreshed without going back to disk, or through the store
+        if self.token_store:
+            sp_oauth = TokenStore.oauth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE)
+            self.token_manager = TokenStore.StoredTokenManager(self.logger, sp_oauth, self.token_store, self.username)
+        else:
+            self.token_manager = TokenManager(self.logger, sp_oauth, token_info)
+        token = self.token_manager.token_info['access_token']
         self.spotify = spotipy.Spotify(auth=token)
+        self.spotify.prefix = self.api_prefix
+        if self.transport:
+            self.transport.set_token(token)
+        else:
+            self.transport = self._create_source(token)
+
+        self.profile = self._get_profile()
+        if self.profile['id'] != self.username:
+            # Remove the mismatched token
+            if self.token_store:
+                self.token_store.remove(self.username)
+            if os.path.isfile(cache_path):
+                os.remove(cache_path)
+            Utility.remove_cached_profile(self.app.cache_folder, self.username)
+            raise SpotifyAdMuteException('Could not verify username: %s. Make sure you enter the same username as that of the logged-in account.' % self.username)
 
+        self.logger.info('SpotifyAdMute: Initialized Spotify.')
+
+    # The PlaybackSource named by playback_source. Falls back to the Web API if the local source is unavailable.
+    def _create_source(self, token):
+        transport = Transport(self.logger, token, self.api_prefix)
+        if self.playback_source != 'mpris':
+            return transport
         try:
-            if self.spotify.current_user()['id'] != self.username:
-                os.remove(cache_path)  # Remove the mismatched token
-                raise SpotifyAdMuteException('Could not verify username: %s. Make sure you enter the same username as that of the logged-in account.' % self.username)
+            return Mpris.MprisSource(self.logger, Mpris.DBusMonitorBus(self.logger), transport)
+        except Mpris.MprisException as err:
+            self.logger.warn('SpotifyAdMute: Reading playback from the Web API only: %s' % str(err))
+            return transport
+
+    # Get the user's profile, querying Spotify only if there is no fresh cached copy.
+    def _get_profile(self):
+        if self.token_store:
+            profile = self.token_store.get_profile(self.username, self.profile_ttl)
+        else:
+            profile = Utility.get_cached_profile(self.logger, self.app.cache_folder, self.username, self.profile_ttl)
+        if profile:
+            return profile
+
+        try:
+            profile = self.spotify.current_user()
         except requests.ConnectionError as err:
             raise SpotifyAdMuteException('Failed to establish a connection to Spotify. Make sure you are connected to wifi.')
         except:
             raise SpotifyAdMuteException('Got an unknown error while querying from Spotify')
 
-        self.logger.info('SpotifyAdMute: Initialized Spotify.')
+        if profile['id'] == self.username:
+            if self.token_store:
+                self.token_store.put_profile(self.username, profile)
+            else:
+                Utility.cache_profile(self.logger, self.app.cache_folder, self.username, profile)
+        return profile
+
+    # Force a refresh of the token, e.g. after Spotify rejected it. Returns None on success, otherwise the exception.
+    def _refresh_token(self):
+        try:
+            self.token_manager.refresh()
+        except Exception as err:
+            self.logger.error('SpotifyAdMute: While refreshing token, got exception: %s' % str(err))
+            return err
+        return None
 
     # Initialize volume
     def _init_volume(self):
-        devices = AudioUtilities.GetSpeakers()
-        interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-        self.volume = cast(interface, POINTER(IAudioEndpointVolume))
-        self.logger.info('SpotifyAdMute: Initialized volume.')
-
-    # Poll Spotify for information on currently playing track.
-    def _try_get_currently_playing(self, retry_attempts=3):
-        results = None
-        success = False
-        duration = 0.5  # Seconds to wait
-        while retry_attempts > 0 and not success:
+        try:
+            self.mute_backend = MuteBackend.default_backend()
+        except MuteBackend.MuteBackendException as err:
+            self.logger.error('SpotifyAdMute: While initializing volume, got exception: %s' % str(err))
+            raise SpotifyAdMuteException(str(err))
+        self.logger.info('SpotifyAdMute: Initialized volume with %s backend.' % self.mute_backend.name)
+
+    # Poll Spotify once for information on currently playing track. A rejected token is refreshed and the query sent
+    # again right away; any other failure is left for the caller to retry, on a timer rather than by sleeping here.
+    # Returns (results, kind, retry_in): kind is None on success, otherwise the kind of failure, and retry_in is the
+    # seconds the retry policy says to wait before the next try.
+    def _try_get_currently_playing(self):
+        refreshed = False
+        while True:
+            sent_at = None
+            if self.cancellation.cancelled:
+                self.quit = True  # Quit when we return to poll_once()
+                return None, None, None
+            retry_after = None
             try:
-                self.logger.info('Querying Spotify.')
-                results = self.spotify._get('me/player/currently-playing')
-                self.logger.info('Queried Spotify.')
-                success = True
+                self.poll_logger.info('Querying Spotify.')
+                if self.token_manager:
+                    self.transport.set_token(self.token_manager.get_token())
+                if self.budget and not self.budget.acquire(self.boundary_priority(), cancellation=self.cancellation):
+                    self.logger.info('SpotifyAdMute: Poll was cancelled while waiting for the request budget.')
+                    self.quit = True  # Quit when we return to poll_once()
+                    return None, None, None
+                sent_at = self.clock()
+                self.transport.clear_abort()  # An abort() that came between requests is not meant for this one
+                self.cancellation.register(self.transport.abort)
+                try:
+                    results = self.transport.get_currently_playing()
+                finally:
+                    self.cancellation.unregister(self.transport.abort)
+                self.received_at = self.clock()
+                self.request_latency = self.received_at - sent_at
+                Metrics.request_seconds.observe(self.request_latency, ('ok',))
+                Metrics.requests_total.inc(labels=('ok',))
+                self.poll_logger.info('Queried Spotify.')
+                self._recovered()
+                return results, None, None
             except spotipy.client.SpotifyException as err:
-                # TODO: Try manually raising this error and seeing what happens
                 self.logger.error('SpotifyAdMute: While polling for currently playing track information, got exception %s' % str(err))
-                retry_attempts -= 1
-                self._init_spotify()
-            except:
-                self.logger.error('SpotifyAdMute: While polling for currently playing track information, got unexpected exception!')
-                retry_attempts -= 1
-
-            if not success:
-                print('Could not poll Spotify. Retrying in %d seconds' % duration)
-                self.logger.info('SpotifyAdMute: Waiting for %d seconds before retrying poll.' % duration)
-                self.cv.acquire()
-                self.cv.wait(timeout=duration)
-                self.cv.release()
-
-                if self.notified:
-                    self.logger.info('SpotifyAdMute: Poll was manually interrupted.')
-                    self.notified = False
-                    self.quit = True  # Quit when we return to poll()
-                    return results, True  # Exit waiting loop immediately
-
-                duration *= 2  # Exponentially increase waiting time
-
-        return results, success
-
-    # Continually poll Spotify for information on currently playing track until successful or user exits.
-    def _get_currently_playing(self):
-        success = False
-        while not success:
-            results, success = self._try_get_currently_playing()
-
-            if not success:
-                self.logger.error('SpotifyAdMute: Could not poll for currently playing track information. Waiting for user input.')
-                response_queue = Queue.Queue()
-                self.app.request(self.app.ask_user_yesno, ('Error', 'Could not poll for currently playing track information. Check %s for more info.\n\n\tTry again?' % self.logger.handlers[0].baseFilename), response_queue)
-                response = response_queue.get()
-                done = False
-                while not done:
-                    if response:
-                        done = True
-                    else:
-                        self.app.request(self.app.stop_ad_mute)
-                        self.quit = True  # Quit when we return to poll()
-                        self.logger.info('SpotifyAdMute: User said to stop polling. Sleeping until stop_ad_mute request is serviced by Gui.')
-                        self.cv.acquire()
-                        self.cv.wait()
-                        self.cv.release()
-
-                        if self.notified:
-                            self.logger.info('SpotifyAdMute: Indeed, we broke out of the wait with the stop_poll function.')
-                            self.notified = False
-                        else:
-                            self.logger.warn('SpotifyAdMute: Woke up from something else signalling cv?')
-
-                        self.logger.info('SpotifyAdMute: stop_ad_mute request was serviced. Stopping ad mute now.')
-                        return results
-
-        return results
+                self._record_failed_request(sent_at, err)
+                if err.http_status == 429:
+                    retry_after = RateLimit.retry_after(err)
+                    if self.budget:
+                        self.budget.throttle(retry_after)
+                error = err
+            except Exception as err:
+                if self.cancellation.cancelled:
+                    self.logger.info('SpotifyAdMute: Poll was cancelled while querying Spotify.')
+                    self.quit = True  # Quit when we return to poll_once()
+                    return None, None, None
+                self.logger.error('SpotifyAdMute: While polling for currently playing track information, got exception: %s' % str(err))
+                self._record_failed_request(sent_at, err)
+                error = err
+
+            # An expired or revoked token is fixed by a new one, so only count it as a failure if refreshing fails
+            # or Spotify rejects the new token too
+            if Retry.classify(error) == Retry.AUTH and self.token_manager and not refreshed:
+                refreshed = True
+                refresh_error = self._refresh_token()
+                if refresh_error == None:
+                    Metrics.retries_total.inc()
+                    continue
+                error = refresh_error
+
+            degraded = self.retry.degraded
+            kind, duration = self.retry.failed(error, self.clock(), retry_after)
+            if self.retry.degraded:
+                self._degrade(duration, degraded)
+                return None, kind, duration
+
+            Metrics.retries_total.inc()
+            print('Could not poll Spotify. Retrying in %.1f seconds' % duration)
+            self.logger.info('SpotifyAdMute: Retrying poll in %.1f seconds (%s error).' % (duration, kind))
+            return None, kind, duration
+
+    # Count a request that failed with err, labelled with the kind of failure the retry policy sees in it.
+    # sent_at is None if the request failed before it was sent.
+    def _record_failed_request(self, sent_at, err):
+        outcome = Retry.classify(err)
+        if sent_at != None:
+            Metrics.request_seconds.observe(self.clock() - sent_at, (outcome,))
+        Metrics.requests_total.inc(labels=(outcome,))
+
+    # A request failed while a circuit breaker is open after repeated failures. Monitoring carries on degraded, trying
+    # again when every open breaker allows, and the user is told without anything waiting for their answer. degraded is
+    # True if a breaker was open already before this failure.
+    def _degrade(self, duration, degraded):
+        for kind in self.retry.tripped:
+            Metrics.breaker_trips_total.inc(labels=(kind,))
+        kinds = '/'.join(self.retry.open_kinds())
+        if degraded:
+            self.logger.info('SpotifyAdMute: Still cannot reach Spotify (%s errors). Retrying in %.0f seconds.' % (kinds, duration))
+            return
+        Metrics.degraded.set(1)
+        message = 'Cannot reach Spotify (%s errors). Still monitoring; retrying in %.0f seconds. Check %s for more info.' % (kinds, duration, Logs.current_log_file(self.logger))
+        print(message)
+        self.logger.error('SpotifyAdMute: %s' % message)
+        self.app.request(self.app.set_currently_playing_label)
+
+    # A request went through. Leave degraded mode if we were in it.
+    def _recovered(self):
+        degraded = self.retry.degraded
+        recovery = self.retry.succeeded(self.clock())
+        if recovery == None:
+            return
+        Metrics.recovery_seconds.observe(recovery)
+        if degraded:
+            Metrics.degraded.set(0)
+            message = 'Reached Spotify again after %.0f seconds.' % recovery
+            print(message)
+            self.logger.info('SpotifyAdMute: %s' % message)
+            self.app.request(self.app.set_currently_playing_label)
 
     # Print track information.
     def print_current_track(self):
-        return '"%s" by %s' % (self.current_track['name'], self.current_track['artists'][0]['name'])
+        return '"%s" by %s' % (self.current_track.name, self.current_track.artist)
+
+    # Feed what this poll saw to the ad cadence model.
+    def _learn_cadence(self, results, previous_state, previous_ends_at):
+        if self.state == self.State.Music:
+            started_at = self.track_ends_at - results.duration_ms / 1000.0 / (1 + self.drift)
+            if previous_state == self.State.Ad:
+                self.cadence.ad_ended(started_at)
+                self._save_cadence()
+            self.cadence.track_playing(results.key, started_at, previous_ends_at)
+        elif self.state == self.State.Ad:
+            if previous_state != self.State.Ad:
+                self.cadence.ad_break_started()
+            if results.progress_ms != None:
+                self.cadence.ad_playing(self._sampled_at() - results.progress_ms / 1000.0 / (1 + self.drift))
+        else:
+            self.cadence.paused()
+
+    def _save_cadence(self):
+        try:
+            self.cadence.save()
+        except (IOError, OSError) as err:
+            self.logger.error('SpotifyAdMute: While saving ad cadence, got exception: %s' % str(err))
 
     # Compute remaining time.
     def _get_sleep_duration(self, results):
-        if not results or not results['item']:
+        if not results or not results.is_playing:
+            self.last_progress = None
+            return self._get_idle_sleep_duration()
+        self.idle_sleep = None
+
+        if self.scheduler == self.Scheduler.Predictive:
+            return self._get_predictive_sleep_duration(results)
+        if self.scheduler == self.Scheduler.Cadence:
+            return self._get_cadence_sleep_duration(results)
+
+        if not results or not results.has_item:
             return self.ad_default_sleep  # Sleep for 4 seconds if playing ad
 
         # Sleep for 10 seconds by default, or less if a track is about to end
         # We poll regularly in case the user skips a track and enters an ad
         # Add 1s to ensure we poll after ad begins
-        remaining_duration = (results['item']['duration_ms'] - results['progress_ms']) / 1000 + 1
+        remaining_duration = (results.duration_ms - results.progress_ms) / 1000 + 1
         return min([remaining_duration, self.music_default_sleep])
-        
-    def _protected_set_mute(self, mute):
-        try:
-            self.volume.SetMute(mute, None)
-        except _ctypes.COMError as err:
-            self.logger.error('SpotifyAdMute: While setting mute, got exception: ' + err)
-            raise SpotifyAdMuteException('SpotifyAdMute: Got an unexpected error. Check %s for more info.' % self.logger.handlers[0].baseFilename)
 
-    # Run main loop that adjusts volume based on current track.
-    def poll(self):
-        if not self.spotify:
-            raise SpotifyAdMuteException('SpotifyAdMute: Cannot poll because not logged in!')
-
-        self.logger.info('SpotifyAdMute: Begin polling.')
-
-        results = self._get_currently_playing()
-
-        # Quit if user chose to quit during _get_currently_playing()
-        if self.quit:
-            self.logger.info('SpotifyAdMute: Exiting poll')
-            self.quit = False
-            return
+    # Back off while nothing is playing: nothing can leak until the user presses play.
+    def _get_idle_sleep_duration(self):
+        if self.idle_sleep == None:
+            self.idle_sleep = self.ad_default_sleep
+        else:
+            self.idle_sleep = min(self.idle_sleep * self.idle_backoff, self.idle_max_sleep)
+        return self.idle_sleep
+
+    # Compute time until the next poll should be sent so that it lands just after the current track ends, sleeping at
+    # most max_sleep before then. By default that is predictive_max_sleep, or confirmed_max_sleep once two polls of the
+    # track agree on its progress, since the track end is then known well and only a skip can come sooner.
+    def _get_predictive_sleep_duration(self, results, max_sleep=None):
+        if not results or not results.has_item or not results.is_playing:
+            self.last_progress = None
+            return self.ad_default_sleep
+
+        confirmed = self._update_drift(results)
+        if max_sleep == None:
+            max_sleep = self.confirmed_max_sleep if confirmed else self.predictive_max_sleep
+
+        # Spotify sampled progress about halfway through the request, and the next request
+        # will be sampled about halfway through as well, so one full latency is already spent.
+        remaining = (results.duration_ms - results.progress_ms) / 1000.0 / (1 + self.drift) - self.request_latency
+        if remaining <= 0:
+            return self.boundary_poll_interval  # Track overran its predicted end
+        if remaining > max_sleep:
+            return max_sleep
+        return remaining + self.boundary_margin
+
+    # Like the predictive schedule, but while no ad is due, stretch the polls within a track up to cadence_max_sleep,
+    # still waking for the track boundary. During an ad, sleep until the shortest learned ad length that could still be
+    # playing runs out.
+    def _get_cadence_sleep_duration(self, results):
+        if results and results.has_item and results.is_playing and self.cadence.ad_probability() < self.cadence_unlikely:
+            return self._get_predictive_sleep_duration(results, self.cadence_max_sleep)
+        duration = self._get_predictive_sleep_duration(results)
+        if not results or not results.is_playing:
+            return duration
+
+        if not results.has_item:
+            if results.progress_ms == None:
+                return duration
+            elapsed = results.progress_ms / 1000.0
+            ends_after = self.cadence.ad_ends_after(elapsed)
+            if ends_after == None:
+                return duration
+            return max((ends_after - elapsed) / (1 + self.drift) - self.request_latency + self.ad_end_margin, self.boundary_poll_interval)
+        return duration
+
+    # Estimate how fast playback progresses relative to our clock from consecutive polls of one track.
+    # Returns True if this poll's progress agreed with the last one's, i.e. there was no seek in between.
+    def _update_drift(self, results):
+        track_id = results.key
+        sampled_at = self._sampled_at()
+        progress = results.progress_ms / 1000.0
+        confirmed = False
+
+        if self.last_progress:
+            last_track_id, last_sampled_at, last_progress = self.last_progress
+            elapsed = sampled_at - last_sampled_at
+            if last_track_id == track_id and elapsed >= 1:
+                rate = (progress - last_progress) / elapsed - 1
+                if abs(rate) <= self.max_drift:
+                    self.drift += self.drift_smoothing * (rate - self.drift)
+                    confirmed = True
+
+        self.last_progress = (track_id, sampled_at, progress)
+        return confirmed
+
+    # Priority for the next request: 1 near a predicted track end, where a late poll means hearing an ad, otherwise 0.
+    def boundary_priority(self):
+        if self.track_ends_at != None and abs(self.clock() - self.track_ends_at) <= self.boundary_window:
+            return 1
+        return 0
 
-        # Process results
-        if not results or not results['is_playing']:
-            self.logger.info('SpotifyAdMute: Entering paused state. Current track: {%s}. Current state: {%s}.' %(self.current_track, self.state))
+    def _protected_set_mute(self, mute):
+        changed = bool(mute) != self.mute_backend.muted
+        start = self.clock()
+        try:
+            self.mute_backend.set_mute(mute)
+            if changed:
+                Metrics.mute_seconds.observe(self.clock() - start)
+                Metrics.mute_changes_total.inc(labels=(str(int(bool(mute))),))
+        except MuteBackend.MuteBackendException as err:
+            self.logger.error('SpotifyAdMute: While setting mute, got exception: %s' % str(err))
+            raise SpotifyAdMuteException('SpotifyAdMute: Got an unexpected error. Check %s for more info.' % Logs.current_log_file(self.logger))
+
+    # Advance the Paused/Music/Ad state machine with a poll result (a Playback.PlaybackSnapshot, or None if nothing is playing).
+    # Returns seconds to sleep before the next poll.
+    def update_state(self, results):
+        previous_state = self.state
+        previous_track = self.current_track
+        previous_ends_at = self.track_ends_at
+        lag = 0
+        if not results or not results.is_playing:
+            self.poll_logger.info('SpotifyAdMute: Entering paused state. Current track: {%s}. Current state: {%s}.', self.current_track, self.state)
             # Paused state
             if self.state != self.State.Paused:
                 self.state = self.State.Paused
@@ -222,66 +516,282 @@ class SpotifyAdMute(object):
                 print('Not playing music. No action taken.')
                 self.logger.info('SpotifyAdMute: Not playing music. No action taken.')
                 self.app.request(self.app.set_currently_playing_label)
-        elif results['item']:
-            self.logger.info('SpotifyAdMute: Entering music state. Current track: {%s}. Current state: {%s}.' %(self.current_track, self.state))
+        elif results.has_item:
+            self.poll_logger.info('SpotifyAdMute: Entering music state. Current track: {%s}. Current state: {%s}.', self.current_track, self.state)
             # Music state
             self._protected_set_mute(0)
-            if (self.current_track != None and self.current_track['name'] != results['item']['name']) or self.state != self.State.Music:
+            self.track_ends_at = self._sampled_at() + (results.duration_ms - results.progress_ms) / 1000.0 / (1 + self.drift)
+            if not results.same_track(self.current_track) or self.state != self.State.Music:
                 self.state = self.State.Music
-                self.current_track = results['item']
+                self.current_track = results
                 message = 'Currently playing %s' % self.print_current_track()
                 print(message)
                 self.logger.info('SpotifyAdMute: %s' % message)
                 self.app.request(self.app.set_currently_playing_label)
-        elif not results['item']:
-            self.logger.info('SpotifyAdMute: Entering ad state. Current track: {%s}. Current state: {%s}.' %(self.current_track, self.state))
+        else:
+            self.poll_logger.info('SpotifyAdMute: Entering ad state. Current track: {%s}. Current state: {%s}.', self.current_track, self.state)
             # Ad state
             self._protected_set_mute(1)
             if self.state != self.State.Ad:
+                lag = self._time_since_ad_start(results)
+                if lag != None and self.premuted_at != None:
+                    lag = max(lag - (self.clock() - self.premuted_at), 0)  # Muted before the poll saw the ad
+                if lag != None:
+                    Metrics.time_to_mute_seconds.observe(lag)
                 self.state = self.State.Ad
                 self.current_track = None
                 message = 'Playing ad. Muting!'
                 print(message)
                 self.logger.info('SpotifyAdMute: %s' % message)
-                self.app.request(self.app.set_currently_playing_label())
+                self.app.request(self.app.set_currently_playing_label)
+
+        if self.state != self.State.Music:
+            self.track_ends_at = None
+        if self.premuted_at != None:
+            Metrics.premutes_total.inc(labels=(self.state.name.lower(),))
+            self.premuted_at = None
+        if self.state != previous_state:
+            Metrics.state_transitions_total.inc(labels=(previous_state.name if previous_state else 'None', self.state.name))
+        self._learn_cadence(results, previous_state, previous_ends_at)
+        if self.timeline and (self.state != previous_state or self.current_track is not previous_track):
+            self._record_transition(lag or 0)
+        return self._get_sleep_duration(results)
+
+    # Seconds from the start of the ad in results until now. Ad progress tells how long ago it started,
+    # as of when Spotify sampled it mid-request.
+    def _time_since_ad_start(self, results):
+        if results.progress_ms == None:
+            return None
+        return self.clock() - self._sampled_at() + results.progress_ms / 1000.0
+
+    # Clock time Spotify sampled the last poll result, about halfway through the request.
+    def _sampled_at(self):
+        return (self.received_at if self.received_at != None else self.clock()) - self.request_latency / 2
+
+    # Append the current state to the timeline. lag is how long an ad played before it was muted.
+    def _record_transition(self, lag=0):
+        state = {self.State.Paused: Timeline.PAUSED, self.State.Music: Timeline.MUSIC, self.State.Ad: Timeline.AD}.get(self.state, Timeline.STOPPED)
+        muted = {True: Timeline.MUTED, False: Timeline.UNMUTED}.get(self.mute_backend.muted, Timeline.MUTE_UNKNOWN)
+        try:
+            self.timeline.append(self.clock(), state, muted, self.current_track.key if self.current_track else None, lag)
+        except (IOError, OSError) as err:
+            self.logger.error('SpotifyAdMute: While recording timeline, got exception: %s' % str(err))
+
+    # Query Spotify and adjust volume based on current track. Returns seconds until the next poll, or None to stop.
+    def poll_once(self):
+        if not self.transport:
+            raise SpotifyAdMuteException('SpotifyAdMute: Cannot poll because not logged in!')
+
+        self.poll_logger.info('SpotifyAdMute: Begin polling.')
+        start = self.clock()
+        self.changed = False  # This poll reads any change pushed so far
+        self.transport.on_change = self._playback_changed
+
+        if self.process_watch:
+            if not self.process_watch.running():
+                return self._suspend()
+            if self.suspended:
+                self.suspended = False
+                self.logger.info('SpotifyAdMute: A Spotify client started. Resuming polls.')
+
+        results, failure, retry_in = self._try_get_currently_playing()
+
+        # Quit if stop_poll() came during _try_get_currently_playing()
+        if self.quit:
+            self.logger.info('SpotifyAdMute: Exiting poll')
+            self.quit = False
+            return None
+        if failure != None:
+            Metrics.poll_seconds.observe(self.clock() - start)
+            return retry_in  # Keep the current state and try again when the retry policy allows
+
+        duration = self.update_state(results)
+        if self.transport.push:
+            duration = max(duration, self.push_max_sleep)  # Changes wake us up, see _playback_changed()
+        Metrics.poll_seconds.observe(self.clock() - start)
+        return duration
+
+    # Skip the query while no Spotify client runs, since nothing here can play an ad. Returns seconds until the next check.
+    def _suspend(self):
+        if not self.suspended:
+            self.suspended = True
+            self.logger.info('SpotifyAdMute: No Spotify client is running. Suspending polls until one starts.')
+            self.update_state(None)
+        self.idle_sleep = None
+        return self.process_watch.interval
+
+    # Run main loop that adjusts volume based on current track, sleeping on the calling thread between polls.
+    def poll(self):
+        duration = self.poll_once()
+        if duration == None:
+            return
 
         # Sleep until timeout or wakeup from a call to stop_poll()
-        duration = self._get_sleep_duration(results)
-        self.logger.info('SpotifyAdMute: Sleeping for %d seconds.' % duration)
-        self.cv.acquire()
-        self.cv.wait(timeout=duration)
-        self.cv.release()
-        self.logger.info('SpotifyAdMute: Woke up.')
+        premute_delay = self._premute_delay(duration)
+        if premute_delay != None:
+            duration = self._premute(premute_delay)
+        self.poll_logger.info('SpotifyAdMute: Sleeping for %d seconds.', duration)
+        self.sleep(duration)
+        self.poll_logger.info('SpotifyAdMute: Woke up.')
 
         if self.notified:
             self.logger.info('SpotifyAdMute: Poll was manually interrupted.')
             self.notified = False
 
+    # Called by a push source, on its own thread, when playback changed: poll now rather than when the sleep runs out.
+    def _playback_changed(self):
+        self.cv.acquire()
+        self.changed = True
+        self.cv.notify()
+        self.cv.release()
+        with self.poll_lock:
+            if self.polling and self.poll_idle.is_set():
+                self._schedule(0, self._poll_tick)  # A poll under way picks the change up itself
+
+    # Seconds until the pre-mute for the current track is due, or None if it is off or the next poll comes first.
+    def _premute_delay(self, duration):
+        if not self.premute or self.state != self.State.Music or self.track_ends_at == None:
+            return None
+        delay = self.track_ends_at - self.premute_lead - self.clock()
+        if delay < 0 or delay >= duration:
+            return None
+        return delay
+
+    # Sleep until just before the predicted track end, mute, and return how long to sleep before checking what followed.
+    def _premute(self, delay):
+        self.poll_logger.info('SpotifyAdMute: Pre-muting in %.2f seconds.', delay)
+        self.sleep(delay)
+        if self.notified or self.changed:
+            return 0  # Poll now
+        return self._apply_premute()
+
+    # Mute now, and return how long to wait before checking what followed the track.
+    def _apply_premute(self):
+        self._protected_set_mute(1)
+        self.premuted_at = self.clock()
+        return max(self.track_ends_at + self.premute_check_delay - self.premuted_at, 0)
+
+    # Poll on timers (a Timers.TimerQueue) until stop_poll(), without a thread of our own. Each poll runs on one of
+    # the queue's workers and schedules the next.
+    def start_polling(self, timers):
+        with self.poll_lock:
+            self.cancellation = Cancellation.Cancellation()
+            self.notified = False
+            self.polling = True
+            self.timers = timers
+            self._schedule(0, self._poll_tick)
+
+    # Replace the pending poll or pre-mute with tick(sequence) in delay seconds. Must hold poll_lock.
+    # A tick that was already handed to a worker when it was replaced sees a stale sequence and does nothing.
+    def _schedule(self, delay, tick):
+        if self.poll_timer:
+            self.poll_timer.cancel()
+        self.poll_sequence += 1
+        self.poll_timer = self.timers.call_later(delay, tick, self.poll_sequence)
+
+    def _poll_tick(self, sequence):
+        with self.poll_lock:
+            if not self.polling or sequence != self.poll_sequence:
+                return
+            self.poll_idle.clear()
+        try:
+            duration = self.poll_once()
+            with self.poll_lock:
+                if duration == None or not self.polling:
+                    self.polling = False
+                    return
+                if self.changed:
+                    duration = 0  # Playback changed while we polled
+                premute_delay = self._premute_delay(duration)
+                if premute_delay != None:
+                    self._schedule(premute_delay, self._premute_tick)
+                else:
+                    self.poll_logger.info('SpotifyAdMute: Sleeping for %d seconds.', duration)
+                    self._schedule(duration, self._poll_tick)
+        except SpotifyAdMuteException as err:
+            self.logger.error('SpotifyAdMute: While polling, got exception: %s' % str(err))
+            self.polling = False
+        except:
+            self.logger.error('SpotifyAdMute: While polling, got unexpected exception!')
+            self.polling = False
+        finally:
+            self.poll_idle.set()
+
+    def _premute_tick(self, sequence):
+        with self.poll_lock:
+            if self.polling and sequence == self.poll_sequence:
+                self._schedule(self._apply_premute(), self._poll_tick)
+
+    # Sleep until timeout, a call to stop_poll() or a pushed playback change, whichever comes first.
+    def _sleep(self, timeout):
+        self.cv.acquire()
+        if not self.notified and not self.changed:  # Either may have come before we got here
+            self.cv.wait(timeout=timeout)
+        self.cv.release()
+
     def stop_poll(self):
         self.logger.info('SpotifyAdMute: Manually stopping poll.')
+        with self.poll_lock:
+            self.polling = False
+            if self.poll_timer:
+                self.poll_timer.cancel()
+                self.poll_timer = None
+        self.cancellation.cancel()  # Unblock a request or prompt in progress
         self.cv.acquire()
         self.notified = True
         self.cv.notify()
         self.cv.release()
 
     def clear_cache(self):
+        backend = self.mute_backend
+        self.logger.info('SpotifyAdMute: Mute backend applied %d calls in %.3f seconds and skipped %d redundant calls.' % (backend.calls, backend.seconds, backend.skipped))
+        backend.invalidate()
+        was_monitoring = self.state != None
         self.state = None
         self.current_track = None
+        self.last_progress = None
+        self.track_ends_at = None
+        self.premuted_at = None
+        self.idle_sleep = None
+        self.suspended = False
+        if self.timeline and was_monitoring:
+            self._record_transition()  # Stopped
 
     # Log in with username
     def login(self, username):
         self.username = username
         self._init_spotify()
-        self.logger.info('SpotifyAdMute: Logged in as %s', self.spotify.current_user())
+        self.logger.info('SpotifyAdMute: Logged in as %s', self.profile)
 
-        if self.spotify.current_user()['display_name'] == None:
-            self.first_name = self.spotify.current_user()['id']
+        if self.profile['display_name'] == None:
+            self.first_name = self.profile['id']
         else:
-            self.first_name = self.spotify.current_user()['display_name'].split()[0]
+            self.first_name = self.profile['display_name'].split()[0]
+
+        try:
+            self.timeline = Timeline.TimelineWriter(os.path.join(self.app.cache_folder, 'timeline'), username)
+        except (IOError, OSError) as err:
+            self.logger.error('SpotifyAdMute: Could not open timeline, so history will not be recorded: %s' % str(err))
+
+        try:
+            self.cadence = Cadence.load(Cadence.cache_path(self.app.cache_folder, username))
+        except ValueError as err:
+            self.logger.warn('SpotifyAdMute: Starting a new ad cadence model: %s' % str(err))
+            self.cadence = Cadence.CadenceModel(Cadence.cache_path(self.app.cache_folder, username))
 
     # Log out
     def logout(self):
         self.logger.info('SpotifyAdMute: Successfully logged out from %s' % self.username)
+        self._save_cadence()
+        self.cadence = Cadence.CadenceModel()
         self.username = None
         self.first_name = None
-        self.spotify = None
\ No newline at end of file
+        self.profile = None
+        self.spotify = None
+        self.token_manager = None
+        if self.timeline:
+            self.timeline.close()
+            self.timeline = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
\ No newline at end of file
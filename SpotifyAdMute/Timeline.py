@@ -0,0 +1,252 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Append-only binary playback timeline per account, with queries over it
+'''
+
+from __future__ import print_function
+
+import argparse
+import array
+import bisect
+import datetime
+import itertools
+import math
+import mmap
+import operator
+import os
+import struct
+import sys
+import time
+
+# Record states. Stopped marks the end of monitoring, so the last state does not run on while nobody was watching.
+STOPPED = 0
+PAUSED = 1
+MUSIC = 2
+AD = 3
+STATE_NAMES = {STOPPED: 'Stopped', PAUSED: 'Paused', MUSIC: 'Music', AD: 'Ad'}
+
+# Mute values
+UNMUTED = 0
+MUTED = 1
+MUTE_UNKNOWN = 2
+
+NO_TRACK = 0xffffffff
+
+# File header: magic, version, record size.
+HEADER = struct.Struct('<4sHH')
+MAGIC = b'SAMT'
+VERSION = 1
+
+# One record per transition: time (seconds since the epoch), state, mute, reserved, interned track,
+# and for ads, how long the ad had played before it was muted (ms).
+RECORD = struct.Struct('<dBBHII')
+
+def _paths(folder, username):
+    return os.path.join(folder, '%s.timeline' % username), os.path.join(folder, '%s.tracks' % username)
+
+# One field of count records in data as an array, gathered with strided slices rather than per-record unpacking.
+def _column(data, count, offset, typecode):
+    column = array.array(typecode)
+    packed = bytearray(count * column.itemsize)
+    for byte in range(column.itemsize):
+        packed[byte::column.itemsize] = data[offset + byte::RECORD.size][:count]
+    column = array.array(typecode, bytes(packed))
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+# Tables for bytearray.translate() that turn states or mute values into 0/1 selectors
+def _mask(*values):
+    return bytes(bytearray(1 if value in values else 0 for value in range(256)))
+
+AD_MASK = _mask(AD)
+MUSIC_MASK = _mask(MUSIC)
+LISTENING_MASK = _mask(MUSIC, AD)
+MUTED_MASK = _mask(MUTED)
+
+# Total length of the spans picked by selectors. fsum keeps the difference of large timestamp sums exact enough.
+def _span_seconds(starts, ends, selectors):
+    return math.fsum(itertools.compress(ends, selectors)) - math.fsum(itertools.compress(starts, selectors))
+
+# Appends transitions for one account. Track ids are interned into a side file, one per line,
+# so each record stores a 4-byte index instead of the id.
+class TimelineWriter(object):
+    def __init__(self, folder, username):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.path, self.tracks_path = _paths(folder, username)
+
+        self.tracks = {}
+        if os.path.exists(self.tracks_path):
+            with open(self.tracks_path, 'rb') as tracks:
+                for index, line in enumerate(tracks):
+                    self.tracks[line.rstrip(b'\n').decode('utf-8')] = index
+        self.tracks_file = open(self.tracks_path, 'ab')
+
+        self.file = open(self.path, 'ab')
+        size = self.file.tell()
+        if size == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+        elif (size - HEADER.size) % RECORD.size:
+            self.file.truncate(size - (size - HEADER.size) % RECORD.size)  # Drop a record cut short by a crash
+            self.file.seek(0, os.SEEK_END)
+
+    def _intern(self, track_key):
+        if track_key == None:
+            return NO_TRACK
+        index = self.tracks.get(track_key)
+        if index == None:
+            index = self.tracks[track_key] = len(self.tracks)
+            self.tracks_file.write(track_key.replace('\n', ' ').encode('utf-8') + b'\n')
+            self.tracks_file.flush()
+        return index
+
+    # Record that at time t the account entered state with the given mute value and track key.
+    def append(self, t, state, muted, track_key=None, lag=0):
+        self.file.write(RECORD.pack(t, state, muted, 0, self._intern(track_key), int(max(lag, 0) * 1000)))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.tracks_file.close()
+
+# Read-only view of an account's timeline, memory-mapped so only the queried range is paged in.
+class Timeline(object):
+    def __init__(self, folder, username):
+        self.path, self.tracks_path = _paths(folder, username)
+        self.file = open(self.path, 'rb')
+        magic, version, record_size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError('%s is not a version %d timeline' % (self.path, VERSION))
+
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = (size - HEADER.size) // RECORD.size
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ) if self.count else None
+        self.track_keys = None  # Loaded by track()
+
+    def __len__(self):
+        return self.count
+
+    # (t, state, muted, track, lag_ms) of record index.
+    def record(self, index):
+        t, state, muted, _, track, lag_ms = RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+        return t, state, muted, track, lag_ms
+
+    # Track key interned as index.
+    def track(self, index):
+        if index == NO_TRACK:
+            return None
+        if self.track_keys == None:
+            with open(self.tracks_path, 'rb') as tracks:
+                self.track_keys = [line.rstrip(b'\n').decode('utf-8') for line in tracks]
+        return self.track_keys[index]
+
+    # Index of the first record at or after t.
+    def find(self, t):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD.unpack_from(self.map, HEADER.size + middle * RECORD.size)[0] < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Columns over the records between start and end (seconds since the epoch), including the record in effect at start:
+    # span starts (clipped to start), span ends (the next record, or end or now for the last), states, mute values and lags.
+    def _columns(self, start=None, end=None):
+        first = max(self.find(start) - 1, 0) if start != None and self.count else 0
+        last = self.find(end) if end != None and self.count else self.count
+        end = end if end != None else time.time()
+        count = last - first
+        if count <= 0:
+            return array.array('d'), array.array('d'), bytearray(), bytearray(), array.array('I')
+
+        data = self.map[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+        starts = _column(data, count, 0, 'd')
+        states = bytearray(data[8::RECORD.size])
+        muted = bytearray(data[9::RECORD.size])
+        lags = _column(data, count, 16, 'I')
+        if start != None and starts[0] < start:
+            starts[0] = start
+            lags[0] = 0  # That ad was muted before the range
+        ends = starts[1:]
+        ends.append(end)
+        return starts, ends, states, muted, lags
+
+    # Seconds of ads per local calendar day, as {date: seconds}.
+    def ad_seconds_per_day(self, start=None, end=None):
+        starts, ends, states, _, _ = self._columns(start, end)
+        if not starts:
+            return {}
+        is_ad = states.translate(AD_MASK)
+
+        days = {}
+        day = datetime.date.fromtimestamp(starts[0])
+        day_start = time.mktime(day.timetuple())
+        while day_start < ends[-1]:
+            next_day = day + datetime.timedelta(days=1)
+            day_end = time.mktime(next_day.timetuple())
+            first = bisect.bisect_left(starts, day_start)
+            last = bisect.bisect_left(starts, day_end)
+            seconds = _span_seconds(starts[first:last], ends[first:last], is_ad[first:last])
+            if last > first and is_ad[last - 1] and ends[last - 1] > day_end:
+                seconds -= ends[last - 1] - day_end  # Runs into the next day
+            if first > 0 and is_ad[first - 1] and ends[first - 1] > day_start:
+                seconds += min(ends[first - 1], day_end) - day_start  # Started the day before
+            if seconds > 0:
+                days[day] = seconds
+            day, day_start = next_day, day_end
+        return days
+
+    # Ad breaks and how often they come: {'breaks', 'listening_hours', 'breaks_per_hour'}.
+    # Listening time is time spent in music or ads. Back-to-back ads count as one break.
+    def ad_frequency(self, start=None, end=None):
+        starts, ends, states, _, _ = self._columns(start, end)
+        breaks = (b'\x00' + states.translate(AD_MASK)).count(b'\x00\x01')
+        hours = _span_seconds(starts, ends, states.translate(LISTENING_MASK)) / 3600
+        return {'breaks': breaks, 'listening_hours': hours, 'breaks_per_hour': breaks / hours if hours else 0.0}
+
+    # How well muting matched playback: seconds of ads muted and heard, and music muted by mistake.
+    # Ads count as heard until they were muted (the lag recorded when entering each ad).
+    def mute_accuracy(self, start=None, end=None):
+        starts, ends, states, muted, lags = self._columns(start, end)
+        is_ad = states.translate(AD_MASK)
+        is_muted = muted.translate(MUTED_MASK)
+
+        lag = sum(itertools.compress(lags, is_ad)) / 1000.0
+        ad = _span_seconds(starts, ends, is_ad) + lag
+        heard = _span_seconds(starts, ends, list(map(operator.gt, is_ad, is_muted))) + lag
+        music_muted = _span_seconds(starts, ends, list(map(operator.and_, states.translate(MUSIC_MASK), is_muted)))
+        return {
+            'ad_seconds': ad,
+            'ad_heard_seconds': heard,
+            'music_muted_seconds': music_muted,
+            'accuracy': 1 - heard / ad if ad else 1.0,
+        }
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+# Summarize an account's timeline.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query a Spotify Ad Mute playback timeline.')
+    parser.add_argument('username')
+    parser.add_argument('--folder', default=os.path.join('.data', 'timeline'))
+    parser.add_argument('--days', type=float, default=30, help='how far back to look')
+    args = parser.parse_args()
+
+    timeline = Timeline(args.folder, args.username)
+    start = time.time() - args.days * 24 * 60 * 60
+    for day, seconds in sorted(timeline.ad_seconds_per_day(start).items()):
+        print('%s  %5.1f ad minutes' % (day, seconds / 60))
+    frequency = timeline.ad_frequency(start)
+    print('%d ad breaks in %.1f listening hours (%.2f per hour)' % (frequency['breaks'], frequency['listening_hours'], frequency['breaks_per_hour']))
+    accuracy = timeline.mute_accuracy(start)
+    print('Muted %.1f%% of ad time. %.0f s of ads heard, %.0f s of music muted.' % (
+        accuracy['accuracy'] * 100, accuracy['ad_heard_seconds'], accuracy['music_muted_seconds']))
+    timeline.close()
@@ -0,0 +1,136 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   One scheduler thread and a fixed pool of workers for all of the app's timed work
+'''
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import Queue
+
+# A call scheduled on a TimerQueue. Cancelling it keeps it from running (again); a run already underway finishes.
+class Timer(object):
+    def __init__(self, timers, due, interval, function, args):
+        self.timers = timers
+        self.due = due
+        self.interval = interval  # Seconds between runs, or None to run once
+        self.function = function
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+# Runs calls at their due times. The scheduler thread only waits and hands due calls to the workers, so a slow call
+# delays nothing but itself, and the number of threads stays the same however many timers are scheduled.
+class TimerQueue(object):
+    workers = 2
+
+    def __init__(self, logger=None, workers=None):
+        self.logger = logger or logging.getLogger('SpotifyAdMute')
+        if workers:
+            self.workers = workers
+        self.clock = time.time
+        self.cv = threading.Condition()
+        self.heap = []  # (due, sequence, timer)
+        self.sequence = itertools.count()
+        self.ready = Queue.Queue()  # Due timers waiting for a worker, or None to stop a worker
+        self.threads = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._work, name='TimerWorker%d' % i) for i in range(self.workers)]
+        self.threads.append(threading.Thread(target=self._run, name='TimerQueue'))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+        return self
+
+    # Run function(*args) once after delay seconds.
+    def call_later(self, delay, function, *args):
+        return self._add(Timer(self, self.clock() + delay, None, function, args))
+
+    # Run function(*args) every interval seconds, starting after delay (default: interval) seconds.
+    # Runs that fall behind are skipped rather than bunched up.
+    def call_every(self, interval, function, *args, **kwargs):
+        delay = kwargs.get('delay', interval)
+        return self._add(Timer(self, self.clock() + delay, interval, function, args))
+
+    def _add(self, timer):
+        with self.cv:
+            heapq.heappush(self.heap, (timer.due, next(self.sequence), timer))
+            if self.heap[0][2] is timer:
+                self.cv.notify()  # New earliest timer
+        return timer
+
+    # Stop the threads, dropping timers that have not run. Waits up to timeout seconds for calls underway to finish.
+    # Returns True if every thread exited in time.
+    def stop(self, timeout=None):
+        with self.cv:
+            self.running = False
+            self.heap = []
+            self.cv.notify()
+        for _ in range(self.workers):
+            self.ready.put(None)
+
+        deadline = None if timeout == None else time.time() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline == None else max(deadline - time.time(), 0))
+        stopped = not any(thread.is_alive() for thread in self.threads)
+        self.threads = []
+        return stopped
+
+    # Scheduler loop: sleep until the earliest timer is due, then hand it to a worker.
+    def _run(self):
+        with self.cv:
+            while self.running:
+                now = self.clock()
+                while self.heap and self.heap[0][0] <= now:
+                    _, _, timer = heapq.heappop(self.heap)
+                    if not timer.cancelled:
+                        self.ready.put(timer)
+                self.cv.wait(self.heap[0][0] - now if self.heap else None)
+
+    def _work(self):
+        while True:
+            timer = self.ready.get()
+            if timer is None:
+                return
+            if timer.cancelled:
+                continue
+            try:
+                timer.function(*timer.args)
+            except Exception as err:
+                self.logger.error('TimerQueue: While running %s, got exception: %s' % (getattr(timer.function, '__name__', timer.function), str(err)))
+
+            if timer.interval != None and not timer.cancelled:
+                timer.due = max(timer.due + timer.interval, self.clock())
+                self._add(timer)
+
+_default = None
+_default_lock = threading.Lock()
+
+# The TimerQueue shared by the whole process, started on first use.
+def default():
+    global _default
+    with _default_lock:
+        if _default == None:
+            _default = TimerQueue().start()
+        return _default
+
+# Forget the shared TimerQueue in a process made with fork, where its threads do not exist. The next default() starts one.
+def after_fork():
+    global _default, _default_lock
+    _default = None
+    _default_lock = threading.Lock()  # Another thread may have held it at the fork
+
+# Stop the shared TimerQueue, if it was started. The next default() starts a new one.
+def shutdown(timeout=None):
+    global _default
+    with _default_lock:
+        timers, _default = _default, None
+    return timers.stop(timeout) if timers else True
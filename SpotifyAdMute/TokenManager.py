@@ -0,0 +1,63 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Keeps an OAuth token in memory and refreshes it before it expires
+'''
+
+import threading
+import time
+
+import spotipy.oauth2 as oauth2
+
+import Timers
+
+# Hands out the current access token, checking expiry locally.
+# Tokens close to expiring are refreshed on the shared timer workers, so polls never wait on a refresh
+# unless the token has already expired. Only refreshes write to disk (through SpotifyOAuth's cache).
+class TokenManager(object):
+    refresh_margin = 300  # Seconds before expiry to start refreshing
+
+    def __init__(self, logger, sp_oauth, token_info):
+        self.logger = logger
+        self.sp_oauth = sp_oauth
+        self.token_info = token_info
+        self.clock = time.time
+        self.refresh_lock = threading.Lock()
+        self.refreshing = False
+
+    # Get a valid access token. Only blocks if the token has already expired.
+    def get_token(self):
+        token_info = self.token_info
+        remaining = token_info['expires_at'] - self.clock()
+        if remaining <= 0:
+            self.logger.info('TokenManager: Token expired. Refreshing now.')
+            return self.refresh(token_info)['access_token']
+        if remaining < self.refresh_margin and not self.refreshing:
+            self._refresh_in_background(token_info)
+        return token_info['access_token']
+
+    # Replace stale_info with a fresh token. Pass None to force a refresh, e.g. after a 401.
+    # Callers that waited on another refresh get its result instead of refreshing again.
+    def refresh(self, stale_info=None):
+        with self.refresh_lock:
+            if stale_info != None and self.token_info is not stale_info:
+                return self.token_info
+
+            token_info = self.sp_oauth.refresh_access_token(self.token_info['refresh_token'])
+            self.token_info = token_info
+            self.logger.info('TokenManager: Refreshed token. Expires in %d seconds.' % (token_info['expires_at'] - self.clock()))
+            return token_info
+
+    def _refresh_in_background(self, stale_info):
+        self.refreshing = True
+        Timers.default().call_later(0, self._background_refresh, stale_info)
+
+    def _background_refresh(self, stale_info):
+        try:
+            self.refresh(stale_info)
+        except oauth2.SpotifyOauthError as err:
+            self.logger.error('TokenManager: While refreshing token in background, got exception: %s' % str(err))
+        except:
+            self.logger.error('TokenManager: While refreshing token in background, got unexpected exception!')
+        finally:
+            self.refreshing = False
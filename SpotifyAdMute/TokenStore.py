@@ -0,0 +1,219 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tokens and profiles for many accounts in one SQLite file shared by processes
+'''
+
+import glob
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import spotipy.oauth2 as oauth2
+
+from TokenManager import TokenManager
+
+class TokenStoreException(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+# Outcomes of TokenStore.begin_refresh
+REFRESH = 'refresh'  # The caller holds the lease and should refresh
+FRESH = 'fresh'  # Another process already refreshed; use the token returned
+LEASED = 'leased'  # Another process is refreshing right now; wait and ask again
+
+# Tokens and profiles of every account, in a SQLite database any number of processes can open at once.
+# Each token has a version that goes up whenever it is replaced. To refresh, a process takes a lease on the account in
+# a write transaction, refreshes without holding the database, and then stores the new token. Others that find their
+# token stale in the meantime wait for that token instead of refreshing too, which matters because Spotify may rotate
+# refresh tokens, and the loser of a race would be left holding one that no longer works.
+class TokenStore(object):
+    busy_timeout = 30  # Seconds to wait for another process's write transaction
+    lease_seconds = 30  # How long a refresh may hold an account before another process may take over
+
+    def __init__(self, path):
+        self.path = path
+        self.owner = '%s:%d' % (socket.gethostname(), os.getpid())
+        self.local = threading.local()  # SQLite connections cannot be shared between threads
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS tokens (username TEXT PRIMARY KEY, token_info TEXT NOT NULL, '
+                       'version INTEGER NOT NULL, lease_owner TEXT, lease_until REAL)')
+            db.execute('CREATE TABLE IF NOT EXISTS profiles (username TEXT PRIMARY KEY, profile TEXT NOT NULL, fetched_at REAL NOT NULL)')
+
+    def _connection(self):
+        db = getattr(self.local, 'db', None)
+        if db == None:
+            try:
+                db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+                db.execute('PRAGMA journal_mode=WAL')  # Readers do not wait on a writer
+            except sqlite3.Error as err:
+                raise TokenStoreException('Could not open token store %s: %s' % (self.path, str(err)))
+            self.local.db = db
+        return db
+
+    # Connection inside a write transaction that commits on leaving the block, or rolls back on an exception.
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    # (token_info, version) for username, or (None, 0) if the store has no token for it.
+    def get_token(self, username):
+        row = self._connection().execute('SELECT token_info, version FROM tokens WHERE username = ?', (username,)).fetchone()
+        if row == None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    # Store a token obtained outside the store, e.g. by logging in. Returns its version.
+    def put_token(self, username, token_info):
+        with self._transaction() as db:
+            row = db.execute('SELECT version FROM tokens WHERE username = ?', (username,)).fetchone()
+            version = row[0] + 1 if row else 1
+            db.execute('INSERT OR REPLACE INTO tokens (username, token_info, version) VALUES (?, ?, ?)', (username, json.dumps(token_info), version))
+        return version
+
+    def remove(self, username):
+        with self._transaction() as db:
+            db.execute('DELETE FROM tokens WHERE username = ?', (username,))
+            db.execute('DELETE FROM profiles WHERE username = ?', (username,))
+
+    # Usernames with a token, sorted.
+    def usernames(self):
+        return [row[0] for row in self._connection().execute('SELECT username FROM tokens ORDER BY username')]
+
+    # Start refreshing username's token, which the caller has at version. Returns (outcome, token_info, version):
+    # REFRESH with the stored token if the caller now holds the lease, FRESH with a newer token if there is one, or
+    # LEASED if another process is refreshing.
+    def begin_refresh(self, username, version, now=None):
+        now = time.time() if now == None else now
+        with self._transaction() as db:
+            row = db.execute('SELECT token_info, version, lease_owner, lease_until FROM tokens WHERE username = ?', (username,)).fetchone()
+            if row == None:
+                raise TokenStoreException('No token stored for %s' % username)
+            token_info, stored_version, lease_owner, lease_until = row
+            if stored_version != version:
+                return FRESH, json.loads(token_info), stored_version
+            if lease_owner not in (None, self.owner) and lease_until > now:
+                return LEASED, None, None
+            db.execute('UPDATE tokens SET lease_owner = ?, lease_until = ? WHERE username = ?', (self.owner, now + self.lease_seconds, username))
+            return REFRESH, json.loads(token_info), stored_version
+
+    # Store the token a refresh begun with begin_refresh got, and give up the lease. Returns the new version, or None
+    # if the lease was lost to another process in the meantime (whose token then wins).
+    def finish_refresh(self, username, token_info):
+        with self._transaction() as db:
+            row = db.execute('SELECT version, lease_owner FROM tokens WHERE username = ?', (username,)).fetchone()
+            if row == None or row[1] != self.owner:
+                return None
+            db.execute('UPDATE tokens SET token_info = ?, version = ?, lease_owner = NULL, lease_until = NULL WHERE username = ?',
+                       (json.dumps(token_info), row[0] + 1, username))
+            return row[0] + 1
+
+    # Give up the lease after a refresh failed, so another process can try right away.
+    def abandon_refresh(self, username):
+        with self._transaction() as db:
+            db.execute('UPDATE tokens SET lease_owner = NULL, lease_until = NULL WHERE username = ? AND lease_owner = ?', (username, self.owner))
+
+    # Profile of username if it is younger than ttl seconds, otherwise None.
+    def get_profile(self, username, ttl):
+        row = self._connection().execute('SELECT profile, fetched_at FROM profiles WHERE username = ?', (username,)).fetchone()
+        if row == None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def put_profile(self, username, profile):
+        with self._transaction() as db:
+            db.execute('INSERT OR REPLACE INTO profiles (username, profile, fetched_at) VALUES (?, ?, ?)', (username, json.dumps(profile), time.time()))
+
+    # Copy the token and profile files SpotifyAdMute keeps in cache_folder (.cache-<username>, .profile-<username>)
+    # into the store. Returns the usernames imported.
+    def import_cache_folder(self, cache_folder):
+        usernames = []
+        for path in sorted(glob.glob(os.path.join(cache_folder, '.cache-*'))):
+            username = os.path.basename(path)[len('.cache-'):]
+            try:
+                with open(path, 'r') as cache:
+                    self.put_token(username, json.load(cache))
+            except (IOError, OSError, ValueError):
+                continue  # Unreadable, e.g. written by an older spotipy
+            usernames.append(username)
+            try:
+                with open(os.path.join(cache_folder, '.profile-%s' % username), 'r') as cache:
+                    cached = json.load(cache)
+            except (IOError, OSError, ValueError):
+                continue
+            with self._transaction() as db:
+                db.execute('INSERT OR REPLACE INTO profiles (username, profile, fetched_at) VALUES (?, ?, ?)',
+                           (username, json.dumps(cached['profile']), cached['fetched_at']))
+        return usernames
+
+# BEGIN IMMEDIATE takes the write lock up front, so two processes cannot both read a row and then both update it.
+class _Transaction(object):
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as err:
+            raise TokenStoreException('Could not lock token store: %s' % str(err))
+        return self.db
+
+    def __exit__(self, kind, value, traceback):
+        self.db.execute('ROLLBACK' if kind else 'COMMIT')
+        return False
+
+# SpotifyOAuth for refreshing tokens kept in a TokenStore. spotipy would otherwise also write every refreshed token to
+# its own cache file, which processes sharing a working directory would overwrite for each other.
+def oauth(client_id, client_secret, redirect_uri, scope, token_url=None):
+    sp_oauth = oauth2.SpotifyOAuth(client_id, client_secret, redirect_uri, scope=scope, cache_path=os.devnull)
+    if token_url:
+        sp_oauth.OAUTH_TOKEN_URL = token_url
+    return sp_oauth
+
+# TokenManager for an account in a TokenStore. Refreshes go through the store's lease, so however many processes hold
+# the account, one refreshes and the rest pick up its token.
+class StoredTokenManager(TokenManager):
+    lease_poll = 0.1  # Seconds between checks while another process refreshes
+
+    def __init__(self, logger, sp_oauth, store, username):
+        token_info, self.version = store.get_token(username)
+        if token_info == None:
+            raise TokenStoreException('No token stored for %s' % username)
+        TokenManager.__init__(self, logger, sp_oauth, token_info)
+        self.store = store
+        self.username = username
+
+    def refresh(self, stale_info=None):
+        with self.refresh_lock:
+            if stale_info != None and self.token_info is not stale_info:
+                return self.token_info
+
+            deadline = self.clock() + self.store.lease_seconds
+            while True:
+                outcome, token_info, version = self.store.begin_refresh(self.username, self.version)
+                if outcome == FRESH:
+                    self.logger.info('TokenManager: Took the token another process refreshed for %s.' % self.username)
+                    self.token_info, self.version = token_info, version
+                    return token_info
+                if outcome == REFRESH:
+                    break
+                if self.clock() > deadline:
+                    raise oauth2.SpotifyOauthError('Timed out waiting for another process to refresh the token for %s' % self.username)
+                time.sleep(self.lease_poll)
+
+            try:
+                token_info = self.sp_oauth.refresh_access_token(token_info['refresh_token'])
+            except:
+                self.store.abandon_refresh(self.username)
+                raise
+            version = self.store.finish_refresh(self.username, token_info)
+            if version == None:
+                token_info, version = self.store.get_token(self.username)  # Lost the lease; the other refresh wins
+            self.token_info, self.version = token_info, version
+            self.logger.info('TokenManager: Refreshed token for %s. Expires in %d seconds.' % (self.username, token_info['expires_at'] - self.clock()))
+            return token_info
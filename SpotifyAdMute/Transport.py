@@ -0,0 +1,128 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Keep-alive HTTP transport for the currently-playing poll
+'''
+
+import hashlib
+import socket
+
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy.client import SpotifyException
+
+import Playback
+from PlaybackSource import PlaybackSource
+
+API_PREFIX = 'https://api.spotify.com/v1/'
+
+# Remembers the connection the latest request went out on, so abort() can shut its socket down from another thread.
+class AbortableAdapter(HTTPAdapter):
+    connection = None
+    aborted = False  # Set by abort() until the request it aborted is over
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        pool_classes = {}
+        for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items():
+            connection_class = type('Abortable' + pool_class.ConnectionCls.__name__, (pool_class.ConnectionCls,), {'adapter': self, 'connect': _connect})
+            pool_classes[scheme] = type('Abortable' + pool_class.__name__, (pool_class,), {'adapter': self, 'ConnectionCls': connection_class, '_get_conn': _get_conn})
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    # Unblock a request stuck on the network. It fails with a connection error.
+    def abort(self):
+        self.aborted = True
+        sock = getattr(self.connection, 'sock', None)
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                pass  # Already closed
+
+# Connection pool method that records the connection handed out on the pool's adapter.
+def _get_conn(self, timeout=None):
+    connection = super(type(self), self)._get_conn(timeout)
+    self.adapter.connection = connection
+    return connection
+
+# Connection method that honors an abort() that came while connecting, when there was no socket to shut down yet.
+def _connect(self):
+    super(type(self), self).connect()
+    if self.adapter.aborted:
+        self.adapter.abort()
+
+# Polls me/player/currently-playing over one pooled keep-alive session, returning Playback.PlaybackSnapshots.
+# Payloads identical to the previous one (or answered with 304 Not Modified) reuse the last snapshot.
+class Transport(PlaybackSource):
+    name = 'web'
+    poll_path = 'me/player/currently-playing'
+    connect_timeout = 3.05  # Seconds
+    read_timeout = 5  # Seconds
+
+    def __init__(self, logger, token=None, api_prefix=API_PREFIX):
+        self.logger = logger
+        self.token = token
+        self.url = api_prefix + self.poll_path
+
+        self.session = requests.Session()
+        self.adapter = AbortableAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount(api_prefix, self.adapter)
+
+        # Last response, reused when the payload does not change. Only a digest of the payload is kept.
+        self.etag = None
+        self.digest = None
+        self.results = None
+
+        # Counters
+        self.requests = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+    def set_token(self, token):
+        self.token = token
+
+    # Fetch currently playing information as a PlaybackSnapshot. Returns None when nothing is playing.
+    def get_currently_playing(self):
+        headers = {'Authorization': 'Bearer %s' % self.token}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+
+        try:
+            if self.adapter.aborted:
+                raise requests.ConnectionError('Request aborted')
+            response = self.session.get(self.url, headers=headers, timeout=(self.connect_timeout, self.read_timeout))
+        finally:
+            self.adapter.aborted = False
+        self.requests += 1
+
+        if response.status_code == 304:
+            self.not_modified += 1
+            return self.results
+        if response.status_code >= 400:
+            try:
+                msg = response.json()['error']['message']
+            except (ValueError, KeyError, TypeError):
+                msg = 'error'
+            raise SpotifyException(response.status_code, -1, '%s:\n %s' % (response.url, msg), headers=response.headers)
+
+        self.etag = response.headers.get('ETag')
+        content = response.content
+        digest = hashlib.sha1(content).digest()
+        if digest == self.digest:
+            self.unchanged += 1
+            return self.results
+
+        self.digest = digest
+        self.results = Playback.parse(response.json()) if content else None  # 204 when nothing is playing
+        return self.results
+
+    # Make a request in progress on another thread fail now instead of at its timeout. An abort() just before a request
+    # starts fails it as well, so callers about to send call clear_abort() first, then arrange for abort() to be called.
+    def abort(self):
+        self.adapter.abort()
+
+    def clear_abort(self):
+        self.adapter.aborted = False
+
+    def close(self):
+        self.session.close()
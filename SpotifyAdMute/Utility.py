@@ -5,13 +5,17 @@ Description:   Utility for Spotify Ad Mute
 '''
 
 import os
+import json
+import time
 import spotipy.oauth2 as oauth2
 
 import logging
-from threading import Timer
 import webbrowser
 
-def get_user_token(logger, app, username, scope, client_id, client_secret, redirect_uri, cache_path):
+import Timers
+
+# Get the OAuth helper and token info for a user, prompting for authorization if nothing is cached.
+def get_user_token_info(logger, app, username, scope, client_id, client_secret, redirect_uri, cache_path):
     sp_oauth = oauth2.SpotifyOAuth(client_id, client_secret, redirect_uri, scope=scope, cache_path=cache_path)
     logger.info('Utility: Successfully initialized SpotifyOAuth')
 
@@ -26,8 +30,7 @@ def get_user_token(logger, app, username, scope, client_id, client_secret, redir
         except:
             message = "Please navigate here: %s" % auth_url
 
-        t = Timer(3, webbrowser.open, ['%s' % auth_url])
-        t.start()
+        t = Timers.default().call_later(3, webbrowser.open, '%s' % auth_url)
         response = app.prompt_user(
             'Authentication Required',
             '''User authentication requires interaction with your web browser.
@@ -41,12 +44,39 @@ def get_user_token(logger, app, username, scope, client_id, client_secret, redir
             token_info = sp_oauth.get_access_token(code)
         except:
             logger.warn('Utility: Got an exception while getting token. Returning None.')
-            return None
-
-    # Auth'ed API request
-    if token_info:
-        logger.info('Utility: Successfully got token. Returning access token.')
-        return token_info['access_token']
-    else:
-        logger.warn('Utility: Could not get token. Returning None.')
-        return None
\ No newline at end of file
+            return sp_oauth, None
+
+    return sp_oauth, token_info
+
+# Load a cached user profile if it is younger than ttl seconds.
+def get_cached_profile(logger, cache_folder, username, ttl):
+    path = '%s/.profile-%s' % (cache_folder, username)
+    try:
+        with open(path, 'r') as cache:
+            cached = json.load(cache)
+    except (IOError, OSError, ValueError):
+        logger.info('Utility: Did not find cached profile for %s.' % username)
+        return None
+
+    if time.time() - cached['fetched_at'] > ttl:
+        logger.info('Utility: Cached profile for %s is stale.' % username)
+        return None
+
+    logger.info('Utility: Found cached profile for %s.' % username)
+    return cached['profile']
+
+# Save a user profile so future logins can skip querying it.
+def cache_profile(logger, cache_folder, username, profile):
+    path = '%s/.profile-%s' % (cache_folder, username)
+    try:
+        with open(path, 'w') as cache:
+            json.dump({'fetched_at': time.time(), 'profile': profile}, cache)
+        logger.info('Utility: Cached profile for %s.' % username)
+    except (IOError, OSError) as err:
+        logger.warn('Utility: Could not cache profile for %s: %s' % (username, str(err)))
+
+# Forget a cached user profile.
+def remove_cached_profile(cache_folder, username):
+    path = '%s/.profile-%s' % (cache_folder, username)
+    if os.path.isfile(path):
+        os.remove(path)
@@ -0,0 +1,21 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Shared pytest setup for the Spotify Ad Mute tests
+'''
+
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # The modules under test
+
+# Logger that drops everything, so expected errors do not clutter the test output.
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('SpotifyAdMute.Tests')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
@@ -0,0 +1,131 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for cancelling polls stuck in requests to the fake Spotify API
+'''
+
+import threading
+import time
+
+import pytest
+import requests
+
+import Timers
+from Cancellation import Cancellation
+from Engine import Engine, HeadlessApp
+from FakeSpotify import FakeSpotify
+from MuteBackend import FakeMuteBackend
+from RateLimit import RequestBudget
+from SpotifyAdMute import SpotifyAdMute
+from Transport import Transport
+
+stall_seconds = 5  # Longer than any wait below, so only cancelling can end a request
+
+@pytest.fixture
+def fake():
+    fake = FakeSpotify(stall=(1, stall_seconds)).start()  # Every request hangs
+    yield fake
+    fake.stop()
+
+def test_cancel_runs_callbacks_once():
+    cancellation = Cancellation()
+    calls = []
+    cancellation.register(lambda: calls.append('a'))
+    removed = lambda: calls.append('removed')
+    cancellation.register(removed)
+    cancellation.unregister(removed)
+    cancellation.cancel()
+    cancellation.cancel()
+    assert cancellation.cancelled
+    assert calls == ['a']
+
+def test_register_after_cancel_runs_at_once():
+    cancellation = Cancellation()
+    cancellation.cancel()
+    calls = []
+    cancellation.register(lambda: calls.append(1))
+    assert calls == [1]
+
+def test_failing_callback_does_not_stop_the_others():
+    cancellation = Cancellation()
+    calls = []
+    cancellation.register(lambda: 1 / 0)
+    cancellation.register(lambda: calls.append(1))
+    cancellation.cancel()
+    assert calls == [1]
+
+def test_abort_ends_stalled_request(logger, fake):
+    transport = Transport(logger, 'playing0', fake.url)
+    errors = []
+
+    def request():
+        try:
+            transport.get_currently_playing()
+        except requests.RequestException as err:
+            errors.append(err)
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    time.sleep(0.3)  # Let the request reach the server
+    start = time.time()
+    transport.abort()
+    thread.join(stall_seconds)
+    transport.close()
+    assert not thread.is_alive()
+    assert time.time() - start < 1
+    assert len(errors) == 1
+
+def test_stop_poll_cancels_stalled_poll(logger, fake):
+    timers = Timers.TimerQueue(logger).start()
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+    ad_mute.transport = Transport(logger, 'playing0', fake.url)
+    try:
+        ad_mute.start_polling(timers)
+        time.sleep(0.3)
+        assert not ad_mute.poll_idle.is_set()  # Stuck in the request
+
+        start = time.time()
+        ad_mute.stop_poll()
+        assert ad_mute.poll_idle.wait(1)
+        assert time.time() - start < 1
+        assert not ad_mute.polling
+        assert ad_mute.retry.failing_since == None  # A cancelled request is not a failure
+    finally:
+        timers.stop(1)
+        ad_mute.transport.close()
+
+# Throttled for a minute, as after a 429 with a long Retry-After
+def throttled_budget():
+    budget = RequestBudget(10)
+    budget.throttle(60)
+    return budget
+
+def test_stop_poll_cancels_wait_for_budget(logger, fake):
+    timers = Timers.TimerQueue(logger).start()
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+    ad_mute.transport = Transport(logger, 'playing0', fake.url)
+    ad_mute.budget = throttled_budget()
+    try:
+        ad_mute.start_polling(timers)
+        time.sleep(0.3)
+        assert not ad_mute.poll_idle.is_set()  # Waiting for the budget
+
+        start = time.time()
+        ad_mute.stop_poll()
+        assert ad_mute.poll_idle.wait(1)
+        assert time.time() - start < 1
+        assert fake.requests == 0
+        assert ad_mute.budget.waiting == []
+    finally:
+        timers.stop(1)
+        ad_mute.transport.close()
+
+def test_engine_stop_cancels_wait_for_budget(logger, fake):
+    engine = Engine(logger, workers=1, api_prefix=fake.url, budget=throttled_budget(), mute_backend=FakeMuteBackend)
+    engine.add_account('playing0', 'playing0')
+    engine.start()
+    time.sleep(0.3)
+    start = time.time()
+    assert engine.stop(1)
+    assert time.time() - start < 1
+    assert fake.requests == 0
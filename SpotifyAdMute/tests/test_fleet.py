@@ -0,0 +1,117 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for the fleet supervisor's rebalancing and worker restarts, on a fake clock without processes
+'''
+
+from Fleet import Fleet, WorkerSlot
+
+class FakeProcess(object):
+    pid = 1
+    exitcode = 1
+
+    def __init__(self):
+        self.running = True
+
+    def is_alive(self):
+        return self.running
+
+class FakeConn(object):
+    def poll(self, timeout=0):
+        return False
+
+    def send(self, command):
+        pass
+
+    def close(self):
+        pass
+
+# Fleet on a clock the test moves, whose workers are FakeProcesses.
+class FakeFleet(Fleet):
+    def __init__(self, logger, processes, accounts):
+        Fleet.__init__(self, logger, None, processes)
+        self.now = 0.0
+        self.clock = lambda: self.now
+        self.spawned = []
+        self.accounts = list(accounts)
+        self.slots = [WorkerSlot(index) for index in range(processes)]
+        self._rebalance()
+        for slot in self.slots:
+            self._spawn(slot)
+
+    def _spawn(self, slot):
+        slot.process = FakeProcess()
+        slot.conn = FakeConn()
+        slot.started_at = self.clock()
+        slot.down_since = None
+        self.spawned.append((self.now, slot.index))
+
+    # The worker in slot index crashes and check() runs.
+    def crash(self, index):
+        self.slots[index].process.running = False
+        self.check()
+
+def usernames(count):
+    return ['user%02d' % number for number in range(count)]
+
+def assignment(fleet):
+    return dict((slot.index, list(slot.accounts)) for slot in fleet.slots)
+
+def assert_spread(fleet, accounts):
+    assigned = [username for slot in fleet.slots for username in slot.accounts]
+    assert sorted(assigned) == sorted(accounts)
+    sizes = [len(slot.accounts) for slot in fleet.slots if slot.accounts]
+    assert max(sizes) - min(sizes) <= 1
+
+def test_accounts_spread_evenly(logger):
+    fleet = FakeFleet(logger, 3, usernames(10))
+    assert_spread(fleet, usernames(10))
+    assert sorted(len(slot.accounts) for slot in fleet.slots) == [3, 3, 4]
+
+def test_added_and_removed_accounts_move_nothing_else(logger):
+    fleet = FakeFleet(logger, 3, usernames(9))
+    before = assignment(fleet)
+    fleet.set_accounts(usernames(9) + ['new'])
+    fleet.set_accounts([username for username in fleet.accounts if username != 'user00'])
+    assert fleet.moves == 0
+    for index, accounts in assignment(fleet).items():
+        assert set(before[index]) - set(accounts) <= set(['user00'])
+    assert_spread(fleet, fleet.accounts)
+
+def test_dead_worker_keeps_accounts_until_rebalance_after(logger):
+    fleet = FakeFleet(logger, 3, usernames(9))
+    fleet.restart_backoff = fleet.max_restart_backoff = 60  # Stays down
+    orphans = list(fleet.slots[0].accounts)
+    fleet.crash(0)
+    assert fleet.slots[0].accounts == orphans and fleet.moves == 0
+
+    fleet.now = fleet.rebalance_after
+    fleet.check()
+    assert fleet.slots[0].accounts == []
+    assert fleet.moves == len(orphans)  # Only the dead worker's accounts moved
+    assert_spread(fleet, usernames(9))
+
+def test_restart_backoff_doubles_while_crashing(logger):
+    fleet = FakeFleet(logger, 1, usernames(2))
+    fleet.restart_backoff, fleet.max_restart_backoff = 1, 4
+    backoffs = []
+    for _ in range(4):
+        fleet.crash(0)
+        backoffs.append(fleet.slots[0].backoff)
+        fleet.now += fleet.slots[0].backoff - 0.5
+        fleet.check()
+        assert fleet.slots[0].down_since != None  # Not restarted before the backoff is up
+        fleet.now += 0.5
+        fleet.check()
+        assert fleet.slots[0].alive()
+    assert backoffs == [1, 2, 4, 4]
+    assert fleet.slots[0].restarts == 4
+    assert fleet.slots[0].accounts == usernames(2)  # Kept across restarts
+
+def test_restart_backoff_resets_after_stable_run(logger):
+    fleet = FakeFleet(logger, 1, usernames(2))
+    fleet.restart_backoff = 1
+    fleet.slots[0].backoff = 8
+    fleet.now = fleet.stable_seconds
+    fleet.crash(0)
+    assert fleet.slots[0].backoff == 1
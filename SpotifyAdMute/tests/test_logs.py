@@ -0,0 +1,67 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for queued logging: where records are formatted, and the listener surviving failures
+'''
+
+import logging
+import threading
+
+import Logs
+from Logs import QueueHandler, QueueListener
+
+# Handler that keeps formatted messages along with the thread that formatted them.
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append((self.format(record), threading.current_thread().name))
+
+# Argument whose str() notes the thread it was formatted on.
+class FormattedOn(object):
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread().name)
+        return 'value'
+
+def queued_logger(name, handler):
+    listener = QueueListener(handler)
+    listener.start()
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.addHandler(QueueHandler(listener))
+    logger.setLevel(logging.INFO)
+    return logger, listener
+
+def test_message_is_formatted_on_listener_thread():
+    handler = RecordingHandler()
+    logger, listener = queued_logger('test_logs.format', handler)
+    argument = FormattedOn()
+    logger.info('Got %s', argument)
+    listener.stop()
+    assert handler.lines[0][0] == 'Got value'
+    assert argument.threads == [handler.lines[0][1]]
+    assert argument.threads != [threading.current_thread().name]
+
+def test_traceback_is_kept_for_the_listener():
+    handler = RecordingHandler()
+    logger, listener = queued_logger('test_logs.traceback', handler)
+    try:
+        raise ValueError('bad')
+    except ValueError:
+        logger.exception('Failed')
+    listener.stop()
+    assert 'ValueError: bad' in handler.lines[0][0]
+
+def test_listener_survives_failed_call(capsys):
+    handler = RecordingHandler()
+    logger, listener = queued_logger('test_logs.call', handler)
+    listener.call(lambda: Logs.sweep('/no/such/folder', 30))
+    logger.info('Still logging')
+    listener.stop()
+    assert [line for line, _ in handler.lines] == ['Still logging']
+    assert 'Logging error in call' in capsys.readouterr().err
@@ -0,0 +1,156 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for reading playback over MPRIS, with the fake session bus and recorded dbus-monitor output
+'''
+
+import io
+import threading
+
+import pytest
+
+import Mpris
+from Mpris import FakeSessionBus, MprisSource, player_properties
+from PlaybackSource import PlaybackSource
+
+# What FakeSpotify answers for a track and for an ad.
+TRACK = {'is_playing': True, 'progress_ms': 0, 'currently_playing_type': 'track', 'timestamp': 1000,
+         'item': {'id': 'track1', 'name': 'Track 1', 'artists': [{'name': 'Artist 1'}], 'duration_ms': 200000}}
+AD = {'is_playing': True, 'progress_ms': 0, 'currently_playing_type': 'ad', 'item': None, 'timestamp': 2000}
+
+# Stands in for the Web API while no client is on the bus.
+class Fallback(PlaybackSource):
+    name = 'fallback'
+    snapshot = object()
+
+    def get_currently_playing(self):
+        return self.snapshot
+
+@pytest.fixture
+def bus():
+    return FakeSessionBus()
+
+@pytest.fixture
+def source(logger, bus):
+    source = MprisSource(logger, bus, Fallback())
+    source.changed = threading.Event()
+    source.on_change = source.changed.set
+    yield source
+    source.close()
+
+# Wait for the bus thread to deliver the signals sent so far.
+def delivered(source):
+    assert source.changed.wait(1)
+    source.changed.clear()
+    return source.get_currently_playing()
+
+def test_reads_fallback_without_player(source):
+    assert not source.push
+    assert source.get_currently_playing() is Fallback.snapshot
+
+def test_reads_tracks_and_ads_from_player(source, bus):
+    bus.start_player()
+    assert delivered(source) == None  # Player up, nothing loaded
+    assert source.push
+
+    bus.play(TRACK)
+    results = delivered(source)
+    assert results.track_id == 'track1' and results.name == 'Track 1' and results.artist == 'Artist 1'
+    assert results.duration_ms == 200000 and results.is_playing and results.has_item
+
+    bus.play(AD)
+    results = delivered(source)
+    assert results.type == 'ad' and not results.has_item
+
+def test_seek_and_pause_move_position(source, bus):
+    bus.start_player()
+    delivered(source)
+    bus.play(TRACK)
+    delivered(source)
+    bus.seek(30 * 1000000)
+    assert delivered(source).progress_ms >= 30000
+
+    bus.set_properties(PlaybackStatus='Paused')
+    paused = delivered(source)
+    assert not paused.is_playing
+    assert source.get_currently_playing().progress_ms == paused.progress_ms  # Frozen while paused
+
+def test_falls_back_when_player_leaves(source, bus):
+    bus.start_player()
+    delivered(source)
+    bus.stop_player()
+    assert delivered(source) is Fallback.snapshot
+    assert not source.push
+
+def test_player_properties_round_trip():
+    results = Mpris.snapshot(player_properties(TRACK), 12.5)
+    assert (results.track_id, results.name, results.progress_ms, results.type) == ('track1', 'Track 1', 12500, 'track')
+
+# dbus-monitor output for the Spotify client (:1.42) announcing a track, and for a browser (:1.99) on the same path.
+MONITOR_OUTPUT = u'''signal time=1.1 sender=org.freedesktop.DBus -> destination=:1.7 serial=2 path=/org/freedesktop/DBus; interface=org.freedesktop.DBus; member=NameAcquired
+   string ":1.7"
+signal time=1.2 sender=:1.42 -> destination=(null destination) serial=5 path=/org/mpris/MediaPlayer2; interface=org.freedesktop.DBus.Properties; member=PropertiesChanged
+   string "org.mpris.MediaPlayer2.Player"
+   array [
+      dict entry(
+         string "Metadata"
+         variant             array [
+               dict entry(
+                  string "mpris:trackid"
+                  variant                      string "spotify:track:abc"
+               )
+               dict entry(
+                  string "mpris:length"
+                  variant                      uint64 200000000
+               )
+               dict entry(
+                  string "xesam:artist"
+                  variant                      array [
+                        string "Artist"
+                     ]
+               )
+               dict entry(
+                  string "xesam:title"
+                  variant                      string "Title"
+               )
+            ]
+      )
+      dict entry(
+         string "PlaybackStatus"
+         variant             string "Playing"
+      )
+   ]
+   array [
+   ]
+signal time=1.3 sender=:1.99 -> destination=(null destination) serial=9 path=/org/mpris/MediaPlayer2; interface=org.mpris.MediaPlayer2.Player; member=Seeked
+   int64 5000000
+signal time=1.4 sender=:1.42 -> destination=(null destination) serial=6 path=/org/mpris/MediaPlayer2; interface=org.mpris.MediaPlayer2.Player; member=Seeked
+   int64 30000000
+'''
+
+class RecordedMonitor(object):
+    def __init__(self, output):
+        self.stdout = io.StringIO(output)
+
+# Feed output through DBusMonitorBus's reader as if dbus-monitor had printed it.
+def read_monitor(logger, output, owner):
+    bus = Mpris.DBusMonitorBus.__new__(Mpris.DBusMonitorBus)  # Skip looking for a session bus and the dbus tools
+    bus.logger = logger
+    bus.any_sender = False
+    bus.owner = owner
+    bus.closing = True
+    bus.ready = threading.Event()
+    bus.process = RecordedMonitor(output)
+    signals = []
+    bus.callbacks = (lambda changed, invalidated: signals.append(('properties', changed, invalidated)),
+                     lambda position: signals.append(('seeked', position)),
+                     lambda present: signals.append(('player', present)))
+    bus._read()
+    return signals
+
+def test_parses_signals_from_the_client_only(logger):
+    signals = read_monitor(logger, MONITOR_OUTPUT, ':1.42')
+    assert signals == [
+        ('properties', {'Metadata': {'mpris:trackid': 'spotify:track:abc', 'mpris:length': 200000000, 'xesam:artist': ['Artist'],
+                                     'xesam:title': 'Title'}, 'PlaybackStatus': 'Playing'}, []),
+        ('seeked', 30000000)]
@@ -0,0 +1,145 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for the mute backends, muting Spotify's audio session on fake sessions
+'''
+
+import time
+
+import pytest
+
+import Timers
+from MuteBackend import FakeMuteBackend, FakeSessions, SessionMuteBackend, parse_sink_inputs
+
+@pytest.fixture
+def timers(logger):
+    timers = Timers.TimerQueue(logger).start()
+    yield timers
+    timers.stop(1)
+
+def session_backend(timers, processes=('firefox', 'spotify'), watching=True):
+    provider = FakeSessions(processes, watching=watching)
+    backend = SessionMuteBackend(provider, timers=timers)
+    backend.missing_retry = 0.1
+    return provider, backend
+
+# Wait up to timeout seconds for condition() to hold, as reapplying happens on a timer thread.
+def eventually(condition, timeout=1):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_redundant_calls_are_skipped():
+    backend = FakeMuteBackend()
+    backend.set_mute(1)
+    backend.set_mute(True)
+    backend.set_mute(False)
+    assert [mute for _, mute in backend.history] == [True, False]
+    assert backend.calls == 2 and backend.skipped == 1
+    backend.invalidate()
+    backend.set_mute(False)
+    assert backend.calls == 3
+
+def test_mutes_only_spotify_session(timers):
+    provider, backend = session_backend(timers)
+    backend.set_mute(True)
+    backend.set_mute(False)
+    backend.set_mute(True)
+    assert provider.spotify_muted()
+    firefox = [session for session in provider.live if session.process == 'firefox'][0]
+    assert firefox.id not in provider.mutes
+    assert backend.lookups == 1  # Cached between calls
+    backend.close()
+
+def test_device_switch_keeps_ad_muted(timers):
+    provider, backend = session_backend(timers)
+    backend.set_mute(True)
+    provider.switch_device()
+    assert eventually(provider.spotify_muted)
+    assert backend.changes == 1 and backend.lookups == 2
+    backend.close()
+
+def test_stop_during_ad_then_device_switch_stays_unmuted(timers):
+    provider, backend = session_backend(timers)
+    backend.set_mute(True)
+    backend.invalidate()  # Monitoring stopped
+    provider.switch_device()
+    time.sleep(0.1)
+    assert not provider.spotify_muted()
+    assert backend.lookups == 1
+    backend.close()
+
+def test_no_session_leaves_state_unknown(timers):
+    provider, backend = session_backend(timers, processes=('firefox',))
+    backend.set_mute(True)
+    assert backend.muted == None
+    assert backend.missing == 1
+    assert provider.mutes == {}
+    backend.set_mute(True)  # Not skipped, since nothing was muted
+    assert backend.calls == 2 and backend.skipped == 0
+    backend.close()
+
+@pytest.mark.parametrize('watching', [True, False])
+def test_session_started_during_ad_is_muted(timers, watching):
+    provider, backend = session_backend(timers, watching=watching)
+    provider.end_sessions()
+    backend.set_mute(True)
+    assert backend.muted == None
+
+    provider.start_sessions()  # Reported when watching, otherwise found by the periodic lookup
+    assert eventually(provider.spotify_muted)
+    backend.set_mute(True)
+    assert backend.muted == True
+    backend.close()
+
+def test_no_lookups_after_close(timers):
+    provider, backend = session_backend(timers, watching=False)
+    provider.end_sessions()
+    backend.set_mute(True)
+    backend.close()
+    lookups = backend.lookups
+    provider.start_sessions()
+    time.sleep(3 * backend.missing_retry)
+    assert backend.lookups == lookups
+    assert not provider.spotify_muted()
+
+def test_no_lookups_after_invalidate(timers):
+    provider, backend = session_backend(timers, watching=False)
+    provider.end_sessions()
+    backend.set_mute(True)
+    backend.invalidate()  # Monitoring stopped
+    provider.start_sessions()
+    time.sleep(3 * backend.missing_retry)
+    assert backend.lookups == 1
+    assert not provider.spotify_muted()
+    backend.close()
+
+def test_unmute_without_session_does_not_keep_looking(timers):
+    provider, backend = session_backend(timers, watching=False)
+    provider.end_sessions()
+    backend.set_mute(False)
+    time.sleep(3 * backend.missing_retry)
+    assert backend.lookups == 1
+    backend.close()
+
+SINK_INPUTS = '''Sink Input #41
+\tDriver: protocol-native.c
+\tMute: no
+\tProperties:
+\t\tmedia.name = "Playback"
+\t\tapplication.name = "Firefox"
+\t\tapplication.process.binary = "firefox"
+
+Sink Input #42
+\tDriver: protocol-native.c
+\tMute: no
+\tProperties:
+\t\tapplication.name = "Spotify"
+'''
+
+def test_parse_sink_inputs():
+    sessions = parse_sink_inputs(SINK_INPUTS)
+    assert [(session.id, session.process, session.handle) for session in sessions] == [('41', 'firefox', '41'), ('42', 'spotify', '42')]
@@ -0,0 +1,188 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for failure classification, circuit breakers and the poll loop's retries against injected faults
+'''
+
+import random
+import socket
+import time
+
+import pytest
+import requests
+from spotipy.client import SpotifyException
+from spotipy.oauth2 import SpotifyOauthError
+
+import Metrics
+import Retry
+import TokenStore
+from Engine import HeadlessApp
+from FakeSpotify import FakeSpotify
+from MuteBackend import FakeMuteBackend
+from SpotifyAdMute import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, SpotifyAdMute
+from TokenManager import TokenManager
+from Transport import Transport
+
+@pytest.mark.parametrize('err, kind', [
+    (SpotifyException(401, -1, 'expired'), Retry.AUTH),
+    (SpotifyException(403, -1, 'forbidden'), Retry.AUTH),
+    (SpotifyOauthError('invalid_grant'), Retry.AUTH),
+    (SpotifyException(429, -1, 'slow down'), Retry.THROTTLE),
+    (SpotifyException(503, -1, 'unavailable'), Retry.SERVER),
+    (requests.ConnectionError('reset'), Retry.NETWORK),
+    (requests.Timeout('timed out'), Retry.NETWORK),
+    (socket.error('unreachable'), Retry.NETWORK),
+    (ValueError('bad json'), Retry.SERVER),
+])
+def test_classify(err, kind):
+    assert Retry.classify(err) == kind
+
+def test_failed_requests_are_counted_by_kind(logger):
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+    before = Metrics.requests_total.value((Retry.AUTH,))
+    ad_mute._record_failed_request(None, SpotifyException(403, -1, 'forbidden'))
+    assert Metrics.requests_total.value((Retry.AUTH,)) == before + 1  # Labelled as the retry policy sees it
+
+def test_breaker_backs_off_then_opens():
+    breaker = Retry.Breaker(Retry.SERVER, 1, 4, 4, 10, 30)
+    assert [breaker.failed(0) for _ in range(3)] == [1, 2, 4]
+    assert not breaker.is_open
+    assert breaker.failed(100) == 10  # Fourth in a row opens it
+    assert breaker.is_open and breaker.open_until == 110 and breaker.trips == 1
+
+def test_breaker_cooldown_doubles_up_to_max_until_reset():
+    breaker = Retry.Breaker(Retry.SERVER, 1, 4, 1, 10, 30)
+    assert [breaker.failed(0) for _ in range(4)] == [10, 20, 30, 30]
+    assert breaker.trips == 4
+    breaker.reset()
+    assert not breaker.is_open
+    assert breaker.failed(0) == 10
+
+def test_breaker_waits_at_least_retry_after():
+    breaker = Retry.Breaker(Retry.THROTTLE, 1, 60, None, 30, 300)
+    assert breaker.failed(0, jitter=0.5, retry_after=7) == 10.5  # Jitter goes on top of Retry-After
+    assert breaker.failed(0, jitter=0.5, retry_after=None) == 1  # 2 s backoff, half of it taken off
+
+def test_breaker_without_threshold_never_opens():
+    breaker = Retry.Breaker(Retry.SERVER, 0.5, 2, None, 1, 1)
+    for _ in range(20):
+        breaker.failed(0)
+    assert not breaker.is_open
+
+def test_policy_tracks_degraded_mode_and_recovery():
+    policy = Retry.RetryPolicy(random.Random(1))
+    policy.jitter = 0
+    err = SpotifyException(503, -1, 'unavailable')
+    kinds = [policy.failed(err, now)[0] for now in range(4)]
+    assert kinds == [Retry.SERVER] * 4
+    assert policy.degraded and policy.open_kinds() == [Retry.SERVER]
+    assert policy.wait(3) == 8  # The 8 s backoff, longer than the 5 s cooldown
+    assert policy.succeeded(10) == 10
+    assert not policy.degraded and policy.recoveries == 1
+    assert policy.succeeded(11) == None  # Nothing was failing
+
+def test_failed_trial_reopens_breaker_whatever_the_failure():
+    policy = Retry.RetryPolicy(random.Random(1))
+    policy.jitter = 0
+    network = policy.breakers[Retry.NETWORK]
+    for now in range(4):
+        policy.failed(requests.ConnectionError('reset'), now)
+    assert network.is_open and network.open_until == 8  # 5 s cooldown from the fourth failure
+    assert policy.tripped == [Retry.NETWORK]
+
+    kind, wait = policy.failed(SpotifyException(503, -1, 'unavailable'), 8)  # The trial gets a server error
+    assert kind == Retry.SERVER
+    assert network.open_until == 18 and wait == 10  # Open again for twice the cooldown, not the 1 s server backoff
+    assert policy.tripped == [Retry.NETWORK]
+
+def test_wait_covers_every_open_breaker():
+    policy = Retry.RetryPolicy(random.Random(1))
+    policy.jitter = 0
+    for now in range(4):
+        policy.failed(requests.ConnectionError('reset'), now)
+    kind, wait = policy.failed(SpotifyException(503, -1, 'unavailable'), 4)  # Polled early, e.g. on a pushed change
+    assert kind == Retry.SERVER and wait == 4  # Until the network breaker lets a trial through
+    assert policy.tripped == []
+
+def make_ad_mute(logger, fake, username='playing0', token_manager=None):
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+    ad_mute.transport = Transport(logger, username, fake.url)
+    ad_mute.token_manager = token_manager
+    ad_mute.retry = Retry.RetryPolicy(random.Random(1))
+    return ad_mute
+
+def token_manager(logger, fake, username):
+    sp_oauth = TokenStore.oauth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE, fake.token_url)
+    return TokenManager(logger, sp_oauth, {'access_token': username, 'refresh_token': username, 'token_type': 'Bearer',
+                                           'expires_in': 3600, 'expires_at': int(time.time()) + 3600})
+
+def test_expired_token_is_refreshed_and_sent_again(logger):
+    fake = FakeSpotify(faults=[(0, 60, 'auth')]).start()  # Every token issued so far is rejected
+    ad_mute = make_ad_mute(logger, fake, token_manager=token_manager(logger, fake, 'playing0'))
+    try:
+        results, failure, retry_in = ad_mute._try_get_currently_playing()
+    finally:
+        ad_mute.transport.close()
+        fake.stop()
+    assert failure == None and results.is_playing
+    assert fake.refreshes == 1 and len(fake.failed) == 1
+    assert ad_mute.transport.token == 'playing0~1'
+    assert ad_mute.retry.failing_since == None  # Fixed by the refresh, so not an outage
+
+def test_failed_refresh_opens_auth_breaker(logger):
+    fake = FakeSpotify(faults=[(0, 60, 'auth')]).start()
+    fake.used_refresh_tokens.add('playing0')  # Refreshing is rejected too
+    ad_mute = make_ad_mute(logger, fake, token_manager=token_manager(logger, fake, 'playing0'))
+    try:
+        _, failure, retry_in = ad_mute._try_get_currently_playing()
+        assert failure == Retry.AUTH and retry_in <= 1
+        assert not ad_mute.retry.degraded
+
+        _, failure, retry_in = ad_mute._try_get_currently_playing()
+        assert failure == Retry.AUTH
+        assert ad_mute.retry.breakers[Retry.AUTH].is_open
+        assert retry_in == pytest.approx(Retry.RetryPolicy.policies[Retry.AUTH][3], abs=0.1)  # Cooldown of a few seconds
+    finally:
+        ad_mute.transport.close()
+        fake.stop()
+    assert fake.rejected_refreshes == 2
+
+def test_poll_returns_retry_wait_instead_of_sleeping(logger):
+    fake = FakeSpotify(faults=[(0, 0.5, 'server')]).start()
+    ad_mute = make_ad_mute(logger, fake)
+    try:
+        start = time.time()
+        duration = ad_mute.poll_once()
+        assert time.time() - start < 0.5
+        assert 0 < duration <= Retry.RetryPolicy.policies[Retry.SERVER][0]
+        assert ad_mute.state == None  # Nothing read yet
+
+        time.sleep(0.6)  # Fault cleared
+        assert ad_mute.poll_once() > 0
+        assert ad_mute.state != None
+    finally:
+        ad_mute.transport.close()
+        fake.stop()
+    assert ad_mute.retry.recoveries == 1
+
+def test_throttle_waits_for_retry_after(logger):
+    fake = FakeSpotify(faults=[(0, 2, 'throttle')]).start()
+    ad_mute = make_ad_mute(logger, fake)
+    try:
+        _, failure, retry_in = ad_mute._try_get_currently_playing()
+    finally:
+        ad_mute.transport.close()
+        fake.stop()
+    assert failure == Retry.THROTTLE
+    assert retry_in >= 2
+
+def test_network_failure_is_retried(logger):
+    fake = FakeSpotify(faults=[(0, 60, 'network')]).start()
+    ad_mute = make_ad_mute(logger, fake)
+    try:
+        _, failure, retry_in = ad_mute._try_get_currently_playing()
+    finally:
+        ad_mute.transport.close()
+        fake.stop()
+    assert failure == Retry.NETWORK
+    assert 0 < retry_in <= Retry.RetryPolicy.policies[Retry.NETWORK][0]
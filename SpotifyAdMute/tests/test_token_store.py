@@ -0,0 +1,118 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for refresh leases in the shared token store, with stores standing in for separate processes
+'''
+
+import threading
+import time
+
+import pytest
+
+import TokenStore
+from TokenStore import FRESH, LEASED, REFRESH, StoredTokenManager, TokenStore as Store
+
+expires_at = int(time.time()) + 3600
+
+def token(name):
+    return {'access_token': name, 'refresh_token': name, 'token_type': 'Bearer', 'expires_in': 3600, 'expires_at': expires_at}
+
+# Store as opened by another process, with an owner of its own.
+def open_store(path, owner):
+    store = Store(path)
+    store.owner = owner
+    return store
+
+@pytest.fixture
+def path(tmpdir):
+    path = str(tmpdir.join('fleet.db'))
+    open_store(path, 'setup').put_token('alice', token('a0'))
+    return path
+
+# SpotifyOAuth stand-in that counts refreshes. before_reply(refresh_token) runs before the new token is returned.
+class FakeOAuth(object):
+    def __init__(self, before_reply=None):
+        self.refreshes = 0
+        self.before_reply = before_reply
+
+    def refresh_access_token(self, refresh_token):
+        self.refreshes += 1
+        if self.before_reply:
+            self.before_reply(refresh_token)
+        return token('%s~%d' % (refresh_token, self.refreshes))
+
+def test_put_token_bumps_version(path):
+    store = open_store(path, 'a')
+    assert store.get_token('alice') == (token('a0'), 1)
+    assert store.put_token('alice', token('a1')) == 2
+    assert store.get_token('bob') == (None, 0)
+    assert store.usernames() == ['alice']
+
+def test_second_refresh_waits_for_lease(path):
+    first, second = open_store(path, 'a'), open_store(path, 'b')
+    assert first.begin_refresh('alice', 1, now=100)[0] == REFRESH
+    assert second.begin_refresh('alice', 1, now=101) == (LEASED, None, None)
+    assert first.finish_refresh('alice', token('a1')) == 2
+    assert second.begin_refresh('alice', 1, now=102) == (FRESH, token('a1'), 2)  # Takes the new token instead of refreshing
+
+def test_expired_lease_is_taken_over(path):
+    first, second = open_store(path, 'a'), open_store(path, 'b')
+    first.begin_refresh('alice', 1, now=100)
+    assert second.begin_refresh('alice', 1, now=100 + Store.lease_seconds + 1)[0] == REFRESH
+    assert first.finish_refresh('alice', token('stale')) == None  # Lost the lease
+    assert second.finish_refresh('alice', token('a1')) == 2
+    assert first.get_token('alice') == (token('a1'), 2)
+
+def test_abandoned_lease_is_free_at_once(path):
+    first, second = open_store(path, 'a'), open_store(path, 'b')
+    first.begin_refresh('alice', 1, now=100)
+    first.abandon_refresh('alice')
+    assert second.begin_refresh('alice', 1, now=101)[0] == REFRESH
+
+def test_begin_refresh_of_unknown_account(path):
+    with pytest.raises(TokenStore.TokenStoreException):
+        open_store(path, 'a').begin_refresh('bob', 1)
+
+def test_manager_takes_token_another_process_refreshed(logger, path):
+    first = StoredTokenManager(logger, FakeOAuth(), open_store(path, 'a'), 'alice')
+    second_oauth = FakeOAuth()
+    second = StoredTokenManager(logger, second_oauth, open_store(path, 'b'), 'alice')
+    stale = second.token_info
+    refreshed = first.refresh()
+    assert second.refresh(stale) == refreshed
+    assert second_oauth.refreshes == 0 and second.version == first.version == 2
+
+def test_manager_waits_out_another_refresh(logger, path):
+    other = open_store(path, 'b')
+    other.begin_refresh('alice', 1)
+    manager = StoredTokenManager(logger, FakeOAuth(), open_store(path, 'a'), 'alice')
+    manager.lease_poll = 0.02
+
+    finished = threading.Timer(0.1, other.finish_refresh, ('alice', token('b1')))
+    finished.start()
+    try:
+        assert manager.refresh()['access_token'] == 'b1'
+    finally:
+        finished.cancel()
+    assert manager.sp_oauth.refreshes == 0
+
+def test_manager_that_loses_its_lease_keeps_the_winning_token(logger, path):
+    other = open_store(path, 'b')
+
+    def taken_over(refresh_token):  # Our refresh took so long that another process took the lease and finished first
+        other.begin_refresh('alice', 1, now=time.time() + Store.lease_seconds + 1)
+        other.finish_refresh('alice', token('b1'))
+
+    manager = StoredTokenManager(logger, FakeOAuth(taken_over), open_store(path, 'a'), 'alice')
+    assert manager.refresh()['access_token'] == 'b1'
+    assert manager.version == 2
+    assert other.get_token('alice') == (token('b1'), 2)
+
+def test_failed_refresh_gives_up_lease(logger, path):
+    def fail(refresh_token):
+        raise TokenStore.oauth2.SpotifyOauthError('invalid_grant')
+
+    manager = StoredTokenManager(logger, FakeOAuth(fail), open_store(path, 'a'), 'alice')
+    with pytest.raises(TokenStore.oauth2.SpotifyOauthError):
+        manager.refresh()
+    assert open_store(path, 'b').begin_refresh('alice', 1)[0] == REFRESH
@@ -0,0 +1,88 @@
+'''
+Author:        Alexander Zhu
+Date Created:  18 October, 2026
+Description:   Tests for the keep-alive Transport against the fake Spotify API
+'''
+
+import time
+
+import pytest
+import requests
+from spotipy.client import SpotifyException
+
+from Engine import HeadlessApp
+from FakeSpotify import FakeSpotify
+from MuteBackend import FakeMuteBackend
+from SpotifyAdMute import SpotifyAdMute
+from Transport import Transport
+
+@pytest.fixture
+def fake():
+    fake = FakeSpotify(etags=True).start()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def transport(logger, fake):
+    transport = Transport(logger, 'paused0', fake.url)
+    yield transport
+    transport.close()
+
+# Paused accounts always get the same payload, so the second request is answered 304 with the first snapshot reused.
+def test_not_modified_reuses_snapshot(transport):
+    first = transport.get_currently_playing()
+    second = transport.get_currently_playing()
+    assert first.name == 'Track 0' and not first.is_playing
+    assert second is first
+    assert transport.requests == 2
+    assert transport.not_modified == 1
+
+def test_identical_payload_without_etag_reuses_snapshot(logger):
+    fake = FakeSpotify(etags=False).start()
+    transport = Transport(logger, 'paused0', fake.url)
+    try:
+        first = transport.get_currently_playing()
+        second = transport.get_currently_playing()
+    finally:
+        transport.close()
+        fake.stop()
+    assert second is first
+    assert transport.not_modified == 0
+    assert transport.unchanged == 1
+
+def test_changed_payload_is_parsed_again(logger, fake):
+    transport = Transport(logger, 'playing0', fake.url)
+    try:
+        first = transport.get_currently_playing()
+        time.sleep(0.01)  # Progress moves on, so the payload and its ETag change
+        second = transport.get_currently_playing()
+    finally:
+        transport.close()
+    assert second is not first
+    assert second.progress_ms > first.progress_ms or second.key != first.key
+    assert transport.not_modified == 0
+
+def test_error_raises_spotify_exception(logger):
+    fake = FakeSpotify(faults=[(0, 60, 'server')]).start()
+    transport = Transport(logger, 'playing0', fake.url)
+    try:
+        with pytest.raises(SpotifyException) as raised:
+            transport.get_currently_playing()
+    finally:
+        transport.close()
+        fake.stop()
+    assert raised.value.http_status == 503
+    assert transport.etag == None
+
+def test_abort_just_before_request_fails_it(transport):
+    transport.abort()
+    with pytest.raises(requests.ConnectionError):
+        transport.get_currently_playing()
+    assert transport.get_currently_playing() != None  # Only that one
+
+def test_abort_between_polls_does_not_fail_next_poll(logger, transport):
+    ad_mute = SpotifyAdMute(HeadlessApp(), logger, FakeMuteBackend())
+    ad_mute.transport = transport
+    transport.abort()  # E.g. a stop while nothing was in flight
+    results, failure, _ = ad_mute._try_get_currently_playing()
+    assert failure == None and results != None